@@ -30,8 +30,10 @@ from __future__ import annotations
 
 import os
 import sys
-import random
+import hashlib
+import functools
 import numpy as np
+import scipy.fft
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
 from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
@@ -50,6 +52,74 @@ N_CH  = 50          # chemokine diffusion time steps per simulation step
 DT    = 0.0001      # diffusion time step
 DX    = 1.0         # lattice spacing
 
+# ── Diffusion solver per field: 'explicit' (7-point stencil, sub-stepped to the
+#    stability limit) or 'spectral' (exact heat-kernel decay via DST/DCT, one
+#    forward/inverse transform per update regardless of D or total time)
+OX_SOLVER  = 'explicit'
+PHI_SOLVER = 'explicit'
+
+# ── Oxygen model: 'transient' (uptake + N_OX diffusion sub-steps per step) or
+#    'steady' (quasi-steady D_OX_STEP ∇²O = Q(O)·mask per step, solved by FAS
+#    multigrid). One transient step diffuses for N_OX·DT time units, so the
+#    per-step diffusivity of the same model is D_OX·N_OX·DT, not D_OX
+OXYGEN_MODEL      = 'transient'
+D_OX_STEP         = D_OX * N_OX * DT   # oxygen diffusivity per simulation step
+STEADY_TOL        = 1e-6   # max-norm residual at which the steady solve stops
+STEADY_MAX_CYCLES = 30     # V-cycle cap per step
+STEADY_PIN        = 1e6    # necrotic-site sink, in units of D/dx² (holds O ≈ 0 there)
+
+# ── Field-engine threads: stencil and pointwise field kernels are split into
+#    slabs along the first lattice axis and run on a thread pool (NumPy
+#    releases the GIL inside these kernels)
+FIELD_THREADS = 1
+
+# ── Active-region windowing: transient field updates are confined to the
+#    tumour bounding box plus a diffusion margin; outside it the fields are at
+#    their analytically known far-field values (oxygen O_MAX, phi 0)
+FIELD_WINDOW  = True
+WINDOW_SIGMAS = 6.0     # margin in diffusion lengths sqrt(2·D·t) per update
+WINDOW_EPS    = 1e-12   # |field − far-field value| below this counts as far field
+
+# ── Field allocation bound: once the workspace is warm, a step's transient field
+#    updates allocate only NumPy's fixed-size ufunc buffers (~0.2 MB at any L),
+#    never a lattice-sized array (audit_field_allocations checks it)
+FIELD_ALLOC_MB = 0.5
+
+# ── Cell-field interactions: while occupied voxels are less than this fraction
+#    of the update window, oxygen uptake and necrotic zeroing gather / scatter
+#    at the cells' flat site ids instead of sweeping dense masks over the
+#    window. benchmark_cell_fields puts the crossover at a fill of 3-5 % at
+#    L = 64 and 96 (sparse 4-8x faster at 0.5 %, dense 3x faster at 10 %).
+#    Hybrid runs, whose core is a density field, always use the dense masks.
+SPARSE_FILL = 0.03
+
+# ── Field precision: 'float64' or 'float32' storage and kernels for oxygen and
+#    phi (the thresholds need ~1e-3); cell-level probabilities and the oxygen
+#    consumption accumulator stay float64
+FIELD_DTYPE = 'float64'
+
+# ── Adaptive field scheduling: a step's field update is skipped while the
+#    predicted change of the depletion field O_MAX − O stays below FIELD_TOL
+#    (see FieldScheduler); every decision is logged
+FIELD_SCHEDULE = False
+FIELD_TOL      = 0.02   # relative L1 change of O_MAX − O accumulated while held
+FIELD_MAX_SKIP = 4      # consecutive held steps before an update is forced
+
+# ── Online radial statistics: per-step shell profiles about the lattice centre
+#    (oxygen, phi, cell density, necrotic fraction) and the radius of gyration,
+#    accumulated with np.bincount over a site → shell index built once
+RADIAL_STATS     = False
+RADIAL_BIN_WIDTH = 1.0  # shell width (lattice units)
+
+# ── Steady-state detection: run() stops once the population, avg_C and the
+#    metastatic rate (metastatic events per cell) have each varied by less
+#    than their tolerance over the last CONVERGE_WINDOW steps, or the tumour
+#    is extinct, and pads the remaining steps (see SteadyStateDetector)
+CONVERGE         = False
+CONVERGE_WINDOW  = 5
+CONVERGE_TOL     = dict(population=0.01, avg_C=0.01, metastatic_rate=0.005)
+CONVERGE_MIN_POP = 1000     # smaller populations are never called steady (extinction excepted)
+
 # ── Oxygen metabolism (Michaelis-Menten kinetics) ────────────────────────────
 O_MAX = 1.0         # maximum oxygen concentration (normalised)
 V_MAX = 0.17        # maximum cellular oxygen uptake rate per step
@@ -65,8 +135,12 @@ NECROTIC_CLEAR_RATE = 0.001  # Fraction of necrotic cells cleared per step (simu
 ALPHA = 0.3         # resistance factor (max death probability)
 BETA  = 0.7         # growth factor (max division probability)
 
+# ── Hybrid continuum / agent mode
+HYBRID = False      # coarse-grain the enclosed core into density fields
+
 MAX_SIM_STEPS = 40    # simulation time steps
 SEED    = 42
+RNG_MODE = 'independent'  # 'independent' (key mixes in parameters) or 'crn' (common random numbers)
 SWEEP_TIMEOUT = 600  # seconds before a parallel combo is cancelled
 
 # ─────────────────────────────────────────────
@@ -88,6 +162,16 @@ class Cell:
     def pos(self):
         return (self.x, self.y, self.z)
 
+_CORE = 'core'      # lattice marker for a voxel held in the hybrid continuum core
+
+# Snapshot phenotype labels (cell_snapshot stores the index into this tuple)
+PHENOTYPES = ('necrotic', 'surface', 'condensing', 'non-condensing')
+
+def load_snapshot(path: str) -> dict:
+    """Read a save_snapshot() NPZ back into a dict of columns (scalars as Python values)."""
+    with np.load(path) as z:
+        return {k: (z[k].item() if z[k].ndim == 0 else z[k]) for k in z.files}
+
 # ─────────────────────────────────────────────
 #  NEIGHBOR OFFSETS (1st + 2nd order, total 18)
 # ─────────────────────────────────────────────
@@ -105,11 +189,77 @@ def get_neighbors_18():
 NEIGHBORS_18 = get_neighbors_18()
 NEIGHBORS_6  = [(1,0,0),(-1,0,0),(0,1,0),(0,-1,0),(0,0,1),(0,0,-1)]
 
+# ─────────────────────────────────────────────
+#  COUNTER-BASED RANDOM NUMBERS (Philox4x32-10)
+# ─────────────────────────────────────────────
+# Draw purposes — the second word of every Philox counter
+RNG_PHENOTYPE = 0   # phenotype of a newly placed cell       (id = its site)
+RNG_FATE      = 1   # death / division roll                  (id = cell site)
+RNG_NEIGHBOR  = 2   # daughter-site choice                   (id = parent site)
+RNG_WALK      = 3   # metastatic random-walk steps           (id = parent site, sub = walk step)
+RNG_CLEAR     = 4   # immune clearance of necrotic cells     (id = cell site)
+RNG_SAMPLE    = 5   # interior downsampling in CSV export    (id = cell site)
+RNG_CORE      = 6   # hybrid core: reconversion (id = voxel site, sub = draw)
+
+_PHILOX_M0, _PHILOX_M1 = np.uint64(0xD2511F53), np.uint64(0xCD9E8D57)
+_PHILOX_W0, _PHILOX_W1 = np.uint64(0x9E3779B9), np.uint64(0xBB67AE85)
+_MASK32 = np.uint64(0xFFFFFFFF)
+
+def philox4x32(c0, c1, c2, c3, k0: int, k1: int):
+    """
+    Vectorised Philox4x32-10 block function (Salmon et al., SC'11).
+    Counter words c0..c3 are broadcastable integer arrays < 2**32; the key is
+    two 32-bit integers. Returns four uint64 arrays holding 32-bit outputs.
+    """
+    c0, c1, c2, c3 = (np.asarray(c, dtype=np.uint64) & _MASK32 for c in (c0, c1, c2, c3))
+    c0, c1, c2, c3 = np.broadcast_arrays(c0, c1, c2, c3)
+    k0, k1 = np.uint64(k0 & 0xFFFFFFFF), np.uint64(k1 & 0xFFFFFFFF)
+    for _ in range(10):
+        p0 = _PHILOX_M0 * c0
+        p1 = _PHILOX_M1 * c2
+        c0, c1, c2, c3 = ((p1 >> np.uint64(32)) ^ c1 ^ k0, p1 & _MASK32,
+                          (p0 >> np.uint64(32)) ^ c3 ^ k1, p0 & _MASK32)
+        k0 = (k0 + _PHILOX_W0) & _MASK32
+        k1 = (k1 + _PHILOX_W1) & _MASK32
+    return c0, c1, c2, c3
+
+class CounterRNG:
+    """
+    Order-independent uniform draws addressed by (step, purpose, id, sub).
+
+    Every draw is a pure function of the key and its address, so two runs that
+    share a key see the same number at the same (step, site) no matter how
+    many other draws happened before — the basis of common random numbers.
+    """
+    def __init__(self, key: int):
+        key = int(key) & 0xFFFFFFFFFFFFFFFF
+        self.k0, self.k1 = key & 0xFFFFFFFF, key >> 32
+
+    @classmethod
+    def from_parts(cls, *parts) -> "CounterRNG":
+        """Key derived from a hash of arbitrary values (e.g. seed and run parameters)."""
+        digest = hashlib.blake2b(repr(parts).encode(), digest_size=8).digest()
+        return cls(int.from_bytes(digest, 'little'))
+
+    def uniform(self, step: int, purpose: int, ids, sub=0) -> np.ndarray:
+        """Uniform floats in [0, 1) with 53-bit resolution, one per id."""
+        w0, w1, _, _ = philox4x32(step, purpose, ids, sub, self.k0, self.k1)
+        return ((w0 >> np.uint64(5)) * 67108864.0 + (w1 >> np.uint64(6))) / 9007199254740992.0
+
 # ─────────────────────────────────────────────
 #  ADAPTIVE 3-D DIFFUSION (3D finite differences)
 # ─────────────────────────────────────────────
+def explicit_substeps(D: float, n_steps: int, dt: float = DT, dx: float = DX) -> tuple[int, float]:
+    """Number of stable explicit sub-steps covering n_steps·dt, and the stencil factor D·Δt/Δx²."""
+    total_time = n_steps * dt                          # preserve intended physics
+    dt_max     = (dx ** 2) / (6.0 * D) * 0.80         # 80% of stability limit
+    n_opt      = max(1, int(np.ceil(total_time / dt_max)))
+    dt_opt     = total_time / n_opt                    # exact step to hit total_time
+    return n_opt, D * dt_opt / dx ** 2
+
 def diffuse_3d(field: np.ndarray, D: float, n_steps: int,
-               dt: float = DT, dx: float = DX) -> np.ndarray:
+               dt: float = DT, dx: float = DX,
+               out: np.ndarray | None = None, ws: "FieldWorkspace | None" = None) -> np.ndarray:
     """
     Explicit finite-difference 3-D diffusion with Neumann BCs.
  
@@ -118,56 +268,753 @@ def diffuse_3d(field: np.ndarray, D: float, n_steps: int,
       The original code used Δt = 0.0001 which is far below the limit.
       We compute the largest stable Δt (with a 10 % safety margin) and
       reduce n_steps proportionally, keeping total diffusion time constant.
+
+    With out (which may be field itself) the update runs in place and
+    allocates nothing: the stencil scratch comes from ws or, without one,
+    from a shared workspace cached per (shape, dtype) (shared_workspace).
     """
-    total_time = n_steps * dt                          # preserve intended physics
-    dt_max     = (dx ** 2) / (6.0 * D) * 0.80         # 80% of stability limit
-    n_opt      = max(1, int(np.ceil(total_time / dt_max)))
-    dt_opt     = total_time / n_opt                    # exact step to hit total_time
+    n_opt, factor = explicit_substeps(D, n_steps, dt, dx)
  
-    u      = field.copy()
-    factor = D * dt_opt / dx ** 2
+    if out is None:
+        u = field.copy()
+    else:
+        u = out
+        if u is not field:
+            np.copyto(u, field)
+
+    inner = tuple(n - 2 for n in u.shape)
+    ws    = ws or shared_workspace(inner, u.dtype)
+    lap   = ws.view('lap', inner)
+    tmp   = ws.view('tmp', inner)
+    c     = u[1:-1, 1:-1, 1:-1]
+
+    # Slab kernels over interior rows [a, b): the stencil phase only reads u,
+    # so slabs are independent; the update phase starts once every slab's
+    # Laplacian is in (the one-plane halos are read straight from shared u).
+    def stencil(a, b):
+        l = lap[a:b]
+        np.add(u[a + 2:b + 2, 1:-1, 1:-1], u[a:b, 1:-1, 1:-1], out=l)
+        l += u[a + 1:b + 1, 2:,   1:-1]
+        l += u[a + 1:b + 1, :-2,  1:-1]
+        l += u[a + 1:b + 1, 1:-1, 2:  ]
+        l += u[a + 1:b + 1, 1:-1, :-2  ]
+        l -= np.multiply(c[a:b], 6.0, out=tmp[a:b])
+        l *= factor
+
+    def update(a, b):
+        c[a:b] += lap[a:b]
  
     for _ in range(n_opt):
-        lap = (
-            u[2:,   1:-1, 1:-1] + u[:-2,  1:-1, 1:-1] +
-            u[1:-1, 2:,   1:-1] + u[1:-1, :-2,  1:-1] +
-            u[1:-1, 1:-1, 2:  ] + u[1:-1, 1:-1, :-2  ] -
-            6.0 * u[1:-1, 1:-1, 1:-1]
-        )
-        u[1:-1, 1:-1, 1:-1] += factor * lap
+        ws.parallel(stencil, inner[0])
+        ws.parallel(update, inner[0])
  
     return u
 
 
+# ─────────────────────────────────────────────
+#  SPECTRAL 3-D DIFFUSION (DST / DCT)
+# ─────────────────────────────────────────────
+@functools.lru_cache(maxsize=16)
+def _laplacian_eigenvalues(shape: tuple, dx: float, bc: str) -> np.ndarray:
+    """
+    Eigenvalues of the 7-point Laplacian, broadcast to `shape`.
+      'fixed'   — Dirichlet on the interior block, diagonalised by DST-I:
+                  λ_k = (2cos(πk/(n+1)) − 2)/Δx²,  k = 1…n
+      'neumann' — zero-flux on the whole grid, diagonalised by DCT-II:
+                  λ_k = (2cos(πk/n) − 2)/Δx²,      k = 0…n−1
+    """
+    lam = np.zeros(shape)
+    for axis, n in enumerate(shape):
+        k = np.arange(1, n + 1) if bc == 'fixed' else np.arange(n)
+        m = n + 1 if bc == 'fixed' else n
+        ev = (2.0 * np.cos(np.pi * k / m) - 2.0) / dx ** 2
+        lam += ev.reshape([-1 if a == axis else 1 for a in range(len(shape))])
+    lam.setflags(write=False)
+    return lam
+
+def diffuse_spectral(field: np.ndarray, D: float, n_steps: int,
+                     dt: float = DT, dx: float = DX, bc: str = 'fixed',
+                     out: np.ndarray | None = None, ws: "FieldWorkspace | None" = None) -> np.ndarray:
+    """
+    Exact-in-time 3-D diffusion over n_steps·dt (drop-in for diffuse_3d).
+
+    The Laplacian is diagonalised by a discrete sine/cosine transform, so the
+    whole interval is one forward transform, a multiply by the heat kernel
+    exp(D·λ·t), and one inverse transform — the cost does not depend on D or t.
+
+    bc='fixed' matches diffuse_3d: boundary voxels keep their current value
+    and act as a reservoir for the interior. With boundary data b (fixed for
+    the interval), the semi-discrete solution in DST-I space is
+        û(t) = e^{Dλt} û₀ + (e^{Dλt} − 1)/λ · b̂
+    bc='neumann' is zero-flux on every face (DCT-II) and conserves the total.
+    out (which may be field itself) receives the result; the transforms
+    themselves allocate, ws is accepted for interface parity with diffuse_3d.
+    """
+    t = n_steps * dt
+    if bc == 'neumann':
+        decay = np.exp(D * t * _laplacian_eigenvalues(field.shape, dx, bc)).astype(field.dtype, copy=False)
+        u = scipy.fft.idctn(scipy.fft.dctn(field, type=2) * decay, type=2)
+        if out is None:
+            return u
+        np.copyto(out, u)
+        return out
+    if bc != 'fixed':
+        raise ValueError(f"unknown boundary condition {bc!r}")
+
+    if out is None:
+        u = field.copy()
+    else:
+        u = out
+        if u is not field:
+            np.copyto(u, field)
+    g   = field.copy()
+    g[1:-1, 1:-1, 1:-1] = 0.0
+    # Boundary contribution to the interior Laplacian (nonzero next to faces only)
+    b = (g[2:,   1:-1, 1:-1] + g[:-2,  1:-1, 1:-1] +
+         g[1:-1, 2:,   1:-1] + g[1:-1, :-2,  1:-1] +
+         g[1:-1, 1:-1, 2:  ] + g[1:-1, 1:-1, :-2  ]) / dx ** 2
+
+    lam   = _laplacian_eigenvalues(b.shape, dx, bc)
+    decay = np.exp(D * t * lam)
+    # Kernels in the field's precision, so float32 fields stay float32 throughout
+    u_hat = scipy.fft.dstn(field[1:-1, 1:-1, 1:-1], type=1) * decay.astype(field.dtype, copy=False)
+    u_hat += scipy.fft.dstn(b, type=1) * ((decay - 1.0) / lam).astype(field.dtype, copy=False)
+    u[1:-1, 1:-1, 1:-1] = scipy.fft.idstn(u_hat, type=1)
+    return u
+
+DIFFUSION_SOLVERS = {'explicit': diffuse_3d, 'spectral': diffuse_spectral}
+
+
+# ─────────────────────────────────────────────
+#  FIELD WORKSPACE (preallocated scratch buffers)
+# ─────────────────────────────────────────────
+class FieldWorkspace:
+    """
+    Named scratch arrays allocated at full lattice size on first use and kept
+    from then on. view(name, shape) returns the leading-corner view of the
+    requested shape, so windowed and interior-only operations reuse the same
+    memory every step.
+
+    With threads > 1 the workspace also owns the field engine's thread pool:
+    parallel(fn, n) splits rows [0, n) of the first axis into contiguous slabs
+    and runs fn(a, b) for each slab concurrently.
+    """
+    SPECS = {
+        'lap':      None,         # stencil accumulator     (None = field dtype)
+        'tmp':      None,         # stencil / uptake scratch
+        'tmp2':     None,         # uptake scratch
+        'f32':      np.float32,   # float32 scratch (hybrid necrotic factor)
+        'living':   np.float32,   # uptake weight mask
+        'necrotic': bool,         # necrotic-site mask
+        'dev':      bool,         # active-box deviation mask
+    }
+
+    MIN_SLAB = 4   # rows per slab below which splitting costs more than it saves
+
+    def __init__(self, shape: tuple, threads: int = 1, dtype=np.float64):
+        self.shape   = tuple(shape)
+        self.dtype   = np.dtype(dtype)
+        self._bufs: dict = {}
+        self.threads = max(1, int(threads))
+        self._pool   = ThreadPoolExecutor(max_workers=self.threads) if self.threads > 1 else None
+
+    def view(self, name: str, shape: tuple) -> np.ndarray:
+        buf = self._bufs.get(name)
+        if buf is None:
+            buf = self._bufs[name] = np.zeros(self.shape, dtype=self.SPECS[name] or self.dtype)
+        return buf[tuple(slice(0, n) for n in shape)]
+
+    def parallel(self, fn, n: int):
+        """Run fn(a, b) over slabs covering rows [0, n); returns once all are done."""
+        n_slabs = min(self.threads, n // self.MIN_SLAB)
+        if n_slabs <= 1:
+            fn(0, n)
+            return
+        edges = np.linspace(0, n, n_slabs + 1).astype(int)
+        for f in [self._pool.submit(fn, int(a), int(b)) for a, b in zip(edges[:-1], edges[1:])]:
+            f.result()
+
+    def close(self):
+        """Shut down the engine's thread pool (the buffers stay usable serially)."""
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+            self.threads = 1
+
+@functools.lru_cache(maxsize=2)
+def shared_workspace(shape: tuple, dtype) -> FieldWorkspace:
+    """
+    Serial workspace for field calls made without one (compare_diffusion_solvers,
+    benchmark_oxygen_models, outside callers), one per (shape, dtype). Only the
+    buffers a caller views are allocated. Not for concurrent callers: threads
+    that diffuse at the same time pass their own FieldWorkspace.
+    """
+    return FieldWorkspace(shape, dtype=dtype)
+
+# ─────────────────────────────────────────────
+#  ADAPTIVE FIELD SCHEDULING
+# ─────────────────────────────────────────────
+class FieldScheduler:
+    """
+    Per-step decision whether the oxygen and phi fields are advanced or held.
+
+    The change a step would make is predicted from the last update's residual
+    r (relative L1 change of the depletion field O_MAX − O) and the population
+    change since then:
+        predicted = (k + 1) · r · N / N_ref  +  |N − N_ref| / N_ref
+    where k steps have been held since the update at population N_ref. The
+    first term is the drift held fields accumulate; the second covers cells
+    added or removed since the fields last saw them. Fields are updated when
+    predicted ≥ tol, after max_skip held steps, or when forced (first step,
+    angiogenic switch). Held steps credit the last update's oxygen consumption
+    and defer their phi release to the next update (see _update_phi).
+
+    log has one row per step, columns LOG_FIELDS.
+    """
+    LOG_FIELDS = ('t', 'N', 'predicted', 'updated', 'held', 'residual', 'consumed')
+
+    def __init__(self, tol: float = FIELD_TOL, max_skip: int = FIELD_MAX_SKIP):
+        self.tol, self.max_skip = tol, max_skip
+        self.residual = np.inf     # no update yet: the first step always updates
+        self.n_ref    = 0
+        self.held     = 0          # steps held since the last update
+        self.consumed = 0.0        # oxygen consumed by the last update
+        self.log: list[tuple] = []
+        self._prev    = None       # float32 copy of the field before the update
+
+    def decide(self, N: int, force: bool = False) -> tuple[bool, float]:
+        """(update?, predicted change) for a step starting with N cells."""
+        n_ref     = max(self.n_ref, 1)
+        predicted = ((self.held + 1) * self.residual * max(N, 1) / n_ref
+                     + abs(N - self.n_ref) / n_ref)
+        return force or predicted >= self.tol or self.held >= self.max_skip, predicted
+
+    def snapshot(self, field: np.ndarray):
+        if self._prev is None or self._prev.shape != field.shape:
+            self._prev = np.empty(field.shape, dtype=np.float32)
+        np.copyto(self._prev, field, casting='same_kind')
+
+    def measure(self, field: np.ndarray) -> float:
+        """Relative L1 change of O_MAX − field since snapshot()."""
+        d = self._prev
+        d -= field
+        np.abs(d, out=d)
+        depletion = O_MAX * field.size - float(field.sum(dtype=np.float64))
+        return float(d.sum(dtype=np.float64)) / max(depletion, 1e-12)
+
+    def record(self, t: int, N: int, predicted: float, updated: bool, consumed: float):
+        self.log.append((t, N, float(predicted), updated, self.held, self.residual, float(consumed)))
+
+    def summary(self) -> dict:
+        """Updated / held step counts and the oxygen credited to held steps."""
+        held = [row for row in self.log if not row[3]]
+        return {'steps': len(self.log), 'updated': len(self.log) - len(held),
+                'held': len(held), 'credited_oxygen': float(sum(r[6] for r in held))}
+
+
+def compare_diffusion_solvers(L: int = L, D: float = D_OX, n_steps: int = N_OX,
+                              seed: int = SEED, n_fine: int = 200) -> dict:
+    """
+    Accuracy check of diffuse_spectral against diffuse_3d on a depleted-core
+    test field (O_MAX at the boundary, random uptake holes inside). Returns the
+    max / RMS absolute difference to the explicit result, the max difference
+    to an explicit reference run with n_fine sub-steps (the time-converged
+    solution), and the wall time of each solver.
+    """
+    import time
+    field = np.full((L, L, L), O_MAX)
+    holes = CounterRNG(seed).uniform(0, 0, np.arange(L ** 3)).reshape(L, L, L)
+    c, r  = L // 2, L // 4
+    field[c - r:c + r, c - r:c + r, c - r:c + r] *= holes[c - r:c + r, c - r:c + r, c - r:c + r]
+
+    out = {}
+    for name, solver in DIFFUSION_SOLVERS.items():
+        t0 = time.perf_counter()
+        out[name] = solver(field, D, n_steps)
+        out[f'{name}_sec'] = time.perf_counter() - t0
+    fine = field
+    for _ in range(n_fine):
+        fine = diffuse_3d(fine, D, 1, dt=n_steps * DT / n_fine)
+    diff = out['spectral'] - out['explicit']
+    return dict(max_abs_err=float(np.abs(diff).max()),
+                rms_err=float(np.sqrt(np.mean(diff ** 2))),
+                max_err_fine=float(np.abs(out['spectral'] - fine).max()),
+                explicit_sec=out['explicit_sec'], spectral_sec=out['spectral_sec'])
+
+
+# ─────────────────────────────────────────────
+#  QUASI-STEADY OXYGEN (FAS MULTIGRID)
+# ─────────────────────────────────────────────
+# Solves  −D ∇²O + w·V_MAX·O/(K_M + O) = f  on the interior of the lattice, with
+# the outer voxel layer held fixed (the same reservoir boundary as diffuse_3d)
+# and w the per-voxel density of oxygen-consuming cells. Necrotic sites are
+# pinned to O = 0 through an optional linear sink a·O (a = STEADY_PIN·D/dx²
+# there, 0 elsewhere), restricted by injection so coarse levels pin only
+# points that are pinned on the fine grid. Vertex-centred
+# coarsening: a level with n points per side has n//2 + 1 coarse points; when
+# n−1 is odd the fine grid is padded by one edge-replicated layer first.
+
+def _mg_coarse_size(n: int) -> int:
+    return n // 2 + 1
+
+def _mg_operator(u, w, D, h, a=None):
+    """Nonlinear operator N(u) on the interior (zero on the boundary layer)."""
+    c   = u[1:-1, 1:-1, 1:-1]
+    lap = (u[2:,   1:-1, 1:-1] + u[:-2,  1:-1, 1:-1] +
+           u[1:-1, 2:,   1:-1] + u[1:-1, :-2,  1:-1] +
+           u[1:-1, 1:-1, 2:  ] + u[1:-1, 1:-1, :-2  ] - 6.0 * c) / h ** 2
+    Nu  = np.zeros_like(u)
+    Nu[1:-1, 1:-1, 1:-1] = -D * lap + w[1:-1, 1:-1, 1:-1] * V_MAX * c / (K_M + c)
+    if a is not None:
+        Nu[1:-1, 1:-1, 1:-1] += a[1:-1, 1:-1, 1:-1] * c
+    return Nu
+
+def _mg_residual(u, f, w, D, h, a=None):
+    r = f - _mg_operator(u, w, D, h, a)
+    r[0, :, :] = r[-1, :, :] = r[:, 0, :] = r[:, -1, :] = r[:, :, 0] = r[:, :, -1] = 0.0
+    return r
+
+def _mg_smooth(u, f, w, D, h, red, n_sweeps, a=None):
+    """
+    Red-black nonlinear Gauss-Seidel (one pointwise Newton step per point),
+    updating the interior view of u in place; red is a 0/1 float mask.
+    """
+    k  = D / h ** 2
+    c  = u[1:-1, 1:-1, 1:-1]
+    fi = f[1:-1, 1:-1, 1:-1]
+    wv = w[1:-1, 1:-1, 1:-1] * V_MAX
+    ai = a[1:-1, 1:-1, 1:-1] if a is not None else 0.0
+    for _ in range(n_sweeps):
+        for color in (red, 1.0 - red):
+            nb = (u[2:,   1:-1, 1:-1] + u[:-2,  1:-1, 1:-1] +
+                  u[1:-1, 2:,   1:-1] + u[1:-1, :-2,  1:-1] +
+                  u[1:-1, 1:-1, 2:  ] + u[1:-1, 1:-1, :-2  ])
+            s  = 1.0 / (K_M + c)
+            r  = fi + k * (nb - 6.0 * c) - wv * c * s - ai * c
+            r /= 6.0 * k + wv * K_M * s * s + ai
+            r *= color
+            c += r
+            np.maximum(c, 0.0, out=c)
+    return u
+
+def _mg_pad(a, n_pad, mode):
+    p = n_pad - a.shape[0]
+    return a if p == 0 else np.pad(a, [(0, p)] * 3, mode=mode)
+
+def _mg_restrict(a, n_c, full_weight):
+    """Fine → coarse: injection (solution) or full weighting (residual, weights)."""
+    a = _mg_pad(a, 2 * (n_c - 1) + 1, 'edge' if not full_weight else 'constant')
+    if full_weight:
+        a = a.copy()
+        for axis in range(3):
+            sl = lambda s: tuple(s if ax == axis else slice(None) for ax in range(3))
+            a[sl(slice(1, -1))] = (0.25 * a[sl(slice(None, -2))] + 0.5 * a[sl(slice(1, -1))] +
+                                   0.25 * a[sl(slice(2, None))])
+    return a[::2, ::2, ::2].copy()
+
+def _mg_prolong(e, n_f):
+    """Coarse → fine trilinear interpolation, cropped to n_f points per side."""
+    for axis in range(3):
+        shape = list(e.shape)
+        shape[axis] = 2 * shape[axis] - 1
+        out = np.empty(shape)
+        sl  = lambda s: tuple(s if ax == axis else slice(None) for ax in range(3))
+        out[sl(slice(0, None, 2))] = e
+        out[sl(slice(1, None, 2))] = 0.5 * (e[sl(slice(None, -1))] + e[sl(slice(1, None))])
+        e = out
+    return e[:n_f, :n_f, :n_f]
+
+@functools.lru_cache(maxsize=32)
+def _mg_red_mask(n: int) -> np.ndarray:
+    """Checkerboard 0/1 mask over the n−2 interior points per side."""
+    i = np.arange(n - 2)
+    red = ((i[:, None, None] + i[None, :, None] + i[None, None, :]) % 2 == 0).astype(np.float64)
+    red.setflags(write=False)
+    return red
+
+def _fas_vcycle(u, f, w, D, h, nu=2, n_coarsest=5, a=None):
+    n   = u.shape[0]
+    red = _mg_red_mask(n)
+    if n <= n_coarsest:
+        return _mg_smooth(u, f, w, D, h, red, 40, a)
+
+    u   = _mg_smooth(u, f, w, D, h, red, nu, a)
+    n_c = _mg_coarse_size(n)
+    r   = _mg_residual(u, f, w, D, h, a)
+    w_c = _mg_restrict(w, n_c, full_weight=True)
+    a_c = _mg_restrict(a, n_c, full_weight=False) if a is not None else None
+    u_c0 = _mg_restrict(u, n_c, full_weight=False)
+    f_c  = _mg_operator(u_c0, w_c, D, 2 * h, a_c) + _mg_restrict(r, n_c, full_weight=True)
+    u_c  = _fas_vcycle(u_c0.copy(), f_c, w_c, D, 2 * h, nu, n_coarsest, a_c)
+
+    u += _mg_prolong(u_c - u_c0, n)
+    np.maximum(u, 0.0, out=u)
+    return _mg_smooth(u, f, w, D, h, red, nu, a)
+
+def solve_steady_oxygen(O: np.ndarray, w: np.ndarray, D: float = D_OX_STEP, dx: float = DX,
+                        tol: float = STEADY_TOL, max_cycles: int = STEADY_MAX_CYCLES,
+                        pinned: np.ndarray | None = None):
+    """
+    Quasi-steady oxygen field for the uptake weights w, warm-started from O
+    (whose outer layer supplies the boundary values). Sites where the boolean
+    mask pinned is set (necrotic tissue) are held at 0. Runs FAS V-cycles
+    until the max-norm residual drops below tol. Returns (O, n_cycles, residual).
+    """
+    u = np.maximum(np.asarray(O, dtype=np.float64), 0.0)
+    w = np.asarray(w, dtype=np.float64)
+    f = np.zeros_like(u)
+    a = None
+    if pinned is not None and pinned.any():
+        a = pinned * (STEADY_PIN * D / dx ** 2)
+        u[pinned] = 0.0
+    res = float(np.abs(_mg_residual(u, f, w, D, dx, a)).max())
+    n_cycles = 0
+    while res > tol and n_cycles < max_cycles:
+        u   = _fas_vcycle(u, f, w, D, dx, a=a)
+        res = float(np.abs(_mg_residual(u, f, w, D, dx, a)).max())
+        n_cycles += 1
+    if a is not None:
+        u[pinned] = 0.0
+    return u, n_cycles, res
+
+def benchmark_oxygen_models(sizes=(40, 80, 160), radius_frac: float = 0.25,
+                            run_L: int = 30, run_steps: int = 25,
+                            seeds=(5, 6, 7)) -> tuple[list[dict], list[dict]]:
+    """
+    Time one oxygen update per step for the transient model (uptake + diffuse_3d)
+    and the steady model (solve_steady_oxygen) on a spherical tumour of radius
+    radius_frac·L. The steady solve is timed cold (from O_MAX) and warm (from
+    the previous solution after the tumour grows by one voxel shell).
+
+    Then run both models for run_steps steps at L = run_L for each seed and
+    compare the sweep's objectives (batch_sweep.objectives_from_components):
+    a faster steady solve is only worth having if the objectives agree.
+    Returns (timing rows, objective rows).
+    """
+    import time
+    import batch_sweep as bs
+    rows = []
+    for n in sizes:
+        i  = np.arange(n) - n // 2
+        r2 = i[:, None, None] ** 2 + i[None, :, None] ** 2 + i[None, None, :] ** 2
+        R  = radius_frac * n
+        w0 = (r2 <= R ** 2).astype(np.float64)
+        w1 = (r2 <= (R + 1) ** 2).astype(np.float64)
+
+        O  = np.full((n, n, n), O_MAX)
+        t0 = time.perf_counter()
+        O  = np.clip(O - w0 * (V_MAX * O / (K_M + O)), 0.0, O_MAX)
+        diffuse_3d(O, D_OX, N_OX)
+        t_transient = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        O_s, cyc_cold, _ = solve_steady_oxygen(np.full((n, n, n), O_MAX), w0)
+        t_cold = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        _, cyc_warm, res = solve_steady_oxygen(O_s, w1)
+        t_warm = time.perf_counter() - t0
+
+        rows.append(dict(L=n, transient_sec=t_transient, steady_cold_sec=t_cold,
+                         steady_cold_cycles=cyc_cold, steady_warm_sec=t_warm,
+                         steady_warm_cycles=cyc_warm, residual=res))
+        print(f"  L={n:4d} | transient {t_transient:7.3f}s | steady cold {t_cold:7.3f}s "
+              f"({cyc_cold} cyc) | warm {t_warm:7.3f}s ({cyc_warm} cyc, res {res:.1e})")
+
+    keys = ('fitness', 'mei', 'ncf', 'dissipation')
+    objs = []
+    for seed in seeds:
+        row = dict(L=run_L, n_steps=run_steps, seed=seed)
+        for model in ('transient', 'steady'):
+            sim = TumorSimulation(L=run_L, seed=seed, oxygen_model=model)
+            t0 = time.perf_counter()
+            sim.run(n_steps=run_steps, verbose=False)
+            row[f'{model}_sec'] = time.perf_counter() - t0
+            row[f'{model}_cells'] = sim.n_cells()
+            o = bs.objectives_from_components(sim.n_cells(), sim.n_necrotic(),
+                                              int(sum(sim.history['metastatic_cells'])),
+                                              float(sim.total_oxygen_consumed))
+            row.update({f'{model}_{k}': o[k] for k in keys})
+            sim.close()
+        row.update({f'diff_{k}': row[f'steady_{k}'] - row[f'transient_{k}'] for k in keys})
+        objs.append(row)
+        print(f"  seed={seed:3d} | cells {row['transient_cells']:6d} → {row['steady_cells']:6d} | "
+              + " | ".join(f"{k} {row[f'transient_{k}']:.4g} → {row[f'steady_{k}']:.4g}" for k in keys))
+    if objs:
+        print("  mean steady − transient: "
+              + " | ".join(f"{k} {np.mean([r[f'diff_{k}'] for r in objs]):+.4g}" for k in keys))
+    return rows, objs
+
+
+# ─────────────────────────────────────────────
+#  STEADY-STATE DETECTION
+# ─────────────────────────────────────────────
+class SteadyStateDetector:
+    """
+    Decides after every step whether the run has reached a steady state.
+
+    Over the last `window` steps it measures the spread (max − min) of
+        population       — relative to its window mean
+        avg_C            — absolute
+        metastatic_rate  — metastatic events per cell, absolute
+    and reports convergence once every spread is within tol and the mean
+    population is at least min_population. An empty lattice is absorbing
+    (dead cells do not return and metastatic daughters leave), so extinction
+    converges at once. After a True from update(), oxygen_rate holds the
+    window's mean oxygen consumption per step (0 for extinction), which is
+    what the padded steps are credited with.
+    """
+    KEYS = ('population', 'avg_C', 'metastatic_rate')
+
+    def __init__(self, window: int = CONVERGE_WINDOW, tol: dict | None = None,
+                 min_population: int = CONVERGE_MIN_POP):
+        if window < 2:
+            raise ValueError(f"convergence window must be ≥ 2 steps, got {window}")
+        self.window, self.min_population = window, min_population
+        self.tol = dict(CONVERGE_TOL, **(tol or {}))
+        self.spread: dict = {}
+        self.oxygen_rate = 0.0
+        self._oxygen: list[float] = []     # cumulative consumption after each step
+
+    def update(self, sim) -> bool:
+        """Record the step sim just took; True if it is in a steady state."""
+        self._oxygen = (self._oxygen + [sim.total_oxygen_consumed])[-(self.window + 1):]
+        h, w = sim.history, self.window
+        if h['population'][-1] == 0:
+            self.oxygen_rate = 0.0
+            return True
+        if len(h['population']) < w:
+            return False
+        pop = np.asarray(h['population'][-w:], dtype=np.float64)
+        if pop.mean() < self.min_population:
+            return False
+        meta = np.asarray(h['metastatic_cells'][-w:], dtype=np.float64) / np.maximum(pop, 1.0)
+        self.spread = {'population': float(np.ptp(pop) / pop.mean()),
+                       'avg_C': float(np.ptp(h['avg_C'][-w:])),
+                       'metastatic_rate': float(np.ptp(meta))}
+        if any(self.spread[k] > self.tol[k] for k in self.KEYS):
+            return False
+        O = self._oxygen
+        self.oxygen_rate = (O[-1] - O[0]) / (len(O) - 1) if len(O) > 1 else 0.0
+        return True
+
+
+# ─────────────────────────────────────────────
+#  ONLINE RADIAL STATISTICS
+# ─────────────────────────────────────────────
+class RadialProfiler:
+    """
+    Shell-averaged profiles recorded in-step, without dumps or offline passes.
+
+    The shell of every lattice site, floor(|x − c| / bin_width) about the
+    centre c = L//2 (the seed site), is computed once. Each record() then
+    reduces the lattice to one row per profile with np.bincount:
+        oxygen, phi        — field mean over the shell's voxels
+        density            — cells per voxel in the shell
+        necrotic_fraction  — necrotic / all cells in the shell (0 where empty)
+    plus the radius of gyration of the cell positions. Only occupied sites
+    are gathered for the cell profiles; the two field sums are one weighted
+    bincount each over the lattice. In hybrid runs core voxels contribute
+    their rho_live / rho_nec densities.
+
+    profiles() stacks the rows into (steps, n_bins) arrays; see also
+    TumorSimulation.save_radial.
+    """
+    PROFILES = ('oxygen', 'phi', 'density', 'necrotic_fraction')
+
+    def __init__(self, L: int, bin_width: float = RADIAL_BIN_WIDTH):
+        c = L // 2
+        i = (np.arange(L) - c) ** 2
+        r = np.sqrt(i[:, None, None] + i[None, :, None] + i[None, None, :])
+        self.L, self.bin_width = L, bin_width
+        self.bins    = (r / bin_width).astype(np.intp).reshape(-1)
+        self.n_bins  = int(self.bins.max()) + 1
+        self.voxels  = np.bincount(self.bins, minlength=self.n_bins)
+        self.radii   = (np.arange(self.n_bins) + 0.5) * bin_width   # shell mid-radius
+        self._centre = c
+        self.rows: list[np.ndarray] = []      # (len(PROFILES), n_bins) float32 per step
+        self.r_gyration: list[float] = []
+
+    def record(self, sim):
+        """Append the profiles of sim's current state."""
+        n = self.n_bins
+        occ = np.flatnonzero(sim.occupied.reshape(-1))
+        nec = np.flatnonzero(sim.necrotic_sites.reshape(-1))
+        if sim.hybrid:
+            core  = sim.core.reshape(-1)
+            w     = (sim.rho_live.reshape(-1)[occ] + sim.rho_nec.reshape(-1)[occ]
+                     + ~core[occ]).astype(np.float64)
+            cells = np.bincount(self.bins[occ], weights=w, minlength=n)
+            necro = (np.bincount(self.bins[nec], minlength=n)
+                     + np.bincount(self.bins[occ], weights=sim.rho_nec.reshape(-1)[occ], minlength=n))
+        else:
+            w     = None
+            cells = np.bincount(self.bins[occ], minlength=n).astype(np.float64)
+            necro = np.bincount(self.bins[nec], minlength=n)
+
+        row = np.empty((len(self.PROFILES), n), dtype=np.float32)
+        row[0] = np.bincount(self.bins, weights=sim.oxygen.reshape(-1), minlength=n) / self.voxels
+        row[1] = np.bincount(self.bins, weights=sim.phi.reshape(-1), minlength=n) / self.voxels
+        row[2] = cells / self.voxels
+        np.divide(necro, cells, out=row[3], where=cells > 0)
+        row[3][cells <= 0] = 0.0
+        self.rows.append(row)
+
+        # Radius of gyration from first and second moments about the centre
+        total = float(cells.sum())
+        if total > 0:
+            L = self.L
+            p = np.stack(np.unravel_index(occ, (L, L, L))).astype(np.float64) - self._centre
+            m1 = p @ w / total if w is not None else p.sum(axis=1) / total
+            m2 = float(((p * p).sum(axis=0) @ w) if w is not None else (p * p).sum()) / total
+            self.r_gyration.append(float(np.sqrt(max(m2 - m1 @ m1, 0.0))))
+        else:
+            self.r_gyration.append(0.0)
+
+    def pad(self, n: int):
+        """Repeat the last row n times (runs stopped early, see batch_sweep)."""
+        if self.rows:
+            self.rows.extend([self.rows[-1]] * n)
+            self.r_gyration.extend([self.r_gyration[-1]] * n)
+
+    def profiles(self) -> dict:
+        """Every profile as a (steps, n_bins) array, plus radii, voxels and r_gyration."""
+        block = np.stack(self.rows) if self.rows else np.zeros((0, len(self.PROFILES), self.n_bins),
+                                                               dtype=np.float32)
+        out = {name: block[:, k] for k, name in enumerate(self.PROFILES)}
+        out.update(radii=self.radii, voxels=self.voxels,
+                   r_gyration=np.array(self.r_gyration, dtype=np.float64))
+        return out
+
+
 # ─────────────────────────────────────────────
 #  MAIN SIMULATION CLASS
 # ─────────────────────────────────────────────
 class TumorSimulation:
-    def __init__(self, L=L, alpha=ALPHA, beta=BETA, seed=SEED):
+    """
+    All randomness comes from a per-simulation CounterRNG: every draw is
+    addressed by (step, purpose, lattice site[, sub]), so results do not depend
+    on the order cells are processed in, and several simulations can share a
+    process or thread without touching global random state.
+
+    rng_mode selects the CounterRNG key:
+      'independent' — hash of (seed, alpha, beta, GAMMA, N_A): every parameter
+                      combination gets its own noise.
+      'crn'         — the seed alone (common random numbers): runs with the
+                      same seed but different parameters see correlated noise,
+                      so paired differences have low variance.
+
+    hybrid=True enables the multiscale mode: cells whose 18 neighbours are all
+    occupied (the necrotic and quiescent core) leave self.cells and are held as
+    per-voxel density fields (rho_live, rho_nec, core_hyp, core_cond) that are
+    updated with vectorised mean-field kinetics. Only the proliferating rim
+    stays agent-based; voxels are converted back to agents (by stochastic
+    rounding of the densities) as soon as they gain an empty neighbour. Core
+    divisions stay inside the continuum update: they refill the voxel's own
+    vacancy, and attempts that find none are contact-inhibited instead of
+    starting metastatic walks, so a step costs O(rim agents) plus a fixed
+    number of passes over the core. Use n_cells() /
+    n_necrotic() for counts, and materialize_core() before per-cell analysis.
+
+    ox_solver / phi_solver pick the diffusion solver for each field from
+    DIFFUSION_SOLVERS ('explicit' or 'spectral').
+
+    oxygen_model='steady' replaces the per-step uptake + diffusion sub-steps
+    with the quasi-steady field of D_OX_STEP ∇²O = Q(O)·mask (solve_steady_oxygen),
+    warm-started from the previous step; ox_solver is then unused.
+
+    windowed=True confines transient oxygen and phi updates to the tumour's
+    bounding box grown by a diffusion margin (see _field_window); the steady
+    model always solves the full lattice.
+
+    threads > 1 runs the transient field kernels (stencil, uptake, supply) on
+    that many threads over slabs of the lattice; results are bit-identical to
+    threads=1. Call close() to release the pool when the simulation is done.
+
+    adaptive_fields=True lets a FieldScheduler (self.field_schedule) hold the
+    fields on steps where their predicted change is below FIELD_TOL; its log
+    records every decision (save_field_log_csv, audit_field_schedule).
+
+    dtype='float32' stores oxygen, phi and the field workspace in single
+    precision and runs every field kernel in it, halving field memory and
+    bandwidth; consumption sums and cell fate probabilities stay float64
+    (validate_precision compares the objectives against float64 runs).
+
+    radial_stats=True attaches a RadialProfiler (self.radial) that appends
+    shell profiles of oxygen, phi, cell density and necrotic fraction, and the
+    radius of gyration, after every step (save_radial exports them).
+
+    converge=True attaches a SteadyStateDetector (self.steady). Once it fires,
+    run() stops simulating, pads the remaining steps with the last history
+    row and the window's oxygen consumption rate, and records the step in
+    converged_at (None while the run is simulated to the end).
+    """
+    def __init__(self, L=L, alpha=ALPHA, beta=BETA, seed=SEED, rng_mode=RNG_MODE,
+                 hybrid=HYBRID, ox_solver=OX_SOLVER, phi_solver=PHI_SOLVER,
+                 oxygen_model=OXYGEN_MODEL, windowed=FIELD_WINDOW, threads=FIELD_THREADS,
+                 adaptive_fields=FIELD_SCHEDULE, dtype=FIELD_DTYPE, radial_stats=RADIAL_STATS,
+                 converge=CONVERGE):
+        if rng_mode not in ('independent', 'crn'):
+            raise ValueError(f"rng_mode must be 'independent' or 'crn', got {rng_mode!r}")
+        for name in (ox_solver, phi_solver):
+            if name not in DIFFUSION_SOLVERS:
+                raise ValueError(f"diffusion solver must be one of {sorted(DIFFUSION_SOLVERS)}, "
+                                 f"got {name!r}")
+        if dtype not in ('float32', 'float64', np.float32, np.float64):
+            raise ValueError(f"dtype must be 'float32' or 'float64', got {dtype!r}")
+        self.dtype = np.dtype(dtype)
+        self._diffuse_ox  = DIFFUSION_SOLVERS[ox_solver]
+        self._diffuse_phi = DIFFUSION_SOLVERS[phi_solver]
+        if oxygen_model not in ('transient', 'steady'):
+            raise ValueError(f"oxygen_model must be 'transient' or 'steady', got {oxygen_model!r}")
+        self.oxygen_model  = oxygen_model
+        self.steady_cycles = 0      # V-cycles used by the last steady solve
+        self.field_schedule = FieldScheduler() if adaptive_fields else None
+
+        # Active-region tracking: tumour bounding box (grow-only, [lo, hi])
+        # and per-field boxes of voxels that differ from the far-field value
+        self.windowed  = windowed
+        self._tumor_lo = [L, L, L]
+        self._tumor_hi = [-1, -1, -1]
+        self._ox_box   = None
+        self._phi_box  = None
         self.L     = L
         self.alpha = alpha
         self.beta  = beta
-        self.rng   = np.random.default_rng(seed)
-        random.seed(seed)
+        self.rng_mode = rng_mode
+        if rng_mode == 'crn':
+            self.crng = CounterRNG(seed)
+        else:
+            self.crng = CounterRNG.from_parts(seed, alpha, beta, GAMMA, N_A)
 
-        # Lattice: None = empty, Cell object = occupied
-        self.lattice = np.full((L, L, L), None, dtype=object)
+        self._allocate_state(L, threads)
 
-        # Continuous fields
-        # oxygen: concentration field, starts fully oxygenated everywhere
-        self.oxygen = np.ones((L, L, L)) * O_MAX
-        self.phi    = np.zeros((L, L, L))   # pro-angiogenic factor
+        # Hybrid core: per-voxel densities of living / necrotic cells, their
+        # hypoxia clock and the condensing fraction of the living density
+        self.hybrid = hybrid
+        if hybrid:
+            self.core      = np.zeros((L, L, L), dtype=bool)
+            self.rho_live  = np.zeros((L, L, L), dtype=np.float32)
+            self.rho_nec   = np.zeros((L, L, L), dtype=np.float32)
+            self.core_hyp  = np.zeros((L, L, L), dtype=np.float32)
+            self.core_cond = np.zeros((L, L, L), dtype=np.float32)
+            self._vacated: list[int] = []   # sites emptied since the last core sync
 
         # State tracking
         self.cells: list[Cell] = []
         self._cell_idx: dict[int, int] = {}
         self.angiogenic_on = False
         self.t             = 0
+        self.trajectory    = None   # event sink (trajectory_log.TrajectoryRecorder)
+        self.lineage       = None   # clone tracker (lineage.LineageRecorder)
+        self.radial        = RadialProfiler(L) if radial_stats else None
+        self.steady        = SteadyStateDetector() if converge else None
+        self.converged_at  = None   # step at which run() stopped on a steady state
 
         # Cumulative oxygen consumed across the entire run (used for fitness scoring).
         # Incremented each step as max(0, O_before - O_after) so that angiogenic
         # restoration steps (where net change is negative) contribute zero.
         self.total_oxygen_consumed: float = 0.0
+        self.last_fate_stats = (0.0, 0.0, 0.0, 0.0, 0)   # (n_alive, Σb, Σd, ΣC, metastatic)
 
         # History for plotting
         self.history = {
@@ -177,6 +1024,7 @@ class TumorSimulation:
             'avg_d':             [],
             'avg_C':             [],
             'R_ratio':           [],
+            'surface_area':      [],   # exposed cell faces (surface index)
         }
 
         # Seed initial tumor cell at center
@@ -185,28 +1033,292 @@ class TumorSimulation:
 
     # ── Internal helpers ─────────────────────────────────────────────────────
 
-    def _place_cell(self, x: int, y: int, z: int):
-        """Create and place a new cell at (x,y,z)."""
-        condensing = bool(self.rng.integers(0, 2))
-        cell = Cell(x, y, z, condensing)
-        idx  = len(self.cells)
-        self.cells.append(cell)
-        self._cell_idx[id(cell)] = idx
-        self.lattice[x, y, z]   = cell
+    def _allocate_state(self, L: int, threads: int):
+        """Lattice, occupancy, fields and workspace (overridden for shared-memory subdomains)."""
+        # Lattice: None = empty, Cell object = occupied (_CORE = hybrid core voxel)
+        self.lattice  = np.full((L, L, L), None, dtype=object)
+        self.occupied = np.zeros((L, L, L), dtype=bool)
+        # Sites of necrotic agents (dense uptake masks are built from these maps)
+        self.necrotic_sites = np.zeros((L, L, L), dtype=bool)
+
+        # Surface index, kept up to date by _set_occupied: occupied 6- and
+        # 18-neighbours of every site, the frontier (empty sites with an
+        # occupied 18-neighbour, as flat site ids) and the exposed-face count
+        self.n_occ6       = np.zeros((L, L, L), dtype=np.int8)
+        self.n_occ18      = np.zeros((L, L, L), dtype=np.int8)
+        self.frontier     = set()
+        self.surface_area = 0
+        self._off6  = np.array([(dx * L + dy) * L + dz for dx, dy, dz in NEIGHBORS_6])
+        self._off18 = np.array([(dx * L + dy) * L + dz for dx, dy, dz in NEIGHBORS_18])
+        self._flat  = (self.n_occ6.reshape(-1), self.n_occ18.reshape(-1), self.occupied.reshape(-1))
 
-    def _remove_cell(self, cell: Cell):
-        cell.alive = False
-        self.lattice[cell.x, cell.y, cell.z] = None
- 
+        # Continuous fields
+        # oxygen: concentration field, starts fully oxygenated everywhere
+        self.oxygen = np.full((L, L, L), O_MAX, dtype=self.dtype)
+        self.phi    = np.zeros((L, L, L), dtype=self.dtype)   # pro-angiogenic factor
+        # Scratch buffers for the in-place field pipeline (see FieldWorkspace)
+        self.ws     = FieldWorkspace((L, L, L), threads=threads, dtype=self.dtype)
+
+    def _site(self, x, y, z):
+        """Flat lattice index of (x,y,z); the id used for counter-based draws."""
+        return (x * self.L + y) * self.L + z
+
+    def _attach_cell(self, cell: Cell):
+        """Register an existing Cell object on the lattice and in self.cells."""
+        lo, hi = self._tumor_lo, self._tumor_hi
+        for a, v in enumerate((cell.x, cell.y, cell.z)):
+            if v < lo[a]:
+                lo[a] = v
+            if v > hi[a]:
+                hi[a] = v
+        self._cell_idx[id(cell)] = len(self.cells)
+        self.cells.append(cell)
+        self.lattice[cell.x, cell.y, cell.z]  = cell
+        self._set_occupied(cell.x, cell.y, cell.z, True)
+        if cell.necrotic:
+            self.necrotic_sites[cell.x, cell.y, cell.z] = True
+
+    def _detach_cell(self, cell: Cell):
+        """Drop a cell from self.cells (swap-with-last); the lattice is untouched."""
+        self.necrotic_sites[cell.x, cell.y, cell.z] = False
         idx  = self._cell_idx.pop(id(cell))
         last = self.cells[-1]
         self.cells[idx] = last
         self._cell_idx[id(last)] = idx
         self.cells.pop()
 
+    def _place_cell(self, x: int, y: int, z: int, parent_site: int = -1):
+        """Create and place a new cell at (x,y,z); parent_site is the dividing cell's site."""
+        site = self._site(x, y, z)
+        condensing = bool(self.crng.uniform(self.t, RNG_PHENOTYPE, site) < 0.5)
+        self._attach_cell(Cell(x, y, z, condensing))
+        if self.trajectory is not None:
+            self.trajectory.birth(site, condensing)
+        if self.lineage is not None:
+            self.lineage.birth(site, parent_site, condensing)
+
+    def _remove_cell(self, cell: Cell):
+        cell.alive = False
+        self.lattice[cell.x, cell.y, cell.z]  = None
+        self._set_occupied(cell.x, cell.y, cell.z, False)
+        self._detach_cell(cell)
+        if self.hybrid:
+            self._vacated.append(self._site(cell.x, cell.y, cell.z))
+        if self.trajectory is not None:
+            self.trajectory.removal(self._site(cell.x, cell.y, cell.z), cell.necrotic)
+        if self.lineage is not None:
+            self.lineage.removal(self._site(cell.x, cell.y, cell.z), cell.necrotic)
+
     def _in_bounds(self, x, y, z):
         return 0 <= x < self.L and 0 <= y < self.L and 0 <= z < self.L
 
+    # ── Surface index (incremental neighbour counts and frontier) ────────────
+
+    def _capacity(self, x, y, z):
+        """(in-bounds 6-neighbours, in-bounds 18-neighbours) of a site; works on arrays."""
+        L = self.L
+        nx, ny, nz = (2 - (v == 0) - (v == L - 1) for v in (x, y, z))
+        cap6 = nx + ny + nz
+        return cap6, cap6 + nx * ny + nx * nz + ny * nz
+
+    def _neighbour_ids(self, x: int, y: int, z: int, offsets, offsets_flat) -> np.ndarray:
+        """Flat ids of the in-bounds neighbours of (x,y,z) for the given offsets."""
+        L = self.L
+        s = self._site(x, y, z)
+        if 0 < x < L - 1 and 0 < y < L - 1 and 0 < z < L - 1:
+            return s + offsets_flat
+        inb = [self._in_bounds(x + dx, y + dy, z + dz) for dx, dy, dz in offsets]
+        return s + offsets_flat[np.array(inb)]
+
+    def _set_occupied(self, x: int, y: int, z: int, value: bool):
+        """Set the occupancy of a site and update the surface index around it."""
+        if self.occupied[x, y, z] == value:
+            return
+        self.occupied[x, y, z] = value
+        self._track_occupancy(x, y, z, 1 if value else -1)
+
+    def _track_occupancy(self, x: int, y: int, z: int, delta: int):
+        """Apply a birth (delta=+1) or vacancy (delta=−1) at (x,y,z) to the surface index."""
+        s = self._site(x, y, z)
+        n6, n18, occ = self._flat
+        nb6  = self._neighbour_ids(x, y, z, NEIGHBORS_6, self._off6)
+        nb18 = self._neighbour_ids(x, y, z, NEIGHBORS_18, self._off18)
+        n6[nb6] += delta
+        c18 = n18[nb18]
+        c18 += delta
+        n18[nb18] = c18
+
+        # The site's own exposed faces appear / vanish; each occupied face
+        # neighbour loses / regains one
+        self.surface_area += delta * (int(self._capacity(x, y, z)[0]) - 2 * int(n6[s]))
+
+        # Empty neighbours whose count crossed 0 ↔ 1 enter / leave the frontier
+        crossed = [j for j in nb18[c18 == (1 if delta > 0 else 0)].tolist() if not occ[j]]
+        if delta > 0:
+            self.frontier.discard(s)
+            self.frontier.update(crossed)
+        else:
+            self.frontier.difference_update(crossed)
+            if n18[s] > 0:
+                self.frontier.add(s)
+
+    def _occupied_6(self, x: int, y: int, z: int) -> int:
+        """Occupied 6-neighbours of (x,y,z)."""
+        return int(self.n_occ6[x, y, z])
+
+    def _has_empty_18(self, x: int, y: int, z: int) -> bool:
+        """True if any in-bounds 18-neighbour of (x,y,z) is empty."""
+        return int(self.n_occ18[x, y, z]) < self._capacity(x, y, z)[1]
+
+    def _enclosed(self, xs, ys, zs) -> np.ndarray:
+        """True where all 18 neighbours of (xs,ys,zs) are in bounds and occupied."""
+        L = self.L
+        return ((self.n_occ18[xs, ys, zs] == 18) &
+                (xs > 0) & (xs < L - 1) & (ys > 0) & (ys < L - 1) & (zs > 0) & (zs < L - 1))
+
+    # ── Population counts (agents + hybrid core) ─────────────────────────────
+
+    def n_cells(self) -> int:
+        """Total cells: agents plus, in hybrid mode, the rounded core density."""
+        n = len(self.cells)
+        if self.hybrid:
+            n += int(round(float(self.rho_live.sum(dtype=np.float64) +
+                                 self.rho_nec.sum(dtype=np.float64))))
+        return n
+
+    def n_necrotic(self) -> int:
+        """Necrotic cells: agents plus, in hybrid mode, the rounded core necrotic density."""
+        n = sum(1 for c in self.cells if c.necrotic)
+        if self.hybrid:
+            n += int(round(float(self.rho_nec.sum(dtype=np.float64))))
+        return n
+
+    # ── Hybrid continuum core ────────────────────────────────────────────────
+
+    def _agent_to_core(self, cell: Cell):
+        """Coarse-grain an enclosed agent into the core density fields."""
+        x, y, z = cell.x, cell.y, cell.z
+        self._detach_cell(cell)
+        self.lattice[x, y, z]   = _CORE
+        self.core[x, y, z]      = True
+        self.rho_live[x, y, z]  = 0.0 if cell.necrotic else 1.0
+        self.rho_nec[x, y, z]   = 1.0 if cell.necrotic else 0.0
+        self.core_hyp[x, y, z]  = cell.hypoxia_time
+        self.core_cond[x, y, z] = 1.0 if cell.condensing else 0.0
+
+    def _core_to_agents(self, sites: np.ndarray):
+        """
+        Convert core voxels back to agents. Each voxel becomes a living cell with
+        probability rho_live, a necrotic cell with probability rho_nec, and is
+        left empty otherwise (which may expose further core voxels).
+        """
+        L = self.L
+        xs, ys, zs = np.unravel_index(sites, (L, L, L))
+        u_state = self.crng.uniform(self.t, RNG_CORE, sites, 0)
+        u_pheno = self.crng.uniform(self.t, RNG_CORE, sites, 1)
+        for i, (x, y, z) in enumerate(zip(xs.tolist(), ys.tolist(), zs.tolist())):
+            rl, rn = float(self.rho_live[x, y, z]), float(self.rho_nec[x, y, z])
+            self.core[x, y, z] = False
+            self.rho_live[x, y, z] = self.rho_nec[x, y, z] = 0.0
+            if u_state[i] < rl + rn:
+                cell = Cell(x, y, z, condensing=bool(u_pheno[i] < self.core_cond[x, y, z]))
+                cell.hypoxia_time = int(round(float(self.core_hyp[x, y, z])))
+                if u_state[i] >= rl:
+                    cell.alive, cell.necrotic = False, True
+                self._attach_cell(cell)
+            else:
+                self.lattice[x, y, z] = None
+                self._set_occupied(x, y, z, False)
+                self._vacated.append(int(sites[i]))
+
+    def _sync_core(self):
+        """
+        Move the agent/continuum boundary: core voxels next to a vacated site
+        (cascading while reconversion leaves voxels empty) become agents, then
+        every enclosed agent is absorbed into the core.
+        """
+        L = self.L
+        while self._vacated:
+            xs, ys, zs = np.unravel_index(np.unique(self._vacated), (L, L, L))
+            self._vacated.clear()
+            cand = []
+            for dx, dy, dz in NEIGHBORS_18:
+                nx, ny, nz = xs + dx, ys + dy, zs + dz
+                inb = (nx >= 0) & (nx < L) & (ny >= 0) & (ny < L) & (nz >= 0) & (nz < L)
+                nx, ny, nz = nx[inb], ny[inb], nz[inb]
+                hit = self.core[nx, ny, nz]
+                cand.append(self._site(nx[hit], ny[hit], nz[hit]))
+            cand = np.unique(np.concatenate(cand)) if cand else np.empty(0, dtype=np.int64)
+            if cand.size:
+                cx, cy, cz = np.unravel_index(cand, (L, L, L))
+                exposed = cand[~self._enclosed(cx, cy, cz)]
+                if exposed.size:
+                    self._core_to_agents(exposed)
+
+        if self.cells:
+            n  = len(self.cells)
+            xs = np.fromiter((c.x for c in self.cells), dtype=np.int64, count=n)
+            ys = np.fromiter((c.y for c in self.cells), dtype=np.int64, count=n)
+            zs = np.fromiter((c.z for c in self.cells), dtype=np.int64, count=n)
+            enclosed = np.flatnonzero(self._enclosed(xs, ys, zs))
+            for cell in [self.cells[i] for i in enclosed]:
+                self._agent_to_core(cell)
+
+    def _update_core(self) -> dict:
+        """
+        Vectorised mean-field update of the core, mirroring the agent rules:
+          hypoxia clock += 2 / 1 / −1 by oxygen level; living density turns
+          necrotic once the clock reaches NECROSIS_DELAY; necrotic density is
+          cleared at NECROTIC_CLEAR_RATE; living density dies at rate d and
+          attempts division at rate min(b, 1−d). Divisions stay inside the
+          continuum: attempts refill the voxel's own vacancy in expectation,
+          and the remainder, which finds no room in an enclosed voxel, is
+          contact-inhibited rather than started as a walk, so the update costs
+          a fixed number of array passes whatever the division count.
+        Returns per-step sums used for the population averages.
+        """
+        idx = np.flatnonzero(self.core)
+        if idx.size == 0:
+            return dict(n_live=0.0, sum_b=0.0, sum_d=0.0, sum_C=0.0)
+
+        O    = self.oxygen.ravel()[idx]
+        rl   = self.rho_live.ravel()[idx].astype(np.float64)
+        rn   = self.rho_nec.ravel()[idx].astype(np.float64)
+        hyp  = self.core_hyp.ravel()[idx].astype(np.float64)
+        cond = self.core_cond.ravel()[idx].astype(np.float64)
+
+        inc = np.where(O < O_NECROSIS, 2, np.where(O < O_HYPOXIA, 1, -1))
+        hyp = np.maximum(hyp + inc, 0.0)
+        turn = (hyp >= NECROSIS_DELAY) & (rl > 0)
+        rn   = rn + np.where(turn, rl, 0.0)
+        rl   = np.where(turn, 0.0, rl)
+        rn  *= 1.0 - NECROTIC_CLEAR_RATE
+
+        C = np.clip(1.0 - O / O_MAX, 0.0, 1.0)
+        d = self.alpha * C
+        b = np.clip(self.beta * (1.0 + GAMMA * (2.0 * cond - 1.0) - C), 0.0, 1.0)
+        b[hyp > 0] *= 0.75
+        p_div = np.clip(np.minimum(d + b, 1.0) - d, 0.0, 1.0)
+
+        n_live = rl.sum()
+        stats  = dict(n_live=float(n_live), sum_b=float((rl * b).sum()),
+                      sum_d=float((rl * d).sum()), sum_C=float((rl * C).sum()))
+
+        attempts = rl * p_div
+        rl  = rl * (1.0 - d)
+        vac = np.clip(1.0 - rl - rn, 0.0, 1.0)
+        rl += attempts * vac
+
+        self.rho_live.ravel()[idx] = rl
+        self.rho_nec.ravel()[idx]  = rn
+        self.core_hyp.ravel()[idx] = hyp
+        return stats
+
+    def materialize_core(self):
+        """Convert the whole hybrid core back into Cell agents (for per-cell export)."""
+        if self.hybrid:
+            self._core_to_agents(np.flatnonzero(self.core))
+
     # ── Probability equations ────────────────────────────────────
 
     def C_ratio(self, x, y, z) -> float:
@@ -234,82 +1346,234 @@ class TumorSimulation:
 
     # ── Angiogenic switch & diffusion ──────────────────────────
 
-    def _consume_oxygen(self):
+    # ── Active-region windowing ──────────────────────────────────────────
+
+    def _full_window(self) -> tuple:
+        return (slice(0, self.L),) * 3
+
+    def _field_window(self, box, D: float, n_steps: int):
+        """
+        Update window for one field: the union of its active box and the
+        tumour bounding box, grown by WINDOW_SIGMAS diffusion lengths (+1 for
+        the fixed outer layer the solvers keep). Returns a tuple of slices,
+        or None when the field is uniform and nothing can change it.
+        """
+        if not self.windowed:
+            return self._full_window()
+        lo = np.array(self._tumor_lo)
+        hi = np.array(self._tumor_hi) + 1
+        if box is not None:
+            lo = np.minimum(lo, box[0])
+            hi = np.maximum(hi, box[1])
+        if (hi <= lo).any():
+            return None
+        m  = int(np.ceil(WINDOW_SIGMAS * np.sqrt(2.0 * D * n_steps * DT) / DX)) + 1
+        lo = np.maximum(lo - m, 0)
+        hi = np.minimum(hi + m, self.L)
+        return tuple(slice(int(a), int(b)) for a, b in zip(lo, hi))
+
+    def _active_box(self, field_w: np.ndarray, far: float, win: tuple):
+        """Bounding box (lo, hi) of voxels in field_w deviating from far, in lattice coordinates."""
+        tmp = self.ws.view('tmp', field_w.shape)
+        dev = self.ws.view('dev', field_w.shape)
+        np.subtract(field_w, far, out=tmp)
+        np.greater(np.abs(tmp, out=tmp), WINDOW_EPS, out=dev)
+        if not dev.any():
+            return None
+        lo, hi = [], []
+        for axis in range(3):
+            idx = np.flatnonzero(dev.any(axis=tuple(a for a in range(3) if a != axis)))
+            lo.append(win[axis].start + idx[0])
+            hi.append(win[axis].start + idx[-1] + 1)
+        return np.array(lo), np.array(hi)
+
+    def _uptake_masks(self, win: tuple | None = None):
+        """
+        (living_mask, necrotic_mask) over the window win (default: the whole
+        grid), built from the occupancy and necrotic-site maps without
+        touching cell objects; living_mask includes the hybrid core's
+        rho_live. None when there is nothing to consume oxygen. Every cell
+        lies inside any window _field_window returns. The masks are workspace
+        views, valid until the next call.
+        """
+        if not self.cells and not (self.hybrid and self.core.any()):
+            return None
+        win = win or self._full_window()
+
+        shape = tuple(w.stop - w.start for w in win)
+        living_mask   = self.ws.view('living', shape)
+        necrotic_mask = self.ws.view('necrotic', shape)
+        live          = self.ws.view('dev', shape)
+        np.copyto(necrotic_mask, self.necrotic_sites[win])
+        np.logical_not(necrotic_mask, out=live)
+        live &= self.occupied[win]
+        if self.hybrid:
+            live &= ~self.core[win]      # core voxels consume through rho_live
+        np.copyto(living_mask, live)
+        if self.hybrid:
+            living_mask += self.rho_live[win]
+        return living_mask, necrotic_mask
+
+    def _cell_sites(self, cells: list[Cell]) -> np.ndarray:
+        """Flat site ids of cells (int64), in list order."""
+        L = self.L
+        return np.fromiter(((c.x * L + c.y) * L + c.z for c in cells),
+                           dtype=np.int64, count=len(cells))
+
+    def _consume_oxygen(self, win: tuple | None = None, sparse: bool | None = None):
         """
         Vectorized Michaelis-Menten cellular oxygen uptake.
         Only occupied, non-necrotic lattice sites consume oxygen.
         Necrotic sites have their oxygen concentration set to zero
         Q(O) = V_MAX * O / (K_M + O)
+        Hybrid core voxels consume in proportion to rho_live and are
+        zeroed in proportion to rho_nec.
+
+        sparse=None picks the path from the fill of the window (SPARSE_FILL);
+        both paths give bit-identical fields.
         """
-        # Build mask over the full grid using cell objects (not lattice attributes)
+        win = win or self._full_window()
+        if sparse is None:
+            n_win  = np.prod([w.stop - w.start for w in win])
+            sparse = not self.hybrid and len(self.cells) < SPARSE_FILL * n_win
+        if sparse:
+            self._consume_oxygen_sparse()
+            return
+        masks = self._uptake_masks(win)
+        if masks is None:
+            return
+        living_mask, necrotic_mask = masks
+ 
+        # In place on the window view: O ← clip(O − mask·V_MAX·O/(K_M+O)),
+        # all pointwise passes fused per slab while it is in cache
+        O      = self.oxygen[win]
+        uptake = self.ws.view('tmp',  O.shape)
+        denom  = self.ws.view('tmp2', O.shape)
+        f32    = self.ws.view('f32',  O.shape)
+        rho_nec = self.rho_nec[win] if self.hybrid else None
+
+        def kernel(a, b):
+            o, q = O[a:b], uptake[a:b]
+            np.multiply(o, V_MAX, out=q)
+            q /= np.add(o, K_M, out=denom[a:b])
+            np.multiply(living_mask[a:b], q, out=q)
+            o -= q
+            np.clip(o, 0.0, O_MAX, out=o)
+            np.copyto(o, 0.0, where=necrotic_mask[a:b])   # dead tissue does not perfuse
+            if rho_nec is not None:
+                o *= np.subtract(1.0, rho_nec[a:b], out=f32[a:b])
+
+        self.ws.parallel(kernel, O.shape[0])
+
+    def _consume_oxygen_sparse(self):
+        """_consume_oxygen on the cells' own voxels only (agent-only runs)."""
         cells = self.cells
         if not cells:
             return
-
-        n   = len(cells)
-        xs  = np.empty(n, dtype=np.int32)
-        ys  = np.empty(n, dtype=np.int32)
-        zs  = np.empty(n, dtype=np.int32)
-        nec = np.empty(n, dtype=bool)
-
-        for i, c in enumerate(cells):
-            xs[i]  = c.x
-            ys[i]  = c.y
-            zs[i]  = c.z
-            nec[i] = c.necrotic
-
-        living_mask   = np.zeros((self.L, self.L, self.L), dtype=np.float32)
-        necrotic_mask = np.zeros((self.L, self.L, self.L), dtype=bool)
-
-        live = ~nec
-        if live.any():
-            living_mask[xs[live], ys[live], zs[live]] = 1.0
-        if nec.any():
-            necrotic_mask[xs[nec], ys[nec], zs[nec]] = True
- 
-        O = self.oxygen
-        uptake = living_mask * (V_MAX * O / (K_M + O))
-        self.oxygen = np.clip(O - uptake, 0.0, O_MAX)
-        self.oxygen[necrotic_mask] = 0.0   # dead tissue does not perfuse
-
-    def _update_oxygen(self):
+        sites = self._cell_sites(cells)
+        nec   = np.fromiter((c.necrotic for c in cells), dtype=bool, count=len(cells))
+        O     = self.oxygen.reshape(-1)
+        live  = sites[~nec]
+        o     = O[live]
+        q     = o * V_MAX
+        q    /= o + K_M
+        o    -= q
+        np.clip(o, 0.0, O_MAX, out=o)
+        O[live]       = o
+        O[sites[nec]] = 0.0   # dead tissue does not perfuse
+
+    def _update_oxygen(self) -> float:
         """
         Update oxygen field each simulation step:
           1. Cellular uptake  — cells deplete local oxygen first
           2. Diffusion        — gradients re-equilibrate across the lattice
           3. Angiogenic supply — new vessels restore oxygen (only after switch)
+        In the steady model 1–2 are one quasi-steady solve.
+        Returns the oxygen consumed this step (net field decrease, or the
+        steady-state uptake flux); angiogenic restoration never counts negative.
         """
+        if self.oxygen_model == 'steady':
+            # Necrotic sites are pinned to 0 inside the solve (dead tissue
+            # does not perfuse), as the transient path zeroes them each step
+            masks = self._uptake_masks()
+            w, nec = masks if masks is not None else (np.zeros_like(self.oxygen), None)
+            u, self.steady_cycles, _ = solve_steady_oxygen(self.oxygen, w, D_OX_STEP, pinned=nec)
+            if self.hybrid:
+                u *= 1.0 - self.rho_nec
+            self.oxygen = O = u.astype(self.dtype, copy=False)
+            consumed = float((w * (V_MAX * O / (K_M + O))).sum(dtype=np.float64))
+            if self.angiogenic_on:
+                self.oxygen = np.clip(self.oxygen + DELTA * self.phi, 0.0, O_MAX)
+            return consumed
+
+        # Outside the window oxygen is O_MAX, which diffusion leaves unchanged
+        # and angiogenic supply cannot raise, so only the window is updated.
+        win = self._field_window(self._ox_box, D_OX, N_OX)
+        if win is None:
+            return 0.0
+        O = self.oxygen[win]
+        O_before = O.sum(dtype=np.float64)   # float64 accumulator in either precision
         # Oxygen uptake
-        self._consume_oxygen()
+        self._consume_oxygen(win)
         # Diffusion of oxygen field (true 3D diffusion using finite differences)
-        self.oxygen = diffuse_3d(self.oxygen.copy(), D_OX, N_OX)
+        self._diffuse_ox(O, D_OX, N_OX, out=O, ws=self.ws)
         # 3. Angiogenic oxygen supply
         if self.angiogenic_on:
-            self.oxygen = np.clip(self.oxygen + DELTA * self.phi, 0.0, O_MAX)
+            phi, tmp = self.phi[win], self.ws.view('tmp', O.shape)
+
+            def supply(a, b):
+                O[a:b] += np.multiply(phi[a:b], DELTA, out=tmp[a:b])
+                np.clip(O[a:b], 0.0, O_MAX, out=O[a:b])
+
+            self.ws.parallel(supply, O.shape[0])
+        if self.windowed:
+            self._ox_box = self._active_box(O, O_MAX, win)
+        return max(0.0, O_before - O.sum(dtype=np.float64))
 
-    def _update_phi(self):
-        """Release and diffuse pro-angiogenic factors from tumor shell."""
-        N = len(self.cells)
+    def _update_phi(self, n_steps: int = 1):
+        """
+        Release and diffuse pro-angiogenic factors from tumor shell.
+        n_steps > 1 catches up on steps the field scheduler held: their
+        releases are injected together and diffused over the whole interval.
+        """
+        N = self.n_cells()
         if N == 0:
             return
+        for _ in range(n_steps):
+            self._inject_phi(N)
+ 
+        # Sources lie inside the tumour box, so the window covers every change
+        win = self._field_window(self._phi_box, D_CH * DT, N_CH * n_steps)
+        phi = self.phi[win]
+        self._diffuse_phi(phi, D_CH * DT, N_CH * n_steps, out=phi, ws=self.ws)
+        if self.windowed:
+            self._phi_box = self._active_box(self.phi[win], 0.0, win)
+
+    def _inject_phi(self, N: int):
+        """Add this step's phi release at the cells on the outer shell of a tumour of N cells."""
         # Inject phi on outer ~30% shell of occupied region
         cx = cy = cz = self.L // 2
         # Estimate tumor radius from cell count
         r_est = max(1.0, (3 * N / (4 * np.pi)) ** (1/3))
         shell_inner = r_est * 0.7
 
-        # Vectorized extraction of cell positions
-        xs = np.fromiter((c.x for c in self.cells), dtype=np.int32, count=N)
-        ys = np.fromiter((c.y for c in self.cells), dtype=np.int32, count=N)
-        zs = np.fromiter((c.z for c in self.cells), dtype=np.int32, count=N)
+        # Cell positions as flat site ids; one cell per site, so a plain
+        # scatter-add at the shell sites is exact (no np.add.at needed)
+        sites = self._cell_sites(self.cells)
+        xs, ys, zs = np.unravel_index(sites, self.phi.shape)
  
         dists = np.sqrt((xs - cx) ** 2 + (ys - cy) ** 2 + (zs - cz) ** 2)
         mask  = dists >= shell_inner
  
-        # Scatter-add phi contribution at shell positions
-        np.add.at(self.phi, (xs[mask], ys[mask], zs[mask]), (N / N_A) * 0.5)
- 
-        self.phi = diffuse_3d(self.phi, D_CH * DT, N_CH)
+        self.phi.reshape(-1)[sites[mask]] += (N / N_A) * 0.5
+        if self.hybrid:
+            # Core voxels inside the shell release in proportion to their density
+            idx = np.flatnonzero(self.core)
+            if idx.size:
+                kx, ky, kz = np.unravel_index(idx, self.phi.shape)
+                shell = np.sqrt((kx - cx) ** 2 + (ky - cy) ** 2 + (kz - cz) ** 2) >= shell_inner
+                rho = self.rho_live.ravel()[idx] + self.rho_nec.ravel()[idx]
+                self.phi[kx[shell], ky[shell], kz[shell]] += rho[shell] * ((N / N_A) * 0.5)
     
     def _update_necrosis(self):
         """
@@ -320,26 +1584,37 @@ class TumorSimulation:
         if not alive_cells:
             return
  
-        n  = len(alive_cells)
-        xs = np.fromiter((c.x for c in alive_cells), dtype=np.int32, count=n)
-        ys = np.fromiter((c.y for c in alive_cells), dtype=np.int32, count=n)
-        zs = np.fromiter((c.z for c in alive_cells), dtype=np.int32, count=n)
- 
-        O_vals = self.oxygen[xs, ys, zs]   # single vectorised index
+        O_vals = self.oxygen.reshape(-1)[self._cell_sites(alive_cells)]   # flat gather
  
         increments = np.where(O_vals < O_NECROSIS,  2,
                      np.where(O_vals < O_HYPOXIA,   1, -1))
  
+        log = self.trajectory
         for i, cell in enumerate(alive_cells):
             cell.hypoxia_time = max(cell.hypoxia_time + int(increments[i]), 0)
             if cell.hypoxia_time >= NECROSIS_DELAY:
                 cell.alive = False
                 cell.necrotic = True
+                self.necrotic_sites[cell.x, cell.y, cell.z] = True
+                if log is not None:
+                    log.necrosis(self._site(cell.x, cell.y, cell.z), cell.condensing)
+                if self.lineage is not None:
+                    self.lineage.necrosis(self._site(cell.x, cell.y, cell.z))
     
-    def _clear_necrotic_cells(self, cell: Cell):
-        """The immune system gradually clears necrotic cells, creating space for new growth."""
-        if cell.necrotic and random.random() < NECROTIC_CLEAR_RATE:
-            self._remove_cell(cell)
+    def _clear_necrotic_cells(self, necrotic_cells: list[Cell]):
+        """
+        The immune system gradually clears necrotic cells, creating space for new growth.
+        One vectorised draw decides clearance for the whole necrotic population.
+        """
+        if not necrotic_cells:
+            return
+        n  = len(necrotic_cells)
+        xs = np.fromiter((c.x for c in necrotic_cells), dtype=np.int64, count=n)
+        ys = np.fromiter((c.y for c in necrotic_cells), dtype=np.int64, count=n)
+        zs = np.fromiter((c.z for c in necrotic_cells), dtype=np.int64, count=n)
+        u  = self.crng.uniform(self.t, RNG_CLEAR, self._site(xs, ys, zs))
+        for i in np.flatnonzero(u < NECROTIC_CLEAR_RATE):
+            self._remove_cell(necrotic_cells[i])
 
     # ── Choose neighbor for daughter cell ───────────────────────────────────
 
@@ -357,14 +1632,15 @@ class TumorSimulation:
             return None
 
         if not self.angiogenic_on:
-            return random.choice(candidates)
+            u = self.crng.uniform(self.t, RNG_NEIGHBOR, self._site(x, y, z))
+            return candidates[min(int(u * len(candidates)), len(candidates) - 1)]
         else:
             # Chemotaxis: daughter cell moves toward highest oxygen concentration
             return max(candidates, key=lambda p: self.oxygen[p[0], p[1], p[2]])
 
     # ── Metastasis process ───────────────────────────────────────
 
-    def _attempt_metastasis(self, x, y, z) -> bool:
+    def _attempt_metastasis(self, x, y, z, key_site: int | None = None) -> bool:
         """
         Walk outward from (x,y,z) until an empty site is found.
         The walk is biased radially outward from the tumor center using
@@ -374,43 +1650,62 @@ class TumorSimulation:
         If the last occupied site has only a single 1st-order neighbour,
         the daughter cell detaches → metastatic event.
         Returns True if metastatic.
+
+        key_site addresses the walk's draws (the dividing parent's site);
+        it defaults to the starting site.
+        """
+        if key_site is None:
+            key_site = self._site(x, y, z)
+        return self._metastasis_walk((x, y, z), key_site)
+
+    def _remote(self, site: tuple) -> bool:
+        """
+        True if site belongs to another process's subdomain (never, in a single
+        process). Subclasses that return True also provide _hand_off_walk.
+        """
+        return False
+
+    def _metastasis_walk(self, current: tuple, key_site: int,
+                         walk_start: int = 0, visited: set | None = None):
+        """
+        Body of _attempt_metastasis, resumable from step walk_start with the
+        sites visited so far. Returns True / False, or None when the walk
+        entered another subdomain and was handed off to its owner.
         """
         # Tumor center is fixed at the lattice midpoint
         center = np.array([self.L / 2, self.L / 2, self.L / 2])
 
-        visited = set()
-        current = (x, y, z)
+        visited  = set() if visited is None else visited
         max_walk = 50
 
-        for _ in range(max_walk):
+        for walk_i in range(walk_start, max_walk):
+            if self._remote(current):
+                return self._hand_off_walk(current, key_site, walk_i, visited)
             visited.add(current)
             cx, cy, cz = current
 
-            # ── 1st-order occupied neighbours (used for detachment check)
-            occ_neighbours_6 = [
-                (cx + dx, cy + dy, cz + dz)
-                for dx, dy, dz in NEIGHBORS_6
-                if self._in_bounds(cx + dx, cy + dy, cz + dz)
-                and self.lattice[cx + dx, cy + dy, cz + dz] is not None
-            ]
-
-            # ── Empty neighbours (any of 18): place daughter here if found
+            # ── Empty neighbours (any of 18): place daughter here if found.
+            #    Visited sites are occupied, so the O(1) index check decides
+            #    whether the list is needed at all.
             empty_neighbours = [
                 (cx + dx, cy + dy, cz + dz)
                 for dx, dy, dz in NEIGHBORS_18
                 if self._in_bounds(cx + dx, cy + dy, cz + dz)
-                and self.lattice[cx + dx, cy + dy, cz + dz] is None
+                and not self.occupied[cx + dx, cy + dy, cz + dz]
                 and (cx + dx, cy + dy, cz + dz) not in visited
-            ]
+            ] if self._has_empty_18(cx, cy, cz) else []
             if empty_neighbours:
                 # Among empty sites, prefer the one furthest from center
                 nx, ny, nz = max(
                     empty_neighbours,
                     key=lambda p: np.linalg.norm(np.array(p) - center)
                 )
-                if len(occ_neighbours_6) <= 1:
+                # 1st-order occupied neighbours decide detachment
+                if self._occupied_6(cx, cy, cz) <= 1:
+                    if self.lineage is not None:
+                        self.lineage.metastasis(key_site, self._site(cx, cy, cz))
                     return True   # barely connected → detaches → metastatic
-                self._place_cell(nx, ny, nz)
+                self._place_cell(nx, ny, nz, parent_site=key_site)
                 return False
 
             # ── No empty site found: step to an occupied neighbour,
@@ -421,7 +1716,7 @@ class TumorSimulation:
                 (cx + dx, cy + dy, cz + dz)
                 for dx, dy, dz in NEIGHBORS_18
                 if self._in_bounds(cx + dx, cy + dy, cz + dz)
-                and self.lattice[cx + dx, cy + dy, cz + dz] is not None
+                and self.occupied[cx + dx, cy + dy, cz + dz]
                 and (cx + dx, cy + dy, cz + dz) not in visited
             ]
             if not occupied:
@@ -435,40 +1730,73 @@ class TumorSimulation:
             weights = distances - distances.min() + 1e-6
             weights /= weights.sum()
 
-            chosen_idx = self.rng.choice(len(occupied), p=weights)
+            u = self.crng.uniform(self.t, RNG_WALK, key_site, walk_i)
+            chosen_idx = min(int(np.searchsorted(np.cumsum(weights), u, side='right')),
+                             len(occupied) - 1)
             current = occupied[chosen_idx]
 
         return False  # Failed to find empty site within max_walk steps → no metastasis
 
+    # ── Adaptive field scheduling ────────────────────────────────────────
+
+    def _scheduled_field_update(self, N: int, switched: bool) -> float:
+        """
+        Advance or hold the fields as the scheduler decides; returns the oxygen
+        consumed this step (measured, or the last update's value when held).
+        """
+        s = self.field_schedule
+        update, predicted = s.decide(N, force=switched)
+        if update:
+            s.snapshot(self.oxygen)
+            consumed = self._update_oxygen()
+            if self.angiogenic_on:
+                self._update_phi(n_steps=s.held + 1)
+            s.held, s.n_ref, s.consumed = 0, N, consumed
+            s.residual = s.measure(self.oxygen)
+        else:
+            s.held  += 1
+            consumed = s.consumed
+        s.record(self.t, N, predicted, update, consumed)
+        return consumed
+
     # ── Simulation step ──────────────────────────────────────────────────
 
     def step(self):
         """Advance simulation by one time step."""
-        N = len(self.cells)
+        if self.hybrid:
+            self._sync_core()
+        N = self.n_cells()
 
         # ── Check angiogenic switch
-        if not self.angiogenic_on and N >= N_A:
+        switched = not self.angiogenic_on and N >= N_A
+        if switched:
             self.angiogenic_on = True
             #print(f"  [t={self.t}] Angiogenic switch ON  (N={N})")
 
         # ── Update diffusion fields
         # Track net oxygen consumed this step for the fitness score.
-        # max(0, ...) ensures angiogenic restoration steps contribute zero.
-        _O_before = self.oxygen.sum()
-        self._update_oxygen()
-        self.total_oxygen_consumed += max(0.0, _O_before - self.oxygen.sum())
-        if self.angiogenic_on:
-            self._update_phi()
+        if self.field_schedule is not None:
+            self.total_oxygen_consumed += self._scheduled_field_update(N, switched)
+        else:
+            self.total_oxygen_consumed += self._update_oxygen()
+            if self.angiogenic_on:
+                self._update_phi()
 
         # ── Necrosis update
         self._update_necrosis()
+        core = self._update_core() if self.hybrid else None
 
         # ── Cell fate decisions (iterate over copy to avoid mutation issues)
         cells_snapshot = list(self.cells)
         # Handle empty lattice
-        if not cells_snapshot:
-            for key in self.history:
+        if not cells_snapshot and not (core and core['n_live'] > 0):
+            self.history['population'].append(self.n_cells())
+            for key in ('metastatic_cells', 'avg_b', 'avg_d', 'avg_C', 'R_ratio'):
                 self.history[key].append(0)
+            self.history['surface_area'].append(self.surface_area)
+            self.last_fate_stats = (0.0, 0.0, 0.0, 0.0, 0)
+            if self.radial is not None:
+                self.radial.record(self)
             self.t += 1
             return
 
@@ -481,13 +1809,16 @@ class TumorSimulation:
             elif c.alive:
                 alive_cells.append(c)
 
-        for c in necrotic_list:
-            self._clear_necrotic_cells(c)
+        self._clear_necrotic_cells(necrotic_list)
 
-        if not alive_cells:
-            self.history['population'].append(len(self.cells))
+        if not alive_cells and not (core and core['n_live'] > 0):
+            self.history['population'].append(self.n_cells())
             for key in ('metastatic_cells', 'avg_b', 'avg_d', 'avg_C', 'R_ratio'):
                 self.history[key].append(0)
+            self.history['surface_area'].append(self.surface_area)
+            self.last_fate_stats = (0.0, 0.0, 0.0, 0.0, 0)
+            if self.radial is not None:
+                self.radial.record(self)
             self.t += 1
             return
 
@@ -508,15 +1839,16 @@ class TumorSimulation:
             hyp_t[i]  = c.hypoxia_time
 
         # Vectorised C, d, b computation
-        O_vals = self.oxygen[xs, ys, zs]
+        sites  = self._site(xs.astype(np.int64), ys, zs)
+        O_vals = np.asarray(self.oxygen.reshape(-1)[sites], dtype=np.float64)
         C_vals = np.clip(1.0 - O_vals / O_MAX, 0.0, 1.0)
 
         d_vals = self.alpha * C_vals
         b_vals = np.clip(self.beta * (1.0 + gammas - C_vals), 0.0, 1.0)
         b_vals[hyp_t > 0] *= 0.75   # hypoxic-division penalty
 
-        # All random rolls in one NumPy call
-        rolls = self.rng.random(n_alive)
+        # All random rolls in one counter-based call
+        rolls = self.crng.uniform(self.t, RNG_FATE, sites)
 
         die_mask    = rolls < d_vals
         divide_mask = (~die_mask) & (rolls < d_vals + b_vals)
@@ -537,42 +1869,102 @@ class TumorSimulation:
             if nbr is None:
                 continue
             nx, ny, nz = nbr
-            if self.lattice[nx, ny, nz] is None:
-                self._place_cell(nx, ny, nz)
+            parent = self._site(c.x, c.y, c.z)
+            if not self.occupied[nx, ny, nz]:
+                self._place_cell(nx, ny, nz, parent_site=parent)
             else:
-                if self._attempt_metastasis(nx, ny, nz):
+                if self._attempt_metastasis(nx, ny, nz, key_site=parent):
                     metastatic_count += 1
 
-        # Record history
-        avg_b = float(np.mean(b_vals))
-        avg_d = float(np.mean(d_vals))
-        avg_C = float(np.mean(C_vals))
+        # Record history (core voxels contribute density-weighted averages)
+        n_w   = n_alive
+        sum_b = float(b_vals.sum())
+        sum_d = float(d_vals.sum())
+        sum_C = float(C_vals.sum())
+        if core:
+            n_w   += core['n_live']
+            sum_b += core['sum_b']
+            sum_d += core['sum_d']
+            sum_C += core['sum_C']
+        # Raw sums for callers that pool several subdomains
+        self.last_fate_stats = (n_w, sum_b, sum_d, sum_C, metastatic_count)
+        avg_b = sum_b / n_w
+        avg_d = sum_d / n_w
+        avg_C = sum_C / n_w
         R     = avg_b / avg_d if avg_d > 1e-9 else float('inf')
 
-        self.history['population'].append(len(self.cells))
+        self.history['population'].append(self.n_cells())
         self.history['metastatic_cells'].append(metastatic_count)
         self.history['avg_b'].append(avg_b)
         self.history['avg_d'].append(avg_d)
         self.history['avg_C'].append(avg_C)
         self.history['R_ratio'].append(min(R, 50))
+        self.history['surface_area'].append(self.surface_area)
+        if self.radial is not None:
+            self.radial.record(self)
         self.t += 1
 
-    def run(self, n_steps: int = MAX_SIM_STEPS, verbose: bool = True):
+    def run(self, n_steps: int = MAX_SIM_STEPS, verbose: bool = True, snapshots=None):
+        """
+        Advance n_steps. snapshots, if given, is observed after every step
+        (snapshot_store.SnapshotWriter decides which steps to record); an
+        attached trajectory recorder is flushed after every step. With a
+        steady-state detector the run may stop early; the history still
+        gets n_steps rows (see _pad_history), while the trajectory recorder
+        is closed at the convergence step so its log ends there.
+        """
         for step_i in range(n_steps):
             self.step()
-            if verbose and (step_i % 5 == 0 or step_i == n_steps - 1):
-                N = len(self.cells)
+            steady = self.steady is not None and self.steady.update(self)
+            last   = step_i == n_steps - 1 or steady
+            if self.trajectory is not None:
+                self.trajectory.end_step(self)
+            if snapshots is not None:
+                snapshots.observe(self, final=last)
+            if verbose and (step_i % 5 == 0 or last):
+                N = self.n_cells()
                 meta = self.history['metastatic_cells'][-1]
                 b = self.history['avg_b'][-1]
                 d = self.history['avg_d'][-1]
                 print(f"  t={self.t:3d} | N={N:5d} | meta={meta:3d} | "
                       f"<b>={b:.3f} | <d>={d:.3f} | angio={'ON' if self.angiogenic_on else 'off'}")
+            if steady and step_i < n_steps - 1:
+                self.converged_at = self.t
+                if self.trajectory is not None:
+                    self.trajectory.close()   # the log ends here; padded steps are not events
+                self._pad_history(n_steps - step_i - 1, self.steady.oxygen_rate)
+                if verbose:
+                    print(f"  steady state at t={self.converged_at}; "
+                          f"{n_steps - step_i - 1} remaining steps padded")
+                break
+
+    def _pad_history(self, n: int, oxygen_per_step: float = 0.0):
+        """
+        Stand-in for n steps that are not simulated: repeat the last history
+        row (and radial profile), advance t, and credit oxygen_per_step of
+        consumption per padded step.
+        """
+        if n <= 0 or not self.history['population']:
+            return
+        for v in self.history.values():
+            v.extend([v[-1]] * n)
+        if self.radial is not None:
+            self.radial.pad(n)
+        self.total_oxygen_consumed += oxygen_per_step * n
+        self.t += n
     
+    def close(self):
+        """Release the field engine's thread pool (no-op with threads=1)."""
+        self.ws.close()
+
     # ── CSV export ───────────────────────────────────────────────────────────
 
-    def save_cells_csv(self, path: str, max_cells: int = 5000):
+    def cell_snapshot(self, max_cells: int | None = None) -> dict:
         """
-        Downsampling strategy — stratified surface-preserving:
+        Per-cell state as columns (one array per field), computed in one
+        vectorised pass over self.cells.
+
+        Downsampling strategy (max_cells given) — stratified surface-preserving:
         1. Surface cells  (≥1 empty 6-neighbour)  → always kept; define tumor shape
         2. Necrotic cells (core)                   → always kept; define necrotic core
         3. Interior living cells                   → randomly sampled to fill budget
@@ -580,85 +1972,117 @@ class TumorSimulation:
         This preserves the two biologically/visually critical structures while
         keeping the total point count at or below max_cells.
 
-        Columns:
-          x, y, z        — lattice position
+        Columns (rows in export order: surface, necrotic, sampled interior):
+          x, y, z        — lattice indices (save_cells_csv centres them for the viewer)
+          phenotype      — code into PHENOTYPES
           oxygen          — local oxygen concentration at the cell's position
           C               — local hypoxia ratio (1 - oxygen/O_MAX)
           b               — cell division probability at this step
           d               — cell death probability at this step
-          sim_time        — simulation time step at which the snapshot was taken
+        plus sim_time and the stratum sizes (n_total, n_surface, n_necrotic,
+        n_interior) as scalars.
         """
-        import csv
+        cells = self.cells
+        N  = len(cells)
+        xs = np.fromiter((c.x for c in cells), dtype=np.int64, count=N)
+        ys = np.fromiter((c.y for c in cells), dtype=np.int64, count=N)
+        zs = np.fromiter((c.z for c in cells), dtype=np.int64, count=N)
+        nec   = np.fromiter((c.necrotic for c in cells), dtype=bool, count=N)
+        cond  = np.fromiter((c.condensing for c in cells), dtype=bool, count=N)
+        gamma = np.fromiter((c.gamma for c in cells), dtype=np.float64, count=N)
+        hyp   = np.fromiter((c.hypoxia_time > 0 for c in cells), dtype=bool, count=N)
 
         # ── Classify all cells into three strata ──────────────────────────────
-        surface_cells  = []
-        necrotic_cells = []
-        interior_cells = []
-
-        N = len(self.cells)
-        if N == 0:
-            return
         cx = cy = cz = self.L // 2
         # Estimate tumor radius from cell count
         r_est = max(1.0, (3 * N / (4 * np.pi)) ** (1/3))
         shell_inner = r_est * 0.5
-
-        for cell in self.cells:
-            if cell.necrotic:
-                necrotic_cells.append(cell)
-                continue
-
-            dist = np.sqrt((cell.x - cx) ** 2 + (cell.y - cy) ** 2 + (cell.z - cz) ** 2)
-            # Check if any 6-connected neighbour is empty → surface cell
-            is_surface = any(
-                self._in_bounds(cell.x + dx, cell.y + dy, cell.z + dz) and
-                self.lattice[cell.x + dx, cell.y + dy, cell.z + dz] is None
-                for dx, dy, dz in NEIGHBORS_6
-            )
-            if is_surface and dist >= shell_inner:
-                surface_cells.append(cell)
-            else:
-                interior_cells.append(cell)
+        dist = np.sqrt((xs - cx) ** 2 + (ys - cy) ** 2 + (zs - cz) ** 2)
+        # Any empty 6-connected neighbour → surface cell (surface index lookup)
+        exposed  = self.n_occ6[xs, ys, zs] < self._capacity(xs, ys, zs)[0]
+        surface  = np.flatnonzero(~nec & exposed & (dist >= shell_inner))
+        necrotic = np.flatnonzero(nec)
+        interior = np.flatnonzero(~nec & ~(exposed & (dist >= shell_inner)))
 
         # ── Fill budget: surface + necrotic are mandatory; sample interior ────
-        mandatory    = surface_cells + necrotic_cells
-        budget_left  = max(0, max_cells - len(mandatory))
+        n_interior = len(interior)
+        if max_cells is not None:
+            budget_left = max(0, max_cells - len(surface) - len(necrotic))
+            if n_interior > budget_left:
+                # Keep the budget_left interior cells with the smallest keyed draws:
+                # a uniform sample without replacement that ignores list order.
+                u = self.crng.uniform(self.t, RNG_SAMPLE, self._site(xs[interior], ys[interior], zs[interior]))
+                interior = interior[np.sort(np.argsort(u)[:budget_left])]
+        rows = np.concatenate([surface, necrotic, interior])
+
+        O = np.asarray(self.oxygen[xs[rows], ys[rows], zs[rows]], dtype=np.float64)
+        C = np.clip(1.0 - O / O_MAX, 0.0, 1.0)
+        b = self.beta * (1.0 + gamma[rows] - C)
+        b[hyp[rows]] *= 0.75   # Hypoxic cells divide more slowly
+        np.clip(b, 0.0, 1.0, out=b)
+
+        phenotype = np.where(cond[rows], PHENOTYPES.index('condensing'),
+                             PHENOTYPES.index('non-condensing')).astype(np.uint8)
+        phenotype[:len(surface)] = PHENOTYPES.index('surface')
+        phenotype[len(surface):len(surface) + len(necrotic)] = PHENOTYPES.index('necrotic')
+
+        return {
+            'x': xs[rows].astype(np.int32),
+            'y': ys[rows].astype(np.int32),
+            'z': zs[rows].astype(np.int32),
+            'phenotype': phenotype,
+            'oxygen': O, 'C': C, 'b': b, 'd': self.alpha * C,
+            'sim_time': self.t, 'n_total': N, 'n_surface': len(surface),
+            'n_necrotic': len(necrotic), 'n_interior': n_interior,
+        }
 
-        if len(interior_cells) > budget_left:
-            sampled_interior = random.sample(interior_cells, budget_left)
-        else:
-            sampled_interior = interior_cells
+    def save_snapshot(self, path: str, max_cells: int | None = 5000):
+        """
+        Write cell_snapshot(max_cells) as a compressed NPZ (columns as arrays,
+        phenotype as uint8 codes with the PHENOTYPES labels stored alongside).
+        Read back with load_snapshot().
+        """
+        snap = self.cell_snapshot(max_cells)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        np.savez_compressed(path, phenotypes=np.array(PHENOTYPES), L=self.L, **snap)
+        print(f"  Cell snapshot saved → {path}  ({len(snap['x'])} of {snap['n_total']} cells)")
 
-        export = mandatory + sampled_interior
-        n_total = len(self.cells)
+    def save_cells_csv(self, path: str, max_cells: int = 5000):
+        """
+        CSV writer for the 3D viewer: cell_snapshot(max_cells) (stratified
+        surface-preserving downsampling) with phenotype labels.
 
-        print(f"  Downsampling: {n_total} cells → {len(export)} exported  "
-            f"(surface={len(surface_cells)}, necrotic={len(necrotic_cells)}, "
-            f"interior={len(sampled_interior)}/{len(interior_cells)})")
+        Columns:
+          x, y, z        — lattice position relative to the midpoint, int(x − L/2)
+          phenotype       — necrotic / surface / condensing / non-condensing
+          oxygen          — local oxygen concentration at the cell's position
+          C               — local hypoxia ratio (1 - oxygen/O_MAX)
+          b               — cell division probability at this step
+          d               — cell death probability at this step
+          sim_time        — simulation time step at which the snapshot was taken
+        """
+        import csv
+
+        if not self.cells:
+            return
+        snap = self.cell_snapshot(max_cells)
+        n_export = len(snap['x'])
+        print(f"  Downsampling: {snap['n_total']} cells → {n_export} exported  "
+            f"(surface={snap['n_surface']}, necrotic={snap['n_necrotic']}, "
+            f"interior={n_export - snap['n_surface'] - snap['n_necrotic']}/{snap['n_interior']})")
 
         # ── Write CSV ─────────────────────────────────────────────────────────
         os.makedirs(os.path.dirname(path), exist_ok=True)
+        labels = [PHENOTYPES[k] for k in snap['phenotype'].tolist()]
+        # The viewer's centred convention (truncated toward zero, as it always was)
+        cols   = [(snap[k] - self.L / 2).astype(np.int32).tolist() for k in ('x', 'y', 'z')]
+        cols  += [snap[k].tolist() for k in ('oxygen', 'C', 'b', 'd')]
         with open(path, 'w', newline='') as f:
             writer = csv.writer(f)
             writer.writerow(['x', 'y', 'z', 'phenotype', 'oxygen', 'C', 'b', 'd', 'sim_time'])
-            for cell in export:
-                x = int(cell.x - self.L/2)
-                y = int(cell.y - self.L/2)
-                z = int(cell.z - self.L/2)
-                phenotype = 'necrotic' if cell.necrotic else \
-                            'surface'  if cell in set(surface_cells) else \
-                            'condensing' if cell.condensing else 'non-condensing'
-                O = float(self.oxygen[cell.x, cell.y, cell.z])
-                C = self.C_ratio(cell.x, cell.y, cell.z)
-                b = self.division_prob(cell)
-                d = self.death_prob(cell)
-                writer.writerow([
-                    x, y, z,
-                    phenotype,
-                    round(O, 6), round(C, 6),
-                    round(b, 6), round(d, 6),
-                    self.t,
-                ])
+            writer.writerows(
+                [x, y, z, ph, round(O, 6), round(C, 6), round(b, 6), round(d, 6), self.t]
+                for x, y, z, ph, O, C, b, d in zip(*cols[:3], labels, *cols[3:]))
 
         print(f"  Cell snapshot saved → {path}")
  
@@ -667,7 +2091,8 @@ class TumorSimulation:
         Save the per-step simulation history to a CSV file.
  
         Columns:
-          sim_time, population, metastatic_cells, avg_b, avg_d, avg_C, R_ratio
+          sim_time, population, metastatic_cells, avg_b, avg_d, avg_C, R_ratio,
+          surface_area
         """
         import csv
         h = self.history
@@ -675,7 +2100,7 @@ class TumorSimulation:
         with open(path, 'w', newline='') as f:
             writer = csv.writer(f)
             writer.writerow(['sim_time', 'population', 'metastatic_cells',
-                             'avg_b', 'avg_d', 'avg_C', 'R_ratio'])
+                             'avg_b', 'avg_d', 'avg_C', 'R_ratio', 'surface_area'])
             for i in range(n):
                 writer.writerow([
                     i + 1,
@@ -685,9 +2110,42 @@ class TumorSimulation:
                     round(h['avg_d'][i], 6),
                     round(h['avg_C'][i], 6),
                     round(h['R_ratio'][i], 6),
+                    h['surface_area'][i],
                 ])
         print(f"  History saved       → {path}  ({n} steps)")
 
+    def save_radial(self, path: str):
+        """
+        Write the radial profiles (RadialProfiler.profiles) as a compressed NPZ:
+        oxygen, phi, density and necrotic_fraction as (steps, shells) float32
+        arrays, r_gyration per step, and the shells' mid radii and voxel counts.
+        """
+        if self.radial is None:
+            raise ValueError("no radial profiles: the simulation was created with radial_stats=False")
+        prof = self.radial.profiles()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        np.savez_compressed(path, bin_width=self.radial.bin_width, **prof)
+        print(f"  Radial profiles saved → {path}  ({len(prof['r_gyration'])} steps, "
+              f"{self.radial.n_bins} shells)")
+
+    def save_field_log_csv(self, path: str):
+        """
+        Save the adaptive field scheduler's per-step decisions to a CSV file.
+
+        Columns: FieldScheduler.LOG_FIELDS (held = steps held before this one)
+        """
+        import csv
+        if self.field_schedule is None:
+            raise ValueError("no field log: the simulation was created with adaptive_fields=False")
+        log = self.field_schedule.log
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(FieldScheduler.LOG_FIELDS)
+            for t, N, predicted, updated, held, residual, consumed in log:
+                writer.writerow([t + 1, N, round(predicted, 6), int(updated), held,
+                                 round(residual, 6), round(consumed, 6)])
+        print(f"  Field log saved     → {path}  ({len(log)} steps)")
+
 # ─────────────────────────────────────────────
 # PARALLEL PARAMETER SWEEP  (top-level so it is picklable)
 # ─────────────────────────────────────────────
@@ -696,7 +2154,7 @@ def _run_combo(args):
     alpha_i, beta_i, n_steps, seed = args
     sim = TumorSimulation(L=L, alpha=alpha_i, beta=beta_i, seed=seed)
     sim.run(n_steps=n_steps, verbose=False)
-    return alpha_i, beta_i, sim.history['population'], len(sim.cells), \
+    return alpha_i, beta_i, sim.history['population'], sim.n_cells(), \
            sum(sim.history['metastatic_cells'])
 
 def run_parameter_sweep(combos, n_steps=MAX_SIM_STEPS, seed=SEED, max_workers=None):
@@ -728,9 +2186,321 @@ def run_parameter_sweep(combos, n_steps=MAX_SIM_STEPS, seed=SEED, max_workers=No
     return results
 
 # ─────────────────────────────────────────────
-#  PLOTTING
+#  HYBRID MODE VALIDATION
+# ─────────────────────────────────────────────
+def validate_hybrid(n_seeds: int = 10, n_steps: int = MAX_SIM_STEPS, lattice_L: int = L,
+                    alpha: float = ALPHA, beta: float = BETA, scaling_L: int = 64,
+                    scaling_cells: int = 40_000, scaling_seed: int = 1) -> dict:
+    """
+    Run the pure agent model and the hybrid model on the same seeds and compare
+    final population, necrotic fraction, total metastatic events and wall time
+    per step. Returns {mode: dict(metric -> (mean, sd))} and prints a table.
+
+    Then grow one tumour per mode on a scaling_L lattice until it holds
+    scaling_cells cells and report the wall time per step against the
+    population, with the hybrid run's agent count (its rim) and the log-log
+    slope of each curve above scaling_cells / 4 (1 means cost proportional
+    to N). The curves are returned under 'scaling' as
+    {mode: (cells, agents, seconds)}, and the slopes under 'slope'.
+    """
+    import time
+    out = {}
+    for hybrid in (False, True):
+        pops, ncfs, metas, secs = [], [], [], []
+        for s in range(n_seeds):
+            sim = TumorSimulation(L=lattice_L, alpha=alpha, beta=beta, seed=s, hybrid=hybrid)
+            t0  = time.perf_counter()
+            sim.run(n_steps=n_steps, verbose=False)
+            secs.append((time.perf_counter() - t0) / n_steps)
+            n = sim.n_cells()
+            pops.append(n)
+            ncfs.append(sim.n_necrotic() / n if n else 0.0)
+            metas.append(sum(sim.history['metastatic_cells']))
+        out['hybrid' if hybrid else 'agent'] = {
+            k: (float(np.mean(v)), float(np.std(v)))
+            for k, v in (('population', pops), ('ncf', ncfs),
+                         ('metastatic', metas), ('sec_per_step', secs))
+        }
+
+    print(f"{'metric':>14} | {'agent':>20} | {'hybrid':>20}")
+    for k in out['agent']:
+        a, h = out['agent'][k], out['hybrid'][k]
+        print(f"{k:>14} | {a[0]:11.4g} ± {a[1]:<6.3g} | {h[0]:11.4g} ± {h[1]:<6.3g}")
+
+    # Per-step cost against population, one growing tumour per mode
+    out['scaling'], out['slope'] = {}, {}
+    for hybrid in (False, True):
+        mode = 'hybrid' if hybrid else 'agent'
+        sim  = TumorSimulation(L=scaling_L, alpha=alpha, beta=beta, seed=scaling_seed,
+                               hybrid=hybrid)
+        cells, agents, secs = [], [], []
+        while sim.n_cells() < scaling_cells and sim.t < 4 * MAX_SIM_STEPS:
+            t0 = time.perf_counter()
+            sim.step()
+            secs.append(time.perf_counter() - t0)
+            cells.append(sim.n_cells())
+            agents.append(len(sim.cells))
+        cells, agents, secs = (np.array(v, dtype=float) for v in (cells, agents, secs))
+        out['scaling'][mode] = (cells, agents, secs)
+        big = cells >= scaling_cells / 4
+        out['slope'][mode] = (float(np.polyfit(np.log(cells[big]), np.log(secs[big]), 1)[0])
+                              if big.sum() >= 2 else float('nan'))
+
+    marks = [n for n in (1_000, 2_000, 5_000, 10_000, 20_000, 40_000, 80_000)
+             if all(c.size and c.max() >= n for c, _, _ in out['scaling'].values())]
+    at = lambda n, c, v: float(np.interp(np.log(n), np.log(np.maximum.accumulate(c)), v))
+    print(f"\n{'cells':>8} | {'agent s/step':>12} | {'hybrid s/step':>13} | {'hybrid agents':>13}")
+    for n in marks:
+        (ca, _, ta), (ch, ah, th) = out['scaling']['agent'], out['scaling']['hybrid']
+        print(f"{n:8d} | {at(n, ca, ta):12.3f} | {at(n, ch, th):13.3f} | {at(n, ch, ah):13.0f}")
+    print(f"{'slope':>8} | {out['slope']['agent']:12.2f} | {out['slope']['hybrid']:13.2f} |"
+          f"   (d log sec / d log N above {scaling_cells // 4:,} cells)")
+    return out
+
+# ─────────────────────────────────────────────
+#  FIELD SCHEDULE AUDIT
 # ─────────────────────────────────────────────
+def audit_field_schedule(n_seeds: int = 5, n_steps: int = MAX_SIM_STEPS, lattice_L: int = L,
+                         alpha: float = ALPHA, beta: float = BETA) -> dict:
+    """
+    Run every-step and adaptive field updates on the same seeds and compare
+    the quantities the objectives are built from (final population, NCF,
+    total metastatic events, total oxygen consumed), the fraction of steps
+    whose fields were held, and wall time per step. Returns
+    {mode: dict(metric -> (mean, sd))} and prints a table.
+    """
+    import time
+    out = {}
+    for adaptive in (False, True):
+        rows = {k: [] for k in ('population', 'ncf', 'metastatic', 'oxygen', 'held_frac',
+                                'sec_per_step')}
+        for s in range(n_seeds):
+            sim = TumorSimulation(L=lattice_L, alpha=alpha, beta=beta, seed=s,
+                                  adaptive_fields=adaptive)
+            t0  = time.perf_counter()
+            sim.run(n_steps=n_steps, verbose=False)
+            rows['sec_per_step'].append((time.perf_counter() - t0) / n_steps)
+            n = sim.n_cells()
+            rows['population'].append(n)
+            rows['ncf'].append(sim.n_necrotic() / n if n else 0.0)
+            rows['metastatic'].append(sum(sim.history['metastatic_cells']))
+            rows['oxygen'].append(sim.total_oxygen_consumed)
+            rows['held_frac'].append(sim.field_schedule.summary()['held'] / n_steps
+                                     if adaptive else 0.0)
+        out['adaptive' if adaptive else 'every_step'] = {
+            k: (float(np.mean(v)), float(np.std(v))) for k, v in rows.items()}
+
+    print(f"{'metric':>14} | {'every step':>20} | {'adaptive':>20}")
+    for k in out['every_step']:
+        a, h = out['every_step'][k], out['adaptive'][k]
+        print(f"{k:>14} | {a[0]:11.4g} ± {a[1]:<6.3g} | {h[0]:11.4g} ± {h[1]:<6.3g}")
+    return out
 
+# ─────────────────────────────────────────────
+#  FIELD ALLOCATION AUDIT
+# ─────────────────────────────────────────────
+def audit_field_allocations(lattice_L: int = 64, n_steps: int = 5, n_warmup: int = 20,
+                            bound_mb: float = FIELD_ALLOC_MB, seed: int = SEED,
+                            alpha: float = 0.3, beta: float = 0.8, dtype: str = FIELD_DTYPE) -> dict:
+    """
+    Trace the transient field pipeline's allocations with tracemalloc. A sim
+    is warmed up for n_warmup steps, then over n_steps steps the peak traced
+    allocation inside each step's _update_oxygen / _update_phi is recorded
+    (and the whole step's peak, for context). Raises RuntimeError if any
+    field-update peak exceeds bound_mb; the lattice must be large enough
+    that one field array is bigger than the bound, so a lattice-sized
+    temporary cannot pass. Returns the per-step peaks in MB.
+    """
+    import tracemalloc
+    sim = TumorSimulation(L=lattice_L, alpha=alpha, beta=beta, seed=seed, dtype=dtype)
+    field_mb = sim.oxygen.nbytes / 2 ** 20
+    if field_mb <= bound_mb:
+        raise ValueError(f"one field is {field_mb:.2f} MB at L={lattice_L}, not above the "
+                         f"{bound_mb} MB bound; use a larger lattice")
+    for _ in range(n_warmup):
+        sim.step()
+
+    field_peaks, step_peaks = [], []
+    step_high = [0]   # absolute traced peak of the current step, kept across resets
+
+    def traced(update):
+        def wrapper(*args, **kwargs):
+            step_high[0] = max(step_high[0], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+            try:
+                return update(*args, **kwargs)
+            finally:
+                peak = tracemalloc.get_traced_memory()[1]
+                field_peaks[-1] = max(field_peaks[-1], (peak - base) / 2 ** 20)
+                step_high[0] = max(step_high[0], peak)
+        return wrapper
+
+    sim._update_oxygen = traced(sim._update_oxygen)
+    sim._update_phi    = traced(sim._update_phi)
+    tracemalloc.start()
+    try:
+        for _ in range(n_steps):
+            field_peaks.append(0.0)
+            tracemalloc.reset_peak()
+            base = step_high[0] = tracemalloc.get_traced_memory()[0]
+            sim.step()
+            high = max(step_high[0], tracemalloc.get_traced_memory()[1])
+            step_peaks.append((high - base) / 2 ** 20)
+    finally:
+        tracemalloc.stop()
+        sim.close()
+
+    print(f"  L={lattice_L} {dtype}, {sim.n_cells()} cells, one field {field_mb:.2f} MB")
+    for t, (f, st) in enumerate(zip(field_peaks, step_peaks), start=n_warmup + 1):
+        print(f"  step {t:3d} | field updates peak {f:6.3f} MB | whole step peak {st:6.3f} MB")
+    worst = max(field_peaks)
+    if worst > bound_mb:
+        raise RuntimeError(f"field updates allocated {worst:.3f} MB in one step "
+                           f"(bound {bound_mb} MB)")
+    return dict(field_mb=field_mb, field_peak_mb=field_peaks, step_peak_mb=step_peaks)
+
+# ─────────────────────────────────────────────
+#  PRECISION VALIDATION
+# ─────────────────────────────────────────────
+def validate_precision(n_seeds: int = 10, n_steps: int = MAX_SIM_STEPS, lattice_L: int = L,
+                       alpha: float = ALPHA, beta: float = BETA) -> dict:
+    """
+    Run float64 and float32 fields on the same seeds and compare the
+    distributions of the quantities the objectives are built from (final
+    population, NCF, total metastatic events, total oxygen consumed), the
+    field memory and wall time per step. Returns {dtype: dict(metric -> (mean,
+    sd))} and prints a table.
+    """
+    import time
+    out = {}
+    for dtype in ('float64', 'float32'):
+        rows = {k: [] for k in ('population', 'ncf', 'metastatic', 'oxygen', 'field_mb',
+                                'sec_per_step')}
+        for s in range(n_seeds):
+            sim = TumorSimulation(L=lattice_L, alpha=alpha, beta=beta, seed=s, dtype=dtype)
+            t0  = time.perf_counter()
+            sim.run(n_steps=n_steps, verbose=False)
+            rows['sec_per_step'].append((time.perf_counter() - t0) / n_steps)
+            n = sim.n_cells()
+            rows['population'].append(n)
+            rows['ncf'].append(sim.n_necrotic() / n if n else 0.0)
+            rows['metastatic'].append(sum(sim.history['metastatic_cells']))
+            rows['oxygen'].append(sim.total_oxygen_consumed)
+            rows['field_mb'].append((sim.oxygen.nbytes + sim.phi.nbytes +
+                                     sum(b.nbytes for b in sim.ws._bufs.values())) / 2 ** 20)
+        out[dtype] = {k: (float(np.mean(v)), float(np.std(v))) for k, v in rows.items()}
+
+    print(f"{'metric':>14} | {'float64':>20} | {'float32':>20}")
+    for k in out['float64']:
+        a, h = out['float64'][k], out['float32'][k]
+        print(f"{k:>14} | {a[0]:11.4g} ± {a[1]:<6.3g} | {h[0]:11.4g} ± {h[1]:<6.3g}")
+    return out
+
+# ─────────────────────────────────────────────
+#  FIELD BENCHMARKS
+# ─────────────────────────────────────────────
+def benchmark_cell_fields(lattice_L: int = 64, fills=(0.01, 0.03, 0.1, 0.2, 0.3, 0.5, 0.8),
+                          n_reps: int = 3) -> dict:
+    """
+    Wall time of one full-grid oxygen uptake on the dense (mask sweep) and
+    sparse (gather / scatter at cell sites) paths, for cells scattered at
+    random over the lattice at each fill fraction (10 % of them necrotic).
+    Prints the table and the crossover fill; returns {fill: (dense_s, sparse_s)}.
+    The crossover sets SPARSE_FILL.
+    """
+    import time
+    rng = np.random.default_rng(SEED)
+    out = {}
+    for fill in fills:
+        sim   = TumorSimulation(L=lattice_L, seed=SEED, windowed=False)
+        sim._remove_cell(sim.cells[0])
+        sites = rng.choice(lattice_L ** 3, int(fill * lattice_L ** 3), replace=False)
+        for x, y, z in zip(*(a.tolist() for a in np.unravel_index(sites, sim.oxygen.shape))):
+            sim._attach_cell(Cell(x, y, z, condensing=False))
+        for c in sim.cells[::10]:
+            c.alive, c.necrotic = False, True
+            sim.necrotic_sites[c.x, c.y, c.z] = True
+        sim.oxygen[:] = rng.uniform(0.2, O_MAX, sim.oxygen.shape)
+        O0 = sim.oxygen.copy()
+        best = {}
+        for sparse in (False, True):
+            best[sparse] = float('inf')
+            for _ in range(n_reps):
+                np.copyto(sim.oxygen, O0)
+                t0 = time.perf_counter()
+                sim._consume_oxygen(sparse=sparse)
+                best[sparse] = min(best[sparse], time.perf_counter() - t0)
+        out[fill] = (best[False], best[True])
+        print(f"  fill={fill:6.3f} | dense {best[False] * 1e3:8.2f} ms | "
+              f"sparse {best[True] * 1e3:8.2f} ms | sparse/dense {best[True] / best[False]:5.2f}")
+    slower = [f for f, (d, sp) in out.items() if sp >= d]
+    if slower:
+        print(f"  crossover: dense is faster from fill ≈ {min(slower)}")
+    else:
+        print(f"  crossover: sparse is faster at every fill tested")
+    return out
+
+def benchmark_field_threads(lattice_L: int = 128, threads=(1, 2, 4, 8), n_reps: int = 3,
+                            radius_frac: float = 0.25, out_path: str | None = None) -> dict:
+    """
+    Wall time of one full-grid transient field update (oxygen uptake, diffusion
+    and angiogenic supply, then phi injection and diffusion) on a spherical
+    tumour of radius radius_frac·L, for each thread count. Prints speed-ups
+    relative to the first entry, checks that every thread count gives the
+    same fields bit for bit, and returns {threads: seconds}. Thread counts
+    above the usable CPUs are flagged, since they measure contention rather
+    than scaling. With out_path the rows (with the host and CPU count) are
+    appended to that CSV. Thread scaling has not been measured yet (the
+    development machine has a single CPU), so any expected speed-up is
+    unverified until this is run on a node with at least max(threads) cores.
+    """
+    import time
+    import csv
+    import platform
+    n_cpu = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+    if max(threads) > n_cpu:
+        print(f"  [WARNING] {n_cpu} usable CPU(s): thread counts above that do not measure scaling")
+    out, rows, ref = {}, [], None
+    for n_thr in threads:
+        sim = TumorSimulation(L=lattice_L, seed=SEED, windowed=False, threads=n_thr)
+        c, r = lattice_L // 2, int(radius_frac * lattice_L)
+        for x in range(c - r, c + r + 1):
+            for y in range(c - r, c + r + 1):
+                for z in range(c - r, c + r + 1):
+                    if ((x - c) ** 2 + (y - c) ** 2 + (z - c) ** 2 <= r * r
+                            and not sim.occupied[x, y, z]):   # __init__ seeded the centre
+                        sim._place_cell(x, y, z)
+        sim.angiogenic_on = True
+        best = float('inf')
+        for _ in range(n_reps):
+            t0 = time.perf_counter()
+            sim._update_oxygen()
+            sim._update_phi()
+            best = min(best, time.perf_counter() - t0)
+        fields = (sim.oxygen.copy(), sim.phi.copy())
+        sim.close()
+        if ref is None:
+            ref = fields
+        elif not all(np.array_equal(a, b) for a, b in zip(ref, fields)):
+            raise RuntimeError(f"threads={n_thr} fields differ from threads={threads[0]}")
+        out[n_thr] = best
+        rows.append(dict(host=platform.node(), cpus=n_cpu, L=lattice_L, threads=n_thr,
+                         sec=best, speedup=out[threads[0]] / best))
+        print(f"  threads={n_thr:2d} | {best:7.3f}s per field update | "
+              f"speed-up {out[threads[0]] / best:4.2f}x" + ("" if n_thr <= n_cpu else "  (oversubscribed)"))
+    if out_path:
+        new = not os.path.exists(out_path)
+        with open(out_path, 'a', newline='') as f:
+            w = csv.DictWriter(f, fieldnames=list(rows[0]))
+            if new:
+                w.writeheader()
+            w.writerows(rows)
+    return out
+
+# ─────────────────────────────────────────────
+#  PLOTTING
+# ─────────────────────────────────────────────
 def plot_results(sim: TumorSimulation, fig_path: str = None):
     h = sim.history
     t = np.arange(1, len(h['population']) + 1)
@@ -827,14 +2597,16 @@ if __name__ == '__main__':
     # ── Single reference run
     sim = TumorSimulation(L=L, alpha=ALPHA, beta=BETA, seed=SEED)
     sim.run(n_steps=MAX_SIM_STEPS, verbose=True)
-    print(f"\nFinal population      : {len(sim.cells)} cells")
+    print(f"\nFinal population      : {sim.n_cells()} cells")
     print(f"Total metastatic events: {sum(sim.history['metastatic_cells'])}")
     print(f"Angiogenic switch triggered: {sim.angiogenic_on}")
+    sim.materialize_core()   # per-cell plots and export need agents everywhere
  
     plot_results(sim,        fig_path='results/tumor_results.png')
     plot_oxygen_slice(sim,   fig_path='results/tumor_diffusion.png')
     
-    # ── Export CSVs for 3D interactive viewer
+    # ── Export the cell snapshot (NPZ) and CSVs for the 3D interactive viewer
+    sim.save_snapshot('results/tumor_cells.npz')
     sim.save_cells_csv('../3D_Viewer/data/tumor_cells.csv')
     sim.save_history_csv('../3D_Viewer/data/tumor_history.csv')
  
@@ -8,7 +8,9 @@ Required input files (same directory as this script)
 -----------------------------------------------------
     pareto_summary.csv  — one row per (α,β,γ,N_A) combination
     run_summary.csv     — one row per individual simulation run
-    raw_runs.csv        — one row per (run, timestep)
+    raw_runs.csv        — one row per (run, timestep); optional — histories
+                          the sweep did not keep are regenerated with
+                          batch_sweep.replay_run (figure 05)
 
 Output
 ------
@@ -397,17 +399,38 @@ def fig04_phase_heatmaps(pf: pd.DataFrame):
 # ─────────────────────────────────────────────────────────────────────────────
 #  FIG 05 — TIME EVOLUTION OF REPRESENTATIVE RUNS
 # ─────────────────────────────────────────────────────────────────────────────
+def _run_history(raw: pd.DataFrame | None, chosen: pd.Series, keys: list[str]) -> pd.DataFrame:
+    """
+    History of one run: from raw_runs.csv when the sweep kept it, otherwise
+    replayed deterministically (and cached) by batch_sweep.replay_run under
+    the settings recorded in the sweep's sweep_meta.json.
+    """
+    if raw is not None:
+        hist = raw
+        for k in keys:
+            if k in hist.columns:
+                hist = hist[hist[k] == chosen[k]]
+        hist = hist[hist["run_id"] == chosen["run_id"]].sort_values("sim_time")
+        if not hist.empty:
+            return hist
+    from batch_sweep import SWEEP_META, replay_run
+    print(f"    replaying α={chosen['alpha']}, β={chosen['beta']}, γ={chosen['gamma']}, "
+          f"N_A={int(chosen['n_a'])}, seed={int(chosen['seed'])} …")
+    return pd.DataFrame(replay_run(chosen["alpha"], chosen["beta"], chosen["gamma"],
+                                   int(chosen["n_a"]), int(chosen["seed"]),
+                                   meta_path=os.path.join(os.path.dirname(SUMM_CSV), SWEEP_META)))
+
 def fig05_time_evolution(front: pd.DataFrame, run: pd.DataFrame):
     print("  Loading raw_runs.csv for time evolution …")
     try:
         raw = pd.read_csv(RAW_CSV)
     except FileNotFoundError:
-        print("  raw_runs.csv not found — skipping figure 05")
-        return
+        print("  raw_runs.csv not found — representative runs will be replayed")
+        raw = None
 
     # Add missing columns for backward compatibility
     for col, default in [("gamma", 0.0), ("n_a", 500)]:
-        if col not in raw.columns:
+        if raw is not None and col not in raw.columns:
             raw[col] = default
         if col not in run.columns:
             run[col] = default
@@ -438,12 +461,8 @@ def fig05_time_evolution(front: pd.DataFrame, run: pd.DataFrame):
         med = ok_runs["fitness"].median()
         chosen = ok_runs.iloc[(ok_runs["fitness"] - med).abs().argsort()[:1]].iloc[0]
 
-        # Fetch its history from raw_runs
-        hist = raw.copy()
-        for k in keys:
-            if k in hist.columns:
-                hist = hist[hist[k] == chosen[k]]
-        hist = hist[hist["run_id"] == chosen["run_id"]].sort_values("sim_time")
+        # Fetch its history (raw_runs, or a replay if the sweep did not keep it)
+        hist = _run_history(raw, chosen, keys)
 
         if not hist.empty:
             rep_runs[s_idx] = (name, chosen, hist)
@@ -25,8 +25,63 @@ Parameters swept
 Outputs (single-node mode)
 --------------------------
     raw_runs.csv        — per-step history, one row per (run, timestep)
+    history_summary.csv — per-run history statistics (retention 'summary' / 'sample')
     run_summary.csv     — per-run objectives, one row per run
     pareto_summary.csv  — per-(α,β,γ,N_A) means + Pareto-front flag
+    final_states.bin    — packed final state of every run (+ final_states_index.csv)
+    sweep_meta.json     — n_steps, L, SIM_OPTIONS, MAX_CELLS and BASE_SEED of the sweep
+
+Final-state archive
+-------------------
+With FINAL_STATE_ARCHIVE each run's final state is appended to final_states.bin
+as a compressed blob (5–25 KB at L=40): bit-packed occupancy / necrotic /
+condensing / hypoxic masks, oxygen quantised to uint8, the step history and
+total_oxygen_consumed. recompute_objectives(metric) applies any
+metric(state) -> dict to every archived run on a process pool, so a changed
+objective or a new spatial metric needs no new sweep:
+
+    python batch_sweep.py --recompute final_states.bin   # → recomputed_summary.csv
+
+morphology.py uses the same route to append FFT morphology columns (morph_*)
+to run_summary.csv.
+
+History retention
+-----------------
+HISTORY_RETENTION chooses how much per-step history is kept (--retention):
+    none     — no per-step output
+    summary  — history_summary.csv only (peak, final and mean values per run)
+    sample   — history_summary.csv, plus raw_runs.csv rows for the runs with
+               run_id < HISTORY_SAMPLE_RUNS in every combo
+    full     — raw_runs.csv for every run (≈900k rows for the 225-combo sweep)
+Runs are deterministic in (α, β, γ, N_A, seed), so any history that was not
+kept can be regenerated with replay_run(), which caches it under REPLAY_DIR.
+The replay takes n_steps, L, SIM_OPTIONS and MAX_CELLS from the
+sweep_meta.json written next to run_summary.csv, and refuses to run under
+settings that differ from the sweep's:
+
+    python batch_sweep.py --replay 0.3 0.7 0.1 500 17
+
+Steady-state stopping
+---------------------
+With SIM_OPTIONS['converge'] (--converge) each run carries a
+SteadyStateDetector and stops once population, avg_C and
+metastatic rate have stayed flat over its window (or the tumour is extinct).
+The remaining steps are padded with the last history row, and oxygen keeps
+accruing at the window's consumption rate so the objectives stay comparable
+with full runs. run_summary.csv records steps_run, converged_at and sec_saved,
+and the sweep reports the steps and compute saved:
+
+    python batch_sweep.py --converge
+
+Memory guard
+------------
+run_single_node() keeps the pool inside a node memory budget (MEM_BUDGET_MB,
+or SLURM_MEM_PER_NODE / 90% of physical RAM when unset). Worker RSS is polled
+while tasks are in flight and new submissions are held back once the pool
+approaches the budget. A single run whose RSS grows past MEM_PER_RUN_MB stops
+early and is recorded with status 'memory_capped' and NaN objectives (it is
+a part-run, like a timeout); if the OS kills a worker
+anyway, the pool is rebuilt and the lost runs are retried once.
 
 SLURM array-job mode
 --------------------
@@ -56,6 +111,16 @@ Usage
     # After SLURM array jobs finish:
     python batch_sweep.py --merge
 
+    # Common random numbers across combos, then the variance-reduction report:
+    python batch_sweep.py --rng-mode crn
+    python batch_sweep.py --crn-report run_summary.csv
+
+    # Keep summaries and a sample of histories; replay any other run on demand:
+    python batch_sweep.py --retention sample
+
+    # Pareto front under other penalty weights, re-scored from the summaries:
+    python batch_sweep.py --lambda-scan run_summary.csv
+
 Place this file in the same directory as:
     Cancer_Metastasis.py
 """
@@ -66,16 +131,20 @@ import argparse
 import contextlib
 import csv
 import glob
+import hashlib
 import importlib.util
 import io
 import itertools
+import json
+import multiprocessing
 import os
 import pathlib
 import random as _random
 import sys
 import threading
 import time
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 
 import numpy as np
 
@@ -89,6 +158,14 @@ N_A_VALUES:   list[int]   = [200, 500, 1000]    # angiogenic-switch threshold
 
 N_RUNS:    int = 100
 BASE_SEED: int = 0       # seed for run r = BASE_SEED + r
+# Extra TumorSimulation keyword arguments applied to every run:
+#   rng_mode — 'independent' | 'crn' (same noise key across combos, common random numbers)
+#   hybrid   — coarse-grain the enclosed core into density fields
+#   adaptive_fields — hold the fields on steps whose predicted change is below FIELD_TOL
+#   dtype    — 'float64' | 'float32' field storage and kernels
+#   converge — stop a run once it reaches a steady state and pad the rest (converged_at)
+SIM_OPTIONS: dict = dict(rng_mode='independent', hybrid=False, adaptive_fields=False,
+                         dtype='float64', converge=False)
 N_STEPS:   int = 40
 L:         int = 40
 
@@ -101,13 +178,32 @@ LAMBDA_META:  float = 1.0    # metastatic-load weight in DISSIPATION
 MAX_CELLS:        int   = 54_000   # stop run early if population exceeds this
 TIMEOUT_PER_RUN:  float = 900.0   # seconds per run before it is abandoned
 
+# ── Memory limits ─────────────────────────────────────────────────────────────
+MEM_BUDGET_MB:     float | None = None     # node budget; None → SLURM_MEM_PER_NODE or 90% of RAM
+MEM_PER_RUN_MB:    float | None = 4096.0   # stop a single run whose RSS grows past this
+MEM_THROTTLE_FRAC: float = 0.85            # hold back submissions above this fraction of budget
+MEM_POLL_INTERVAL: float = 0.5             # seconds between RSS polls of the worker pool
+
 # ── Pareto warning threshold ───────────────────────────────────────────────────
 TIMEOUT_WARN_FRAC: float = 0.05   # warn if >5% of a pair's runs timed out
 
 # ── Output ────────────────────────────────────────────────────────────────────
 RAW_CSV:    str = "raw_runs.csv"
+HIST_CSV:   str = "history_summary.csv"
 SUMM_CSV:   str = "run_summary.csv"
 PARETO_CSV: str = "pareto_summary.csv"
+SWEEP_META: str = "sweep_meta.json"      # written next to the run summary, read by replay_run
+
+# ── Final-state archive (see module docstring) ────────────────────────────────
+FINAL_STATE_ARCHIVE: bool = True
+ARCHIVE_BIN:         str  = "final_states.bin"        # index: final_states_index.csv
+RECOMPUTED_CSV:      str  = "recomputed_summary.csv"
+
+# ── History retention (see module docstring) ──────────────────────────────────
+RETENTION_POLICIES = ('none', 'summary', 'sample', 'full')
+HISTORY_RETENTION:   str = 'full'
+HISTORY_SAMPLE_RUNS: int = 2          # 'sample': full history for run_id < this, per combo
+REPLAY_DIR:          str = "replay_cache"
 
 MAX_WORKERS:  int | None = None    # None → all available CPUs
 SHUFFLE_SEED: int        = 2025
@@ -144,29 +240,107 @@ def _run_with_timeout(fn, timeout: float):
     if exc_box[0]: raise exc_box[0]
     return result[0]
 
+# ─────────────────────────────────────────────────────────────────────────────
+#  MEMORY MONITORING
+# ─────────────────────────────────────────────────────────────────────────────
+def _rss_mb(pid: int | None = None) -> float:
+    """
+    Resident set size of a process in MB (default: this process).
+    Reads /proc/<pid>/statm on Linux; elsewhere falls back to the peak RSS of
+    the current process, or 0.0 for other processes.
+    """
+    try:
+        with open(f"/proc/{pid or 'self'}/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError, IndexError):
+        if pid is not None:
+            return 0.0
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+def _node_mem_budget_mb() -> float | None:
+    """Memory budget for the whole worker pool in MB, or None if unknown."""
+    if MEM_BUDGET_MB is not None:
+        return float(MEM_BUDGET_MB)
+    slurm_mem = os.environ.get('SLURM_MEM_PER_NODE')
+    if slurm_mem:
+        try:    return float(slurm_mem)
+        except ValueError: pass
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemTotal:'):
+                    return 0.9 * int(line.split()[1]) / 2**10
+    except OSError:
+        pass
+    return None
+
+def _report_pid(pid_queue):
+    """Pool initializer: announce this worker's PID to the parent (see _new_pool)."""
+    pid_queue.put(os.getpid())
+
+def _new_pool(n_workers: int) -> tuple[ProcessPoolExecutor, set, multiprocessing.SimpleQueue]:
+    """
+    A worker pool plus the set of its worker PIDs and the queue that fills it.
+    Every worker reports its PID from its initializer; _pool_rss_mb drains
+    the queue into the set.
+    """
+    pid_queue = multiprocessing.SimpleQueue()
+    pool = ProcessPoolExecutor(max_workers=n_workers, initializer=_report_pid,
+                               initargs=(pid_queue,))
+    return pool, set(), pid_queue
+
+def _pool_rss_mb(pids: set, pid_queue: multiprocessing.SimpleQueue) -> float:
+    """Summed RSS of the pool's worker processes in MB (exited workers count 0)."""
+    while not pid_queue.empty():
+        pids.add(pid_queue.get())
+    return sum(_rss_mb(pid) for pid in pids)
+
 # ─────────────────────────────────────────────────────────────────────────────
 #  PATCHED run() — population cap + oxygen tracking already in Cancer_Metastasis.py
 # ─────────────────────────────────────────────────────────────────────────────
 def _patched_run(self, n_steps: int = 40, verbose: bool = False):
     """
-    Replaces TumorSimulation.run(). Stops early if population exceeds MAX_CELLS
-    and pads remaining steps so every run always contributes exactly n_steps rows.
+    Replaces TumorSimulation.run(). Stops early if population exceeds MAX_CELLS,
+    if the process RSS has grown by more than MEM_PER_RUN_MB since the run
+    started (sets self.memory_capped), or, with SIM_OPTIONS['converge'], once
+    the run's SteadyStateDetector fires (sets self.converged_at). The remaining
+    steps are padded so every run always contributes exactly n_steps rows.
     total_oxygen_consumed is on the sim object and accumulates correctly up to
-    the cap point; padded steps add no further oxygen cost.
+    the stop; steps padded after a cap add no further oxygen cost, steps padded
+    after convergence are credited with the detector's window rate.
+    Sets self.steps_run (steps simulated) and self.sec_saved (padded steps ×
+    the mean wall time of the last simulated steps).
     """
+    rss0 = getattr(self, '_rss0_mb', 0.0)
+    step_sec = []
+    oxygen_rate = 0.0
     for _ in range(n_steps):
+        t0 = time.perf_counter()
         self.step()
-        if len(self.cells) > MAX_CELLS:
-            last = {k: self.history[k][-1] for k in self.history}
-            for _ in range(n_steps - self.t):
-                for k, v in last.items():
-                    self.history[k].append(v)
-                self.t += 1
+        step_sec.append(time.perf_counter() - t0)
+        if self.n_cells() > MAX_CELLS:
             break
+        if MEM_PER_RUN_MB is not None and _rss_mb() - rss0 > MEM_PER_RUN_MB:
+            self.memory_capped = True
+            break
+        if self.steady is not None and self.steady.update(self):
+            if self.t < n_steps:
+                self.converged_at = self.t
+                oxygen_rate = self.steady.oxygen_rate
+            break
+    self.steps_run = len(step_sec)
+    n_pad = n_steps - self.t
+    self.sec_saved = n_pad * float(np.mean(step_sec[-5:])) if n_pad > 0 else 0.0
+    self._pad_history(n_pad, oxygen_rate)
 
 # ─────────────────────────────────────────────────────────────────────────────
 #  OBJECTIVE COMPUTATION
 # ─────────────────────────────────────────────────────────────────────────────
+INCOMPLETE_STATUSES = ('timeout', 'memory_capped')   # part-runs, NaN objectives
+
 def _compute_objectives(sim, status: str) -> dict:
     """
     Extract the four Pareto objectives from a completed simulation.
@@ -174,19 +348,30 @@ def _compute_objectives(sim, status: str) -> dict:
     Returns a dict with: final_alive, final_necrotic, final_total,
     total_metastatic, total_oxygen_consumed, fitness, mei, ncf, dissipation.
 
-    For timed-out runs all objectives are NaN so they are excluded from Pareto.
+    For runs that did not reach n_steps — timed out, stopped by the RSS
+    watchdog ('memory_capped', at a point that depends on the machine), or
+    lost with their worker (sim=None) — all objectives are NaN so they are
+    excluded from the means, the Pareto front and the surrogate.
     """
-    if status == 'timeout':
+    if sim is None or status in INCOMPLETE_STATUSES:
         nan = float('nan')
         return dict(final_alive=nan, final_necrotic=nan, final_total=nan,
                     total_metastatic=nan, total_oxygen_consumed=nan,
                     fitness=nan, mei=nan, ncf=nan, dissipation=nan)
 
-    final_alive    = sum(1 for c in sim.cells if not c.necrotic)
-    final_necrotic = sum(1 for c in sim.cells if c.necrotic)
-    final_total    = len(sim.cells)           # alive + uncleaned necrotic
+    final_total    = sim.n_cells()            # alive + uncleaned necrotic (incl. hybrid core)
+    final_necrotic = sim.n_necrotic()
     total_meta     = int(sum(sim.history['metastatic_cells']))
-    O_consumed     = float(sim.total_oxygen_consumed)
+    return objectives_from_components(final_total, final_necrotic, total_meta,
+                                      float(sim.total_oxygen_consumed))
+
+def objectives_from_components(final_total: int, final_necrotic: int, total_meta: int,
+                               O_consumed: float) -> dict:
+    """
+    The objectives as functions of a run's final counts, metastatic events and
+    oxygen consumed (shared by the sweep and the final-state archive).
+    """
+    final_alive = final_total - final_necrotic
 
     # FITNESS — maximise; guard against division by zero
     if O_consumed > 0 and final_total > 0:
@@ -220,7 +405,24 @@ def _compute_objectives(sim, status: str) -> dict:
 # ─────────────────────────────────────────────────────────────────────────────
 #  WORKER FUNCTION
 # ─────────────────────────────────────────────────────────────────────────────
-def _run_single(args: tuple) -> tuple[list[dict], dict, str]:
+def _failed_result(args: tuple, status: str) -> tuple[list[dict], dict, str, None]:
+    """Zero-padded history rows and NaN objectives for a run that produced no sim (no final state)."""
+    alpha, beta, gamma, n_a, run_id, seed, n_steps, lattice_L, sim_opts = args
+    history_rows = [
+        dict(alpha=alpha, beta=beta, gamma=gamma, n_a=n_a,
+             run_id=run_id, seed=seed,
+             sim_time=t+1, population=0, metastatic_cells=0,
+             avg_b=0.0, avg_d=0.0, avg_C=0.0, R_ratio=0.0)
+        for t in range(n_steps)
+    ]
+    objs = _compute_objectives(None, status)
+    summary_row = dict(alpha=alpha, beta=beta, gamma=gamma, n_a=n_a,
+                       run_id=run_id, seed=seed,
+                       status=status, **objs,
+                       steps_run='', converged_at='', sec_saved='')
+    return history_rows, summary_row, status, None
+
+def _run_single(args: tuple) -> tuple[list[dict], dict, str, bytes | None]:
     """
     Run one simulation.
 
@@ -228,9 +430,11 @@ def _run_single(args: tuple) -> tuple[list[dict], dict, str]:
     -------
     history_rows : list[dict]  — per-step rows for raw_runs.csv
     summary_row  : dict        — single-run objectives for run_summary.csv
-    status       : str         — 'ok' | 'capped' | 'timeout'
+    status       : str         — 'ok' | 'capped' | 'memory_capped' | 'timeout'
+    final_state  : bytes|None  — packed final state for the archive (_pack_final_state),
+                                 None when FINAL_STATE_ARCHIVE is off
     """
-    alpha, beta, gamma, n_a, run_id, seed, n_steps, lattice_L = args
+    alpha, beta, gamma, n_a, run_id, seed, n_steps, lattice_L, sim_opts = args
 
     mod = _load_simulation_module()
     # Inject combo-specific phenotype parameters into the module's global scope
@@ -241,29 +445,23 @@ def _run_single(args: tuple) -> tuple[list[dict], dict, str]:
     mod.TumorSimulation.run = _patched_run   # inject population cap
 
     def _do():
+        rss0 = _rss_mb()
         with contextlib.redirect_stdout(io.StringIO()):
-            sim = mod.TumorSimulation(L=lattice_L, alpha=alpha, beta=beta, seed=seed)
+            sim = mod.TumorSimulation(L=lattice_L, alpha=alpha, beta=beta, seed=seed,
+                                      **dict(sim_opts))
+            sim._rss0_mb = rss0
             sim.run(n_steps=n_steps, verbose=False)
         return sim
 
     try:
         sim    = _run_with_timeout(_do, TIMEOUT_PER_RUN)
         pops   = sim.history['population']
-        status = 'capped' if (pops and pops[-1] >= MAX_CELLS * 0.9) else 'ok'
+        if getattr(sim, 'memory_capped', False):
+            status = 'memory_capped'
+        else:
+            status = 'capped' if (pops and pops[-1] >= MAX_CELLS * 0.9) else 'ok'
     except _TimeoutError:
-        # Return zero-padded history rows and NaN objectives
-        history_rows = [
-            dict(alpha=alpha, beta=beta, gamma=gamma, n_a=n_a,
-                 run_id=run_id, seed=seed,
-                 sim_time=t+1, population=0, metastatic_cells=0,
-                 avg_b=0.0, avg_d=0.0, avg_C=0.0, R_ratio=0.0)
-            for t in range(n_steps)
-        ]
-        objs = _compute_objectives(None, 'timeout')
-        summary_row = dict(alpha=alpha, beta=beta, gamma=gamma, n_a=n_a,
-                           run_id=run_id, seed=seed,
-                           status='timeout', **objs)
-        return history_rows, summary_row, 'timeout'
+        return _failed_result(args, 'timeout')
 
     # ── History rows ─────────────────────────────────────────────────────────
     h = sim.history
@@ -284,9 +482,222 @@ def _run_single(args: tuple) -> tuple[list[dict], dict, str]:
     objs = _compute_objectives(sim, status)
     summary_row = dict(alpha=alpha, beta=beta, gamma=gamma, n_a=n_a,
                        run_id=run_id, seed=seed,
-                       status=status, **objs)
+                       status=status, **objs,
+                       steps_run=sim.steps_run,
+                       converged_at='' if sim.converged_at is None else sim.converged_at,
+                       sec_saved=round(sim.sec_saved, 3))
 
-    return history_rows, summary_row, status
+    final_state = _pack_final_state(sim) if FINAL_STATE_ARCHIVE else None
+    return history_rows, summary_row, status, final_state
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  HISTORY RETENTION AND REPLAY
+# ─────────────────────────────────────────────────────────────────────────────
+def _keep_history(summary_row: dict) -> bool:
+    """True if the retention policy keeps this run's per-step rows."""
+    if HISTORY_RETENTION == 'full':
+        return True
+    return HISTORY_RETENTION == 'sample' and summary_row['run_id'] < HISTORY_SAMPLE_RUNS
+
+def _history_summary(history_rows: list[dict], summary_row: dict) -> dict:
+    """One history_summary.csv row: peak, final and mean values of a run's history."""
+    pops = [r['population'] for r in history_rows]
+    peak = int(np.argmax(pops)) if pops else 0
+    def _mean(k):
+        return round(float(np.mean([r[k] for r in history_rows])), 6) if history_rows else 0.0
+    return dict({k: summary_row[k] for k in ('alpha', 'beta', 'gamma', 'n_a', 'run_id', 'seed')},
+                n_steps=len(history_rows),
+                peak_population=pops[peak] if pops else 0,
+                t_peak=history_rows[peak]['sim_time'] if pops else 0,
+                final_population=pops[-1] if pops else 0,
+                max_metastatic_cells=max((r['metastatic_cells'] for r in history_rows), default=0),
+                mean_avg_b=_mean('avg_b'), mean_avg_d=_mean('avg_d'),
+                mean_avg_C=_mean('avg_C'), mean_R_ratio=_mean('R_ratio'))
+
+def _read_history(path: str) -> list[dict]:
+    """Load history rows written with RAW_FIELDS (integers stay int)."""
+    def _num(v):
+        try: return int(v)
+        except ValueError: return float(v)
+    with open(path, newline='') as f:
+        return [{k: _num(v) for k, v in r.items()} for r in csv.DictReader(f)]
+
+def _sweep_meta(task: tuple) -> dict:
+    """The settings a sweep's trajectories depend on, from one of its task tuples."""
+    return dict(n_steps=task[6], L=task[7], sim_options=dict(task[8]),
+                max_cells=MAX_CELLS, base_seed=BASE_SEED)
+
+def _write_sweep_meta(path: str, meta: dict):
+    """Write sweep_meta.json atomically (SLURM pairs write the same file concurrently)."""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp, path)
+
+def replay_run(alpha, beta, gamma, n_a, seed, n_steps: int | None = None,
+               lattice_L: int | None = None, sim_opts: dict | None = None,
+               cache_dir: str | None = REPLAY_DIR, meta_path: str | None = SWEEP_META) -> list[dict]:
+    """
+    Per-step history of one sweep run (raw_runs.csv rows), regenerated on demand.
+
+    A run is deterministic in (α, β, γ, N_A, seed) for a given n_steps, L,
+    SIM_OPTIONS and MAX_CELLS, so this reproduces the rows the sweep wrote.
+    The exceptions are runs stopped by TIMEOUT_PER_RUN or MEM_PER_RUN_MB,
+    since those limits depend on the machine. The settings come from the
+    sweep's meta_path (sweep_meta.json); n_steps, lattice_L and sim_opts may
+    be given but must match it, and so must MAX_CELLS, otherwise ValueError.
+    Without a meta file (sweeps older than it) the current module settings
+    are used, with a warning. Results are cached as CSV in cache_dir, keyed
+    on everything that affects the trajectory.
+    """
+    current = dict(n_steps=N_STEPS, L=L, sim_options=dict(SIM_OPTIONS),
+                   max_cells=MAX_CELLS, base_seed=BASE_SEED)
+    if meta_path and os.path.exists(meta_path):
+        with open(meta_path) as f:
+            meta = json.load(f)
+        asked = dict(n_steps=n_steps, L=lattice_L, max_cells=MAX_CELLS,
+                     sim_options=None if sim_opts is None else dict(sim_opts))
+        diff = {k: (meta[k], v) for k, v in asked.items() if v is not None and v != meta[k]}
+        if diff:
+            raise ValueError(f"replay settings differ from the sweep's ({meta_path}): "
+                             + ", ".join(f"{k} sweep={a!r} replay={b!r}" for k, (a, b) in diff.items()))
+    else:
+        print(f"  [WARNING] no sweep metadata at {meta_path!r}; replaying with the current "
+              f"settings, which may not be the ones the sweep ran with")
+        meta = dict(current, **{k: v for k, v in dict(n_steps=n_steps, L=lattice_L,
+                                                      sim_options=sim_opts).items() if v is not None})
+    n_steps, lattice_L = int(meta['n_steps']), int(meta['L'])
+    opts = tuple(sorted(dict(meta['sim_options']).items()))
+    n_a  = int(n_a)
+    seed = int(seed)
+    key  = hashlib.sha1(repr((n_steps, lattice_L, opts, MAX_CELLS)).encode()).hexdigest()[:10]
+    path = None
+    if cache_dir:
+        path = os.path.join(cache_dir, f"hist_a{alpha}_b{beta}_g{gamma}_na{n_a}_s{seed}_{key}.csv")
+        if os.path.exists(path):
+            return _read_history(path)
+
+    task = (alpha, beta, gamma, n_a, seed - meta['base_seed'], seed, n_steps, lattice_L, opts)
+    history_rows, _, status, _ = _run_single(task)
+    if path and status in ('ok', 'capped'):
+        os.makedirs(cache_dir, exist_ok=True)
+        with open(path, 'w', newline='') as f:
+            w = csv.DictWriter(f, fieldnames=RAW_FIELDS)
+            w.writeheader()
+            w.writerows(history_rows)
+    elif status not in ('ok', 'capped'):
+        print(f"  [WARNING] replay of α={alpha}, β={beta}, γ={gamma}, N_A={n_a}, "
+              f"seed={seed} ended with status '{status}' — not cached")
+    return history_rows
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  FINAL-STATE ARCHIVE
+# ─────────────────────────────────────────────────────────────────────────────
+ARCHIVE_FIELDS = ['alpha','beta','gamma','n_a','run_id','seed','status','offset','nbytes']
+
+def _archive_index_path(archive_path: str) -> str:
+    return os.path.splitext(archive_path)[0] + "_index.csv"
+
+def _pack_final_state(sim) -> bytes:
+    """
+    A run's final state as a compressed NPZ blob (5–25 KB at L=40): bit-packed
+    occupancy, necrotic, condensing and hypoxic masks, oxygen quantised to
+    uint8 over its range, the step history, and the scalars the objectives
+    need. Hybrid cores are materialised first (call after the objectives).
+    """
+    n_cells, n_necrotic = sim.n_cells(), sim.n_necrotic()
+    sim.materialize_core()
+    L = sim.L
+    condensing = np.zeros((L, L, L), dtype=bool)
+    hypoxic    = np.zeros((L, L, L), dtype=bool)
+    for c in sim.cells:
+        condensing[c.x, c.y, c.z] = c.condensing
+        hypoxic[c.x, c.y, c.z]    = c.hypoxia_time > 0
+    O = sim.oxygen
+    lo, hi = float(O.min()), float(O.max())
+    scale  = (hi - lo) / 255 if hi > lo else 1.0
+    history = {f"h_{k}": np.asarray(v, dtype=np.float32 if any(isinstance(x, float) for x in v)
+                                     else np.int32)
+               for k, v in sim.history.items() if v}
+    buf = io.BytesIO()
+    np.savez_compressed(
+        buf, L=L, t=sim.t, n_cells=n_cells, n_necrotic=n_necrotic,
+        total_oxygen_consumed=float(sim.total_oxygen_consumed),
+        angiogenic_on=sim.angiogenic_on,
+        occupied=np.packbits(sim.occupied), necrotic=np.packbits(sim.necrotic_sites),
+        condensing=np.packbits(condensing), hypoxic=np.packbits(hypoxic),
+        oxygen_q=np.rint((O - lo) / scale).astype(np.uint8), oxygen_lo=lo, oxygen_scale=scale,
+        **history)
+    return buf.getvalue()
+
+def load_final_state(row: dict, archive_path: str = ARCHIVE_BIN) -> dict:
+    """
+    Unpack one archived run (row from read_archive_index): boolean (L,L,L)
+    masks occupied / necrotic / condensing / hypoxic, float32 oxygen, the
+    history as arrays under history[...], the scalars, and the row's params.
+    """
+    with open(archive_path, 'rb') as f:
+        f.seek(int(row['offset']))
+        blob = f.read(int(row['nbytes']))
+    with np.load(io.BytesIO(blob)) as z:
+        L = int(z['L'])
+        state = dict(row, L=L, t=int(z['t']), n_cells=int(z['n_cells']),
+                     n_necrotic=int(z['n_necrotic']),
+                     total_oxygen_consumed=float(z['total_oxygen_consumed']),
+                     angiogenic_on=bool(z['angiogenic_on']))
+        for k in ('occupied', 'necrotic', 'condensing', 'hypoxic'):
+            state[k] = np.unpackbits(z[k], count=L ** 3).astype(bool).reshape(L, L, L)
+        state['oxygen'] = (z['oxygen_q'] * z['oxygen_scale'] + z['oxygen_lo']).astype(np.float32)
+        state['history'] = {k[2:]: z[k] for k in z.files if k.startswith('h_')}
+    return state
+
+def read_archive_index(archive_path: str = ARCHIVE_BIN) -> list[dict]:
+    """The archive's index rows (params, status, byte offset and size of each run)."""
+    rows = []
+    with open(_archive_index_path(archive_path), newline='') as f:
+        for r in csv.DictReader(f):
+            row = {k: float(v) for k, v in r.items() if k in ('alpha', 'beta', 'gamma')}
+            row.update({k: int(r[k]) for k in ('n_a', 'run_id', 'seed', 'offset', 'nbytes')})
+            row['status'] = r['status']
+            rows.append(row)
+    return rows
+
+def archived_objectives(state: dict) -> dict:
+    """The sweep's four objectives recomputed from an archived final state."""
+    return objectives_from_components(state['n_cells'], state['n_necrotic'],
+                                      int(state['history']['metastatic_cells'].sum()),
+                                      state['total_oxygen_consumed'])
+
+def _recompute_chunk(metric, archive_path: str, rows: list[dict]) -> list[dict]:
+    keys = ('alpha', 'beta', 'gamma', 'n_a', 'run_id', 'seed', 'status')
+    return [dict({k: row[k] for k in keys}, **metric(load_final_state(row, archive_path)))
+            for row in rows]
+
+def recompute_objectives(metric=archived_objectives, archive_path: str = ARCHIVE_BIN,
+                         max_workers: int | None = None, out_path: str | None = None) -> list[dict]:
+    """
+    Apply metric(state) -> dict to every archived run on a process pool, without
+    re-simulating. metric must be a module-level function (it is pickled);
+    the default recomputes the current objectives from the archive, e.g. after
+    LAMBDA or the formulas in objectives_from_components change.
+    Rows carry the run's params and status; written to out_path if given.
+    """
+    index = read_archive_index(archive_path)
+    n_workers = max_workers or os.cpu_count() or 1
+    chunks = [index[i::n_workers * 4] for i in range(n_workers * 4)]
+    rows: list[dict] = []
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        for part in pool.map(_recompute_chunk, [metric] * len(chunks),
+                             [archive_path] * len(chunks), chunks):
+            rows.extend(part)
+    rows.sort(key=lambda r: (r['alpha'], r['beta'], r['gamma'], r['n_a'], r['run_id']))
+    if out_path and rows:
+        with open(out_path, 'w', newline='') as f:
+            w = csv.DictWriter(f, fieldnames=list(rows[0]))
+            w.writeheader()
+            w.writerows(rows)
+        print(f"  → {out_path}  ({len(rows)} runs)")
+    return rows
 
 # ─────────────────────────────────────────────────────────────────────────────
 #  PARETO FRONT
@@ -321,7 +732,7 @@ def compute_pareto(summ_rows: list[dict]) -> list[dict]:
 
     Returns a list of dicts, one per (α,β,γ,N_A) combo, with columns:
         alpha, beta, gamma, n_a,
-        n_ok, n_capped, n_timeout, timeout_frac, timeout_warning,
+        n_ok, n_capped, n_memory_capped, n_timeout, timeout_frac, timeout_warning,
         mean_fitness, std_fitness,
         mean_mei,     std_mei,
         mean_ncf,     std_ncf,
@@ -335,9 +746,13 @@ def compute_pareto(summ_rows: list[dict]) -> list[dict]:
 
     agg = []
     for (alpha, beta, gamma, n_a), rows in sorted(groups.items()):
-        ok_rows = [r for r in rows if r['status'] != 'timeout']
+        # Part-runs (INCOMPLETE_STATUSES) have NaN objectives; only complete
+        # runs with finite objectives count towards n_ok and the means.
+        ok_rows = [r for r in rows if r['status'] not in INCOMPLETE_STATUSES and
+                   all(np.isfinite(float(r[k])) for k in ('fitness', 'mei', 'ncf', 'dissipation'))]
         n_ok      = len(ok_rows)
         n_capped  = sum(1 for r in rows if r['status'] == 'capped')
+        n_mem_cap = sum(1 for r in rows if r['status'] == 'memory_capped')
         n_timeout = sum(1 for r in rows if r['status'] == 'timeout')
         timeout_frac = n_timeout / len(rows) if rows else 0.0
         warn = timeout_frac > TIMEOUT_WARN_FRAC
@@ -361,7 +776,8 @@ def compute_pareto(summ_rows: list[dict]) -> list[dict]:
 
         agg.append(dict(
             alpha=alpha, beta=beta, gamma=gamma, n_a=n_a,
-            n_ok=n_ok, n_capped=n_capped, n_timeout=n_timeout,
+            n_ok=n_ok, n_capped=n_capped, n_memory_capped=n_mem_cap,
+            n_timeout=n_timeout,
             timeout_frac=round(timeout_frac, 4),
             timeout_warning=warn,
             mean_fitness    =round(mf, 8), std_fitness    =round(sf, 8),
@@ -378,6 +794,208 @@ def compute_pareto(summ_rows: list[dict]) -> list[dict]:
 
     return agg
 
+# ─────────────────────────────────────────────────────────────────────────────
+#  COMMON-RANDOM-NUMBER VARIANCE REPORT
+# ─────────────────────────────────────────────────────────────────────────────
+CRN_CSV: str = "crn_report.csv"
+OBJECTIVE_KEYS = ('fitness', 'mei', 'ncf', 'dissipation')
+
+def _read_summary(path: str) -> list[dict]:
+    """Load run_summary.csv with numeric columns cast (missing γ/N_A → 0.0/500)."""
+    def _f(v):
+        try: return float(v)
+        except (TypeError, ValueError): return float('nan')
+    rows = []
+    with open(path, newline='') as f:
+        for r in csv.DictReader(f):
+            row = {k: _f(v) for k, v in r.items() if k != 'status'}
+            row.setdefault('gamma', 0.0)
+            row.setdefault('n_a', 500.0)
+            row['status'] = r.get('status', 'ok')
+            rows.append(row)
+    return rows
+
+def crn_variance_report(summ_rows: list[dict], out_path: str | None = CRN_CSV) -> list[dict]:
+    """
+    Variance reduction of pairwise objective differences between neighbouring combos.
+
+    For every pair of combos one grid step apart in exactly one parameter,
+    runs are matched on seed and Var(X_a − X_b) is compared with
+    Var(X_a) + Var(X_b), the variance of the difference of independent runs.
+    Their ratio (var_ratio < 1 means reduction) is the fraction of replicates
+    needed under common random numbers for the same precision on the
+    difference. Run the sweep with --rng-mode crn to obtain it; under
+    'independent' streams the ratio should sit near 1.
+    """
+    from collections import defaultdict
+    params = ('alpha', 'beta', 'gamma', 'n_a')
+    combos: dict[tuple, dict] = defaultdict(dict)
+    for r in summ_rows:
+        if r['status'] == 'timeout':
+            continue
+        combos[tuple(r[p] for p in params)][r['seed']] = r
+    grid = [sorted({c[i] for c in combos}) for i in range(len(params))]
+
+    report = []
+    for combo_a, runs_a in sorted(combos.items()):
+        for i, p in enumerate(params):
+            pos = grid[i].index(combo_a[i])
+            if pos + 1 >= len(grid[i]):
+                continue
+            combo_b = combo_a[:i] + (grid[i][pos + 1],) + combo_a[i+1:]
+            runs_b  = combos.get(combo_b)
+            if not runs_b:
+                continue
+            seeds = sorted(set(runs_a) & set(runs_b))
+            if len(seeds) < 3:
+                continue
+            row = dict(zip(params, combo_a), param=p, step_to=combo_b[i], n_pairs=len(seeds))
+            for k in OBJECTIVE_KEYS:
+                xa = np.array([runs_a[sd][k] for sd in seeds], dtype=float)
+                xb = np.array([runs_b[sd][k] for sd in seeds], dtype=float)
+                ok = np.isfinite(xa) & np.isfinite(xb)
+                var_indep  = np.var(xa[ok], ddof=1) + np.var(xb[ok], ddof=1) if ok.sum() > 2 else 0.0
+                var_paired = np.var(xa[ok] - xb[ok], ddof=1) if ok.sum() > 2 else 0.0
+                row[f'var_ratio_{k}'] = (round(float(var_paired / var_indep), 6)
+                                         if var_indep > 0 else float('nan'))
+            report.append(row)
+
+    if not report:
+        print("No neighbouring combos with ≥3 seed-matched runs — nothing to report.")
+        return report
+
+    print(f"Common-random-number variance report ({len(report)} neighbouring combo pairs)")
+    print(f"  {'objective':<12} {'median Var(Δ)/Var_indep':>24} {'replicate saving':>17}")
+    for k in OBJECTIVE_KEYS:
+        ratios = np.array([r[f'var_ratio_{k}'] for r in report], dtype=float)
+        ratios = ratios[np.isfinite(ratios)]
+        if ratios.size == 0:
+            continue
+        med = float(np.median(ratios))
+        saving = f"{1.0 / med:.1f}×" if med > 0 else "∞"
+        print(f"  {k:<12} {med:>24.3f} {saving:>17}")
+
+    if out_path:
+        fields = list(params) + ['param', 'step_to', 'n_pairs'] + \
+                 [f'var_ratio_{k}' for k in OBJECTIVE_KEYS]
+        with open(out_path, 'w', newline='') as f:
+            w = csv.DictWriter(f, fieldnames=fields)
+            w.writeheader()
+            w.writerows(report)
+        print(f"  → {out_path}")
+    return report
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  λ WHAT-IF RESCORING
+# ─────────────────────────────────────────────────────────────────────────────
+LAMBDA_CSV:        str = "lambda_scan.csv"
+LAMBDA_FRONT_CSV:  str = "lambda_front.csv"
+# Grid scanned by --lambda-scan (full product of the three lists)
+LAMBDA_GRID       = list(np.geomspace(1e-3, 1.0, 100))
+LAMBDA_NECRO_GRID = [LAMBDA_NECRO]
+LAMBDA_META_GRID  = [LAMBDA_META]
+
+def _pareto_mask(F, M, N, D) -> np.ndarray:
+    """
+    Pareto-front flags for every row of (G, C) objective means, with the same
+    dominance rule as _is_dominated (F maximised; M, N, D minimised).
+    Combos with NaN means are never on the front.
+    """
+    valid = np.isfinite(F) & np.isfinite(M) & np.isfinite(N) & np.isfinite(D)
+    front = np.zeros(F.shape, dtype=bool)
+    for g in range(F.shape[0]):
+        f, m, n, d = (a[g][valid[g]] for a in (F, M, N, D))
+        # weak[j, i]: combo j is at least as good as combo i in every objective
+        weak   = ((f[:, None] >= f[None, :]) & (m[:, None] <= m[None, :]) &
+                  (n[:, None] <= n[None, :]) & (d[:, None] <= d[None, :]))
+        strict = ((f[:, None] > f[None, :]) | (m[:, None] < m[None, :]) |
+                  (n[:, None] < n[None, :]) | (d[:, None] < d[None, :]))
+        front[g, valid[g]] = ~(weak & strict).any(axis=0)
+    return front
+
+def rescore_lambdas(summ_rows: list[dict], lambdas=None, lambdas_necro=None, lambdas_meta=None,
+                    out_path: str | None = LAMBDA_CSV,
+                    front_path: str | None = LAMBDA_FRONT_CSV) -> tuple[list[dict], list[dict]]:
+    """
+    Re-score FITNESS and DISSIPATION for every (λ, λ_necro, λ_meta) in the
+    product of the given grids (defaults: the LAMBDA*_GRID lists). The score is
+    computed from the λ-free components in run_summary.csv (final_alive,
+    total_oxygen_consumed, total_metastatic, final_total, ncf, mei), so no
+    simulation runs. Per-combo means and Pareto fronts follow compute_pareto.
+
+    Returns (scan, membership):
+      scan       — one row per grid point: the λs, front size, and the combos
+                   that entered / left relative to the front at the current
+                   LAMBDA, LAMBDA_NECRO and LAMBDA_META (with their Jaccard overlap)
+      membership — one row per combo: front flag at the current λs and the
+                   fraction of grid points at which it is on the front
+    """
+    lam   = np.atleast_1d(LAMBDA_GRID if lambdas is None else lambdas).astype(float)
+    lam_n = np.atleast_1d(LAMBDA_NECRO_GRID if lambdas_necro is None else lambdas_necro).astype(float)
+    lam_m = np.atleast_1d(LAMBDA_META_GRID if lambdas_meta is None else lambdas_meta).astype(float)
+    grid  = np.array(list(itertools.product(lam, lam_n, lam_m)))
+    grid  = np.vstack([[LAMBDA, LAMBDA_NECRO, LAMBDA_META], grid])   # row 0: current λs
+
+    params = ('alpha', 'beta', 'gamma', 'n_a')
+    rows = [r for r in summ_rows
+            if r['status'] not in INCOMPLETE_STATUSES and r['final_total'] == r['final_total']]
+    combos, inv = np.unique(np.array([[r[p] for p in params] for r in rows], dtype=float),
+                            axis=0, return_inverse=True)
+    inv = inv.ravel()
+    col = lambda k: np.array([r[k] for r in rows], dtype=float)
+    alive, O, meta, total = col('final_alive'), col('total_oxygen_consumed'), \
+                            col('total_metastatic'), col('final_total')
+    mei, ncf = col('mei'), col('ncf')
+
+    # Objectives of every run at every grid point: (G, runs)
+    lg, ln, lm = (grid[:, i:i + 1] for i in range(3))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        fitness = np.where((O > 0) & (total > 0), alive / (O * (1.0 + lg * meta)), 0.0)
+    radius2 = np.maximum(1.0, (3.0 * total / (4.0 * np.pi)) ** (1.0 / 3.0)) ** 2
+    dissipation = radius2 * (1.0 + ln * ncf) * (1.0 + lm * mei)
+
+    # Per-combo means (λ-free objectives have one row, broadcast over the grid),
+    # rounded like compute_pareto's: the rounding creates the ties it ranks on
+    counts = np.bincount(inv, minlength=len(combos)).astype(float)
+    def _means(v):
+        v = np.atleast_2d(v)
+        sums = np.stack([np.bincount(inv, weights=r, minlength=len(combos)) for r in v])
+        return np.round(sums / counts, 8)
+    front = _pareto_mask(_means(fitness), np.broadcast_to(_means(mei), (len(grid), len(combos))),
+                         np.broadcast_to(_means(ncf), (len(grid), len(combos))), _means(dissipation))
+
+    base = front[0]
+    scan = []
+    for g in range(1, len(grid)):
+        f = front[g]
+        union = (f | base).sum()
+        scan.append(dict(lam=round(float(grid[g, 0]), 8), lam_necro=round(float(grid[g, 1]), 8),
+                         lam_meta=round(float(grid[g, 2]), 8), n_front=int(f.sum()),
+                         n_entered=int((f & ~base).sum()), n_left=int((base & ~f).sum()),
+                         jaccard=round(float((f & base).sum() / union), 4) if union else 1.0))
+    frac = front[1:].mean(axis=0)
+    membership = [dict(zip(params, c), base_front=bool(b), front_frac=round(float(p), 4))
+                  for c, b, p in zip(combos.tolist(), base, frac)]
+
+    changed = [m for m in membership if 0.0 < m['front_frac'] < 1.0]
+    print(f"λ what-if scan: {len(scan)} grid points × {len(combos)} combos "
+          f"({len(rows)} runs); {int(base.sum())} combos on the front at the current λs")
+    print(f"  always on the front : {sum(m['front_frac'] == 1.0 for m in membership)}")
+    print(f"  λ-sensitive         : {len(changed)}")
+    for m in sorted(changed, key=lambda m: -m['front_frac'])[:10]:
+        print(f"    α={m['alpha']}, β={m['beta']}, γ={m['gamma']}, N_A={int(m['n_a'])}: "
+              f"on the front at {100 * m['front_frac']:.0f}% of grid points"
+              f"{' (front now)' if m['base_front'] else ''}")
+
+    for path, table in ((out_path, scan), (front_path, membership)):
+        if path and table:
+            with open(path, 'w', newline='') as f:
+                w = csv.DictWriter(f, fieldnames=list(table[0]))
+                w.writeheader()
+                w.writerows(table)
+            print(f"  → {path}")
+    return scan, membership
+
 # ─────────────────────────────────────────────────────────────────────────────
 #  SLURM MERGE
 # ─────────────────────────────────────────────────────────────────────────────
@@ -391,27 +1009,49 @@ def merge_slurm_outputs():
     raw_runs.csv, run_summary.csv, and compute pareto_summary.csv.
     """
     raw_files  = sorted(glob.glob("raw_a*_b*_g*_na*.csv"))
+    hist_files = sorted(glob.glob("hsum_a*_b*_g*_na*.csv"))
     summ_files = sorted(glob.glob("summ_a*_b*_g*_na*.csv"))
 
-    if not raw_files:
-        print("No combo CSV files found (expected raw_a*_b*_g*_na*.csv). Run the array jobs first.")
+    if not summ_files:
+        print("No combo CSV files found (expected summ_a*_b*_g*_na*.csv). Run the array jobs first.")
         return
 
-    print(f"Merging {len(raw_files)} raw files and {len(summ_files)} summary files …")
-
-    # Merge raw history
-    raw_header_written = False
-    with open(RAW_CSV, 'w', newline='') as fout:
-        for path in raw_files:
-            with open(path, newline='') as fin:
-                reader = csv.reader(fin)
-                header = next(reader)
-                if not raw_header_written:
-                    csv.writer(fout).writerow(header)
-                    raw_header_written = True
-                for row in reader:
-                    csv.writer(fout).writerow(row)
-    print(f"  → {RAW_CSV}")
+    print(f"Merging {len(raw_files)} raw, {len(hist_files)} history-summary "
+          f"and {len(summ_files)} summary files …")
+
+    # Merge raw history and history summaries (whichever the retention policy wrote)
+    for files, out_path in ((raw_files, RAW_CSV), (hist_files, HIST_CSV)):
+        if not files:
+            continue
+        header_written = False
+        with open(out_path, 'w', newline='') as fout:
+            for path in files:
+                with open(path, newline='') as fin:
+                    reader = csv.reader(fin)
+                    header = next(reader)
+                    if not header_written:
+                        csv.writer(fout).writerow(header)
+                        header_written = True
+                    for row in reader:
+                        csv.writer(fout).writerow(row)
+        print(f"  → {out_path}")
+
+    # Concatenate the final-state archives, shifting each index to its new offsets
+    state_files = sorted(glob.glob("states_a*_b*_g*_na*.bin"))
+    if state_files:
+        with open(ARCHIVE_BIN, 'wb') as fout, \
+             open(_archive_index_path(ARCHIVE_BIN), 'w', newline='') as findex:
+            index_writer = csv.DictWriter(findex, fieldnames=ARCHIVE_FIELDS)
+            index_writer.writeheader()
+            for path in state_files:
+                base = fout.tell()
+                with open(_archive_index_path(path), newline='') as fin:
+                    for row in csv.DictReader(fin):
+                        row['offset'] = int(row['offset']) + base
+                        index_writer.writerow(row)
+                with open(path, 'rb') as fin:
+                    fout.write(fin.read())
+        print(f"  → {ARCHIVE_BIN}  ({len(state_files)} combo archives)")
 
     # Merge summaries and compute Pareto
     summ_rows = []
@@ -427,13 +1067,14 @@ def merge_slurm_outputs():
                         writer.writeheader()
                     for row in reader:
                         # Cast numeric fields
-                        for k in ('alpha','beta','gamma','n_a','run_id','seed',
+                        for k in ('n_a','run_id','seed',
                                   'final_alive','final_necrotic','final_total',
                                   'total_metastatic'):
                             if row.get(k) not in (None,'nan',''):
                                 try: row[k] = int(float(row[k]))
                                 except: pass
-                        for k in ('total_oxygen_consumed','fitness','mei','ncf','dissipation'):
+                        for k in ('alpha','beta','gamma',
+                                  'total_oxygen_consumed','fitness','mei','ncf','dissipation'):
                             if row.get(k) not in (None,''):
                                 try: row[k] = float(row[k])
                                 except: pass
@@ -459,7 +1100,7 @@ def merge_slurm_outputs():
 
 def _write_pareto(pareto_rows: list[dict]):
     fields = ['alpha','beta','gamma','n_a',
-              'n_ok','n_capped','n_timeout','timeout_frac',
+              'n_ok','n_capped','n_memory_capped','n_timeout','timeout_frac',
               'timeout_warning',
               'mean_fitness','std_fitness',
               'mean_mei','std_mei',
@@ -479,73 +1120,194 @@ def _write_pareto(pareto_rows: list[dict]):
 RAW_FIELDS = ['alpha','beta','gamma','n_a','run_id','seed','sim_time',
               'population','metastatic_cells','avg_b','avg_d','avg_C','R_ratio']
 
+HIST_FIELDS = ['alpha','beta','gamma','n_a','run_id','seed','n_steps',
+               'peak_population','t_peak','final_population','max_metastatic_cells',
+               'mean_avg_b','mean_avg_d','mean_avg_C','mean_R_ratio']
+
 SUMM_FIELDS = ['alpha','beta','gamma','n_a','run_id','seed','status',
                'final_alive','final_necrotic','final_total',
                'total_metastatic','total_oxygen_consumed',
-               'fitness','mei','ncf','dissipation']
+               'fitness','mei','ncf','dissipation',
+               'steps_run','converged_at','sec_saved']
 
-def run_single_node(tasks: list[tuple], raw_path: str, summ_path: str):
+def run_single_node(tasks: list[tuple], raw_path: str, summ_path: str,
+                    hist_path: str, archive_path: str | None = None):
+    """
+    Run all tasks on a process pool and stream their rows to CSV. Per-step
+    rows go to raw_path and per-run history statistics to hist_path, as far
+    as HISTORY_RETENTION keeps them (a file the policy does not use is not
+    created). Given an archive_path, and with FINAL_STATE_ARCHIVE, each
+    run's packed final state is appended to it and indexed in its
+    _index.csv; the archive is opt-in so that no caller truncates the
+    sweep's final_states.bin by default. The settings
+    replay_run needs are written to SWEEP_META next to summ_path.
+
+    Submission is memory-aware: at most one task per worker is in flight, and
+    no new task is submitted while the summed worker RSS exceeds
+    MEM_THROTTLE_FRAC of the node budget. If a worker is killed (e.g. by the
+    OOM killer) the pool is rebuilt with half the concurrency and its in-flight
+    tasks are retried once; a task lost twice is recorded as 'memory_capped'.
+    """
     total      = len(tasks)
     completed  = 0
     capped     = 0
+    mem_capped = 0
     timeouts   = 0
     errors     = 0
+    throttled  = 0                        # throttle episodes, not polls
+    throttling = False
     t_start    = time.perf_counter()
     summ_rows  = []
 
-    with open(raw_path, 'w', newline='') as fraw, \
-         open(summ_path, 'w', newline='') as fsum:
-
-        raw_writer  = csv.DictWriter(fraw, fieldnames=RAW_FIELDS)
-        summ_writer = csv.DictWriter(fsum, fieldnames=SUMM_FIELDS)
-        raw_writer.writeheader()
-        summ_writer.writeheader()
-
-        with ProcessPoolExecutor(max_workers=MAX_WORKERS) as pool:
-            futures = {pool.submit(_run_single, task): task for task in tasks}
-
-            for future in as_completed(futures):
-                task = futures[future]
-                try:
-                    hist_rows, summ_row, status = future.result()
-                    raw_writer.writerows(hist_rows)
-                    summ_writer.writerow(summ_row)
-                    fraw.flush(); fsum.flush()
-                    summ_rows.append(summ_row)
-                    completed += 1
-                    if status == 'capped':   capped   += 1
-                    elif status == 'timeout': timeouts += 1
-                except Exception as exc:
-                    errors += 1
-                    alpha_t, beta_t, gamma_t, n_a_t, run_id_t = (
-                        task[0], task[1], task[2], task[3], task[4])
-                    print(f"  [ERROR] α={alpha_t}, β={beta_t}, γ={gamma_t}, "
-                          f"N_A={n_a_t}, run={run_id_t}: {exc}")
-
-                if completed % 250 == 0 or completed == total:
-                    el   = time.perf_counter() - t_start
-                    rate = completed / el if el > 0 else 0
-                    eta  = (total - completed) / rate if rate > 0 else float('inf')
-                    print(f"  [{completed:5d}/{total}]  elapsed={el:6.1f}s  "
-                          f"rate={rate:.1f}/s  ETA≈{eta:5.0f}s  "
-                          f"(capped={capped}, timeouts={timeouts}, err={errors})")
-
+    budget    = _node_mem_budget_mb()
+    n_slots   = MAX_WORKERS or os.cpu_count() or 1
+    pending   = list(reversed(tasks))     # pop() yields tasks in their given order
+    inflight: dict = {}
+    retried:  set  = set()
+
+    with contextlib.ExitStack() as files:
+        def _writer(path, fields):
+            f = files.enter_context(open(path, 'w', newline=''))
+            w = csv.DictWriter(f, fieldnames=fields)
+            w.writeheader()
+            return f, w
+
+        fsum, summ_writer = _writer(summ_path, SUMM_FIELDS)
+        if tasks:
+            _write_sweep_meta(os.path.join(os.path.dirname(summ_path), SWEEP_META),
+                              _sweep_meta(tasks[0]))
+        raw_writer = hist_writer = None
+        if HISTORY_RETENTION in ('sample', 'full'):
+            fraw, raw_writer = _writer(raw_path, RAW_FIELDS)
+        if HISTORY_RETENTION in ('summary', 'sample'):
+            fhist, hist_writer = _writer(hist_path, HIST_FIELDS)
+        farch = None
+        if FINAL_STATE_ARCHIVE and archive_path is not None:
+            farch = files.enter_context(open(archive_path, 'wb'))
+            findex, index_writer = _writer(_archive_index_path(archive_path), ARCHIVE_FIELDS)
+
+        def _record(hist_rows, summ_row, status, state):
+            nonlocal completed, capped, mem_capped, timeouts
+            if farch is not None and state is not None:
+                index_writer.writerow(dict({k: summ_row[k] for k in ARCHIVE_FIELDS[:7]},
+                                           offset=farch.tell(), nbytes=len(state)))
+                farch.write(state)
+                farch.flush(); findex.flush()
+            if raw_writer is not None and _keep_history(summ_row):
+                raw_writer.writerows(hist_rows)
+                fraw.flush()
+            if hist_writer is not None:
+                hist_writer.writerow(_history_summary(hist_rows, summ_row))
+                fhist.flush()
+            summ_writer.writerow(summ_row)
+            fsum.flush()
+            summ_rows.append(summ_row)
+            completed += 1
+            if status == 'capped':          capped     += 1
+            elif status == 'memory_capped': mem_capped += 1
+            elif status == 'timeout':       timeouts   += 1
+            if completed % 250 == 0 or completed == total:
+                el   = time.perf_counter() - t_start
+                rate = completed / el if el > 0 else 0
+                eta  = (total - completed) / rate if rate > 0 else float('inf')
+                print(f"  [{completed:5d}/{total}]  elapsed={el:6.1f}s  "
+                      f"rate={rate:.1f}/s  ETA≈{eta:5.0f}s  "
+                      f"(capped={capped}, mem_capped={mem_capped}, "
+                      f"timeouts={timeouts}, err={errors})")
+
+        pool, pids, pid_queue = _new_pool(n_slots)
+        try:
+            while pending or inflight:
+                # ── Submit while there are free slots and memory headroom
+                while pending and len(inflight) < n_slots:
+                    if (inflight and budget is not None and
+                            _pool_rss_mb(pids, pid_queue) > MEM_THROTTLE_FRAC * budget):
+                        if not throttling:
+                            throttled += 1
+                        throttling = True
+                        break
+                    throttling = False
+                    task = pending.pop()
+                    inflight[pool.submit(_run_single, task)] = task
+
+                done, _ = wait(inflight, timeout=MEM_POLL_INTERVAL,
+                               return_when=FIRST_COMPLETED)
+                broken = False
+                for future in done:
+                    task = inflight.pop(future)
+                    try:
+                        _record(*future.result())
+                    except BrokenProcessPool:
+                        broken = True
+                        inflight[future] = task   # handled with the rest below
+                    except Exception as exc:
+                        errors += 1
+                        alpha_t, beta_t, gamma_t, n_a_t, run_id_t = (
+                            task[0], task[1], task[2], task[3], task[4])
+                        print(f"  [ERROR] α={alpha_t}, β={beta_t}, γ={gamma_t}, "
+                              f"N_A={n_a_t}, run={run_id_t}: {exc}")
+
+                if broken:
+                    # A worker died; every in-flight future is lost with it.
+                    lost = list(inflight.values())
+                    inflight.clear()
+                    pool.shutdown(wait=False)
+                    n_slots = max(1, n_slots // 2)
+                    print(f"  [WARNING] worker pool lost {len(lost)} run(s); "
+                          f"restarting with {n_slots} workers")
+                    for task in lost:
+                        if task in retried:
+                            _record(*_failed_result(task, 'memory_capped'))
+                        else:
+                            retried.add(task)
+                            pending.append(task)
+                    pool, pids, pid_queue = _new_pool(n_slots)
+        finally:
+            pool.shutdown(wait=True)
+
+    if throttled:
+        print(f"  Memory throttle engaged {throttled} time(s) "
+              f"(budget {budget:,.0f} MB, per-run cap {MEM_PER_RUN_MB} MB)")
+    _report_early_stops(summ_rows, tasks)
     return summ_rows
 
+def _report_early_stops(summ_rows: list[dict], tasks: list[tuple]):
+    """Steps not simulated, and the estimated compute saved, by cap and by convergence."""
+    n_steps = {task[:5]: task[6] for task in tasks}
+    ran = [r for r in summ_rows if r.get('steps_run', '') != '']
+    if not ran:
+        return
+    requested = sum(n_steps[tuple(r[k] for k in ('alpha', 'beta', 'gamma', 'n_a', 'run_id'))]
+                    for r in ran)
+    skipped = requested - sum(r['steps_run'] for r in ran)
+    conv    = [r for r in ran if r['converged_at'] != '']
+    sec     = sum(r['sec_saved'] for r in ran)
+    sec_cv  = sum(r['sec_saved'] for r in conv)
+    print(f"  Early stops   : {len(conv)} converged, "
+          f"{sum(1 for r in ran if r['status'] in ('capped', 'memory_capped'))} capped — "
+          f"{skipped:,} of {requested:,} steps not simulated ({100 * skipped / requested:.1f}%), "
+          f"≈{sec:,.1f}s of compute saved ({sec_cv:,.1f}s by convergence)")
+
 # ─────────────────────────────────────────────────────────────────────────────
 #  SLURM SINGLE-PAIR RUN
 # ─────────────────────────────────────────────────────────────────────────────
+def _sim_opts() -> tuple:
+    """SIM_OPTIONS as a sorted tuple of items, so task tuples stay hashable."""
+    return tuple(sorted(SIM_OPTIONS.items()))
+
 def run_slurm_pair(combo_idx: int, combos: list[tuple]):
     alpha, beta, gamma, n_a = combos[combo_idx]
     tasks = [
-        (alpha, beta, gamma, n_a, run_id, BASE_SEED + run_id, N_STEPS, L)
+        (alpha, beta, gamma, n_a, run_id, BASE_SEED + run_id, N_STEPS, L, _sim_opts())
         for run_id in range(N_RUNS)
     ]
     raw_path  = _pair_file_tag(alpha, beta, gamma, n_a, 'raw')
+    hist_path = _pair_file_tag(alpha, beta, gamma, n_a, 'hsum')
     summ_path = _pair_file_tag(alpha, beta, gamma, n_a, 'summ')
+    arch_path = os.path.splitext(_pair_file_tag(alpha, beta, gamma, n_a, 'states'))[0] + '.bin'
 
     print(f"SLURM job {combo_idx}: α={alpha}, β={beta}, γ={gamma}, N_A={n_a} — {N_RUNS} runs")
-    summ_rows = run_single_node(tasks, raw_path, summ_path)
+    summ_rows = run_single_node(tasks, raw_path, summ_path, hist_path, arch_path)
 
     # Per-combo timeout warning
     n_to = sum(1 for r in summ_rows if r['status'] == 'timeout')
@@ -553,7 +1315,7 @@ def run_slurm_pair(combo_idx: int, combos: list[tuple]):
     if frac > TIMEOUT_WARN_FRAC:
         print(f"  [WARNING] {n_to}/{len(summ_rows)} runs timed out ({100*frac:.1f}%) "
               f"for α={alpha}, β={beta}, γ={gamma}, N_A={n_a}")
-    print(f"  Wrote {raw_path}, {summ_path}")
+    print(f"  Wrote {summ_path} (history retention: {HISTORY_RETENTION})")
 
 # ─────────────────────────────────────────────────────────────────────────────
 #  MAIN
@@ -562,12 +1324,65 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser()
     parser.add_argument('--merge', action='store_true',
                         help='Merge SLURM pair outputs and compute Pareto front')
+    parser.add_argument('--rng-mode', choices=('independent', 'crn'),
+                        default=SIM_OPTIONS['rng_mode'],
+                        help='Random-number mode for every run (crn = common random numbers)')
+    parser.add_argument('--hybrid', action='store_true', default=SIM_OPTIONS['hybrid'],
+                        help='Hold the enclosed tumour core as density fields (hybrid mode)')
+    parser.add_argument('--adaptive-fields', action='store_true',
+                        default=SIM_OPTIONS['adaptive_fields'],
+                        help='Skip field updates on steps whose predicted change is below FIELD_TOL')
+    parser.add_argument('--dtype', choices=('float64', 'float32'), default=SIM_OPTIONS['dtype'],
+                        help='Precision of the oxygen / phi fields and their kernels')
+    parser.add_argument('--converge', action='store_true', default=SIM_OPTIONS['converge'],
+                        help='Stop each run at a detected steady state and pad the remaining steps')
+    parser.add_argument('--crn-report', nargs='?', const=SUMM_CSV, metavar='SUMM_CSV',
+                        help='Report the variance reduction of paired differences in a run summary')
+    parser.add_argument('--lambda-scan', nargs='?', const=SUMM_CSV, metavar='SUMM_CSV',
+                        help='Re-score the objectives over the LAMBDA*_GRID values from a run summary')
+    parser.add_argument('--retention', choices=RETENTION_POLICIES, default=HISTORY_RETENTION,
+                        help='How much per-step history to keep (see "History retention")')
+    parser.add_argument('--no-archive', action='store_true',
+                        help='Do not archive the final state of each run')
+    parser.add_argument('--recompute', nargs='?', const=ARCHIVE_BIN, metavar='ARCHIVE',
+                        help='Recompute the objectives of every archived run (no simulation)')
+    parser.add_argument('--replay', nargs=5, metavar=('ALPHA', 'BETA', 'GAMMA', 'N_A', 'SEED'),
+                        type=float, help='Regenerate (or load from cache) the history of one run')
     args = parser.parse_args()
+    SIM_OPTIONS.update(rng_mode=args.rng_mode, hybrid=args.hybrid,
+                       adaptive_fields=args.adaptive_fields, dtype=args.dtype,
+                       converge=args.converge)
+    HISTORY_RETENTION = args.retention
+    FINAL_STATE_ARCHIVE = not args.no_archive
+
+    if args.recompute:
+        t0 = time.perf_counter()
+        rows = recompute_objectives(archive_path=args.recompute, out_path=RECOMPUTED_CSV)
+        print(f"Recomputed {len(rows)} runs in {time.perf_counter() - t0:.1f}s")
+        sys.exit(0)
+
+    if args.replay:
+        a_r, b_r, g_r, na_r, seed_r = args.replay
+        for row in replay_run(a_r, b_r, g_r, int(na_r), int(seed_r)):
+            print(f"  t={row['sim_time']:3d} | N={row['population']:6d} | "
+                  f"meta={row['metastatic_cells']:3d} | <b>={row['avg_b']:.3f} | "
+                  f"<d>={row['avg_d']:.3f} | R={row['R_ratio']:.2f}")
+        sys.exit(0)
 
     if args.merge:
         merge_slurm_outputs()
         sys.exit(0)
 
+    if args.crn_report:
+        crn_variance_report(_read_summary(args.crn_report))
+        sys.exit(0)
+
+    if args.lambda_scan:
+        t0 = time.perf_counter()
+        rescore_lambdas(_read_summary(args.lambda_scan))
+        print(f"  ({time.perf_counter() - t0:.2f}s)")
+        sys.exit(0)
+
     # ── Detect SLURM array mode ───────────────────────────────────────────────
     combos = list(itertools.product(ALPHA_VALUES, BETA_VALUES, GAMMA_VALUES, N_A_VALUES))
     slurm_task_id = os.environ.get('SLURM_ARRAY_TASK_ID')
@@ -586,7 +1401,7 @@ if __name__ == '__main__':
         _load_simulation_module()   # fail fast
 
         tasks = [
-            (alpha, beta, gamma, n_a, run_id, BASE_SEED + run_id, N_STEPS, L)
+            (alpha, beta, gamma, n_a, run_id, BASE_SEED + run_id, N_STEPS, L, _sim_opts())
             for (alpha, beta, gamma, n_a) in combos
             for run_id in range(N_RUNS)
         ]
@@ -605,19 +1420,30 @@ if __name__ == '__main__':
               f"{len(GAMMA_VALUES)} γ × {len(N_A_VALUES)} N_A)")
         print(f"  Runs / combo  : {N_RUNS}")
         print(f"  Steps / run   : {N_STEPS}")
-        print(f"  Seeds         : {BASE_SEED} … {BASE_SEED + N_RUNS - 1}")
+        print(f"  Seeds         : {BASE_SEED} … {BASE_SEED + N_RUNS - 1}  (rng_mode={SIM_OPTIONS['rng_mode']})")
+        print(f"  Hybrid core   : {'on' if SIM_OPTIONS['hybrid'] else 'off'}")
+        print(f"  Field updates : {'adaptive' if SIM_OPTIONS['adaptive_fields'] else 'every step'}"
+              f", {SIM_OPTIONS['dtype']}")
+        print(f"  Steady stop   : {'on' if SIM_OPTIONS['converge'] else 'off'}")
+        print(f"  Final states  : {ARCHIVE_BIN if FINAL_STATE_ARCHIVE else 'not archived'}")
+        print(f"  History       : {HISTORY_RETENTION}"
+              + (f" ({HISTORY_SAMPLE_RUNS} runs / combo)" if HISTORY_RETENTION == 'sample' else ''))
         print(f"  Total sims    : {len(tasks)}")
         print(f"  Workers       : {MAX_WORKERS or os.cpu_count()} processes")
         print(f"  Pop. cap      : {MAX_CELLS:,} cells")
         print(f"  Run timeout   : {TIMEOUT_PER_RUN:.0f}s")
+        print(f"  Mem. budget   : {_node_mem_budget_mb() or float('nan'):,.0f} MB node, "
+              f"{MEM_PER_RUN_MB} MB per run")
         print(f"  Lambda (fit.) : {LAMBDA}")
         print(f"  λ_necro (dis.): {LAMBDA_NECRO}")
         print(f"  λ_meta  (dis.): {LAMBDA_META}")
-        print(f"  Output        : {RAW_CSV}, {SUMM_CSV}, {PARETO_CSV}")
+        history_out = {'none': [], 'summary': [HIST_CSV], 'sample': [RAW_CSV, HIST_CSV],
+                       'full': [RAW_CSV]}[HISTORY_RETENTION]
+        print(f"  Output        : {', '.join(history_out + [SUMM_CSV, PARETO_CSV])}")
         print("-" * 66)
 
         t0 = time.perf_counter()
-        summ_rows = run_single_node(tasks, RAW_CSV, SUMM_CSV)
+        summ_rows = run_single_node(tasks, RAW_CSV, SUMM_CSV, HIST_CSV, ARCHIVE_BIN)
 
         # ── Pareto front ─────────────────────────────────────────────────────
         print("\nComputing Pareto front …")
@@ -628,6 +1454,9 @@ if __name__ == '__main__':
         n_front = sum(1 for r in pareto if r['pareto_front'])
         print("-" * 66)
         print(f"Finished.  Total time: {elapsed:.1f}s  ({elapsed/60:.1f} min)")
-        print(f"  {RAW_CSV}    — per-step history")
+        if RAW_CSV in history_out:
+            print(f"  {RAW_CSV}    — per-step history")
+        if HIST_CSV in history_out:
+            print(f"  {HIST_CSV} — per-run history statistics")
         print(f"  {SUMM_CSV}   — per-run objectives")
         print(f"  {PARETO_CSV} — {n_front}/{len(combos)} combos on Pareto front")
\ No newline at end of file
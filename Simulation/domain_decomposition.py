@@ -0,0 +1,508 @@
+"""
+domain_decomposition.py — multi-process TumorSimulation on shared memory
+========================================================================
+Runs one simulation on a lattice split into slabs along x, each owned by a
+separate worker process, for lattices too large for a single process
+(L ≳ 256). Runs on a single multi-core Linux machine.
+
+Layout
+------
+Shared (multiprocessing.shared_memory):
+    oxygen, phi   — float64 L³ fields
+    boundary      — bool (workers, 2, L, L): each slab's first and last
+                    occupancy plane, published at every halo sync
+    counts, stats — per-worker population counts and per-step fate sums
+Per worker:
+    the Cell objects of its own slab, an object lattice and a necrotic-site
+    map of the slab, an occupancy array whose own rows are live and whose
+    two halo planes are snapshots, and a slab-sized FieldWorkspace.
+
+Step
+----
+Every worker runs TumorSimulation.step() on its own cells. The field
+updates are synchronised with a barrier: uptake, then per explicit
+sub-step a stencil phase and an update phase. The one-plane field halos are
+read directly from the shared arrays, so the barrier between the phases
+serves as the halo exchange.
+
+Occupancy halos are snapshots: a worker never reads a site while its owner
+may be writing it. Each worker publishes its boundary planes and copies its
+neighbours' between barriers (_sync_halo) before the step's cell phase and
+before every hand-off round, and only the owner ever places a cell.
+Divisions and metastasis walks that cross into another slab are handed to
+the owning process, which applies each round's messages sorted by the
+dividing parent's site, so contested claims are resolved in a fixed order.
+Hand-offs run in rounds after the local step until a round sends no
+messages.
+
+A distributed run is therefore reproducible from its seed for a given
+number of workers. Draws use the same CounterRNG addressing as the
+single-process model, so results are statistically consistent with it, but
+not bit-identical: a division into another slab is applied after the local
+step instead of at its turn. validate_distributed() compares the two models
+and checks the reproducibility.
+
+Usage
+-----
+    python domain_decomposition.py --L 96 --steps 30 --workers 4
+"""
+
+from __future__ import annotations
+
+import argparse
+import multiprocessing as mp
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import Cancer_Metastasis as cm
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  CONFIGURATION
+# ─────────────────────────────────────────────────────────────────────────────
+N_WORKERS   = 4
+MP_CONTEXT  = "fork"   # Linux; workers inherit the shared views and class definitions
+RECV_POLL   = 1.0      # s between checks for a failed peer while waiting for hand-offs
+STAT_FIELDS = ["n_alive", "sum_b", "sum_d", "sum_C", "metastatic", "consumed",
+               "population", "necrotic", "surface"]
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  SHARED-MEMORY BLOCKS
+# ─────────────────────────────────────────────────────────────────────────────
+def _shared_array(shape, dtype, fill=0):
+    """Allocate a shared-memory block and return (block, ndarray view)."""
+    nbytes = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    shm = shared_memory.SharedMemory(create=True, size=max(nbytes, 1))
+    arr = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+    arr.fill(fill)
+    return shm, arr
+
+class _SlabArray:
+    """
+    Array over rows [x0, x1) only, indexed with global coordinates; x may be
+    an int or a slice lying within the slab.
+    """
+    def __init__(self, x0: int, x1: int, L: int, dtype, fill):
+        self.x0 = x0
+        self.a  = np.full((x1 - x0, L, L), fill, dtype=dtype)
+
+    def _local(self, idx):
+        x, y, z = idx
+        if isinstance(x, slice):
+            return slice(x.start - self.x0, x.stop - self.x0, x.step), y, z
+        return x - self.x0, y, z
+
+    def __getitem__(self, idx):
+        return self.a[self._local(idx)]
+
+    def __setitem__(self, idx, value):
+        self.a[self._local(idx)] = value
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  SUBDOMAIN SIMULATION (runs inside a worker)
+# ─────────────────────────────────────────────────────────────────────────────
+class _SubdomainSimulation(cm.TumorSimulation):
+    """
+    TumorSimulation restricted to the cells in rows [x0, x1) of the lattice.
+    Fields and occupancy are shared views; sites in other slabs are reached
+    through hand-off messages.
+    """
+    def __init__(self, rank, edges, blocks, barrier, inboxes, L, alpha, beta, seed, rng_mode):
+        self.rank, self.edges = rank, np.asarray(edges)
+        self.x0, self.x1      = int(edges[rank]), int(edges[rank + 1])
+        self.n_ranks          = len(edges) - 1
+        self.barrier, self.inboxes = barrier, inboxes
+        self._shared          = blocks   # views inherited through fork
+        self._boundary        = blocks["boundary"]
+        self._outbox          = None     # None until construction is done (see _place_cell)
+        self._global_n        = 1
+        self._meta_remote     = 0
+        super().__init__(L=L, alpha=alpha, beta=beta, seed=seed, rng_mode=rng_mode,
+                         hybrid=False, ox_solver='explicit', phi_solver='explicit',
+                         oxygen_model='transient', windowed=False, threads=1,
+                         adaptive_fields=False, dtype='float64')
+        self._outbox = [[] for _ in range(self.n_ranks)]
+        self._stash  = {}
+
+    def _allocate_state(self, L: int, threads: int):
+        self.lattice  = _SlabArray(self.x0, self.x1, L, object, None)
+        # Own rows are live; rows x0 − 1 and x1 are halo snapshots (_sync_halo),
+        # and the other rows are never read
+        self.occupied = np.zeros((L, L, L), dtype=bool)
+        self.necrotic_sites = _SlabArray(self.x0, self.x1, L, bool, False)   # own agents only
+        self.oxygen   = self._shared["oxygen"]
+        self.phi      = self._shared["phi"]
+        self.ws       = cm.FieldWorkspace((self.x1 - self.x0, L, L))
+        # Halo sites change under other processes, so the incremental surface
+        # index is not kept; its lookups scan the shared occupancy instead
+        self.frontier, self.surface_area = set(), 0
+
+    def _track_occupancy(self, x, y, z, delta):
+        pass
+
+    def _occupied_6(self, x, y, z) -> int:
+        return sum(1 for dx, dy, dz in cm.NEIGHBORS_6
+                   if self._in_bounds(x + dx, y + dy, z + dz)
+                   and self.occupied[x + dx, y + dy, z + dz])
+
+    def _has_empty_18(self, x, y, z) -> bool:
+        return any(self._in_bounds(x + dx, y + dy, z + dz)
+                   and not self.occupied[x + dx, y + dy, z + dz]
+                   for dx, dy, dz in cm.NEIGHBORS_18)
+
+    # ── Ownership and hand-offs ──────────────────────────────────────────
+
+    def _owner(self, x: int) -> int:
+        return int(np.searchsorted(self.edges, x, side='right')) - 1
+
+    def _remote(self, site: tuple) -> bool:
+        return not (self.x0 <= site[0] < self.x1)
+
+    def _place_cell(self, x: int, y: int, z: int, parent_site: int = -1):
+        if not self._remote((x, y, z)):
+            super()._place_cell(x, y, z, parent_site)
+        elif self._outbox is not None:        # the seed cell is placed by its owner only
+            self._outbox[self._owner(x)].append(('p', parent_site, x, y, z))
+
+    def _hand_off_walk(self, current, key_site, walk_i, visited):
+        """Send a walk that entered another slab to its owner (see _metastasis_walk)."""
+        self._outbox[self._owner(current[0])].append(
+            ('w', key_site, *current, walk_i, tuple(visited)))
+        return None
+
+    def _handle(self, msg) -> int:
+        """Apply one hand-off; returns the number of metastatic events it completed."""
+        if msg[0] == 'p':
+            _, parent, x, y, z = msg
+            if not self.occupied[x, y, z]:
+                cm.TumorSimulation._place_cell(self, x, y, z, parent)
+                return 0
+            # Claimed earlier in the round: continue as the parent's walk
+            # from the contested site, as a local division would
+            return int(self._metastasis_walk((x, y, z), parent) is True)
+        _, key_site, x, y, z, walk_i, visited = msg
+        return int(self._metastasis_walk((x, y, z), key_site, walk_i, set(visited)) is True)
+
+    def _sync_halo(self):
+        """
+        Publish this slab's boundary planes and copy the neighbours' into the
+        halo rows. The barriers keep every read of a plane away from writes to
+        it, so the cell phase and the hand-off rounds see the same halos on
+        every run.
+        """
+        bnd = self._boundary
+        bnd[self.rank, 0] = self.occupied[self.x0]
+        bnd[self.rank, 1] = self.occupied[self.x1 - 1]
+        self.barrier.wait()          # every slab is published
+        if self.rank > 0:
+            self.occupied[self.x0 - 1] = bnd[self.rank - 1, 1]
+        if self.rank < self.n_ranks - 1:
+            self.occupied[self.x1] = bnd[self.rank + 1, 0]
+        self.barrier.wait()          # every halo is copied before the next publish
+
+    def _exchange(self):
+        """
+        Deliver hand-offs in rounds. Every round each worker sends one batch
+        (possibly empty) to every other worker together with the number of
+        messages it sent; all workers therefore see the same round total and
+        stop together once it is zero. Each round's messages are applied in
+        order of the parent site they belong to, after a halo sync.
+        """
+        rnd = 0
+        while True:
+            sent = sum(len(b) for b in self._outbox)
+            for dst in range(self.n_ranks):
+                if dst != self.rank:
+                    self.inboxes[dst].put((self.t, rnd, self.rank, self._outbox[dst], sent))
+            mine = self._outbox[self.rank]   # hand-offs addressed to this rank
+            self._outbox = [[] for _ in range(self.n_ranks)]
+
+            total, batches = sent, [mine]
+            for _ in range(self.n_ranks - 1):
+                msgs, n_sent = self._receive((self.t, rnd))
+                batches.append(msgs)
+                total += n_sent
+            if total == 0:
+                return
+            self._sync_halo()
+            for msg in sorted((m for msgs in batches for m in msgs), key=lambda m: m[1]):
+                self._meta_remote += self._handle(msg)
+            rnd += 1
+
+    def _receive(self, tag):
+        """Next batch for round tag; batches of later rounds are stashed."""
+        if self._stash.get(tag):
+            return self._stash[tag].pop()
+        while True:
+            try:
+                t, rnd, _, msgs, n_sent = self.inboxes[self.rank].get(timeout=RECV_POLL)
+            except queue.Empty:
+                if self.barrier.broken:      # another worker failed
+                    raise threading.BrokenBarrierError
+                continue
+            if (t, rnd) == tag:
+                return msgs, n_sent
+            self._stash.setdefault((t, rnd), []).append((msgs, n_sent))
+
+    # ── Fields: slab updates separated by barriers ───────────────────────
+
+    def n_cells(self) -> int:
+        return self._global_n
+
+    def _slab_surface(self) -> int:
+        """
+        Exposed faces (occupied site, empty in-bounds 6-neighbour) of the sites
+        in rows [x0, x1): this slab's share of TumorSimulation.surface_area.
+        Read after the halo sync that follows the step's last hand-off.
+        """
+        occ, L = self.occupied, self.L
+        own = occ[self.x0:self.x1]
+        n = 0
+        for a, b in ((own[:, 1:], own[:, :-1]), (own[:, :, 1:], own[:, :, :-1])):
+            n += np.count_nonzero(a & ~b) + np.count_nonzero(b & ~a)
+        lo, hi = max(self.x0, 1), min(self.x1, L - 1)
+        n += np.count_nonzero(occ[lo:self.x1] & ~occ[lo - 1:self.x1 - 1])
+        n += np.count_nonzero(occ[self.x0:hi] & ~occ[self.x0 + 1:hi + 1])
+        return int(n)
+
+    def _slab_diffuse(self, u, D, n_steps):
+        """diffuse_3d on the shared field, one barrier-separated phase pair per sub-step."""
+        n_opt, factor = cm.explicit_substeps(D, n_steps)
+        a, b = max(self.x0, 1), min(self.x1, self.L - 1)
+        rows = b - a
+        lap  = self.ws.view('lap', (max(rows, 0), self.L - 2, self.L - 2))
+        tmp  = self.ws.view('tmp', lap.shape)
+        c    = u[a:b, 1:-1, 1:-1]
+        for _ in range(n_opt):
+            if rows > 0:
+                np.add(u[a + 1:b + 1, 1:-1, 1:-1], u[a - 1:b - 1, 1:-1, 1:-1], out=lap)
+                lap += u[a:b, 2:,   1:-1]
+                lap += u[a:b, :-2,  1:-1]
+                lap += u[a:b, 1:-1, 2:  ]
+                lap += u[a:b, 1:-1, :-2  ]
+                lap -= np.multiply(c, 6.0, out=tmp)
+                lap *= factor
+            self.barrier.wait()      # every slab has read its halos
+            if rows > 0:
+                c += lap
+            self.barrier.wait()      # every slab is updated
+
+    def _update_oxygen(self) -> float:
+        win = (slice(self.x0, self.x1), slice(0, self.L), slice(0, self.L))
+        O   = self.oxygen[win]
+        O_before = O.sum()
+        self._consume_oxygen(win)
+        self.barrier.wait()
+        self._slab_diffuse(self.oxygen, cm.D_OX, cm.N_OX)
+        if self.angiogenic_on:
+            O += cm.DELTA * self.phi[win]
+            np.clip(O, 0.0, cm.O_MAX, out=O)
+        self._consumed = float(O_before - O.sum())   # pooled (and clipped at 0) by the driver
+        return 0.0
+
+    def _update_phi(self):
+        N = self.n_cells()
+        if N == 0:
+            return
+        self._inject_phi(N)          # own cells only, so own rows only
+        self.barrier.wait()
+        self._slab_diffuse(self.phi, cm.D_CH * cm.DT, cm.N_CH)
+
+    # ── Step ─────────────────────────────────────────────────────────────
+
+    def run_worker(self, n_steps: int):
+        counts, stats = self._shared["counts"], self._shared["stats"]
+        self._sync_halo()                # the seed cell may border a slab
+        for t in range(n_steps):
+            self._meta_remote = 0
+            self.step()
+            self.t -= 1                  # hand-offs belong to the step just taken
+            self._exchange()
+            self.t += 1
+            self._sync_halo()            # halos for _slab_surface and the next step
+            n_w, s_b, s_d, s_C, meta = self.last_fate_stats
+            n_nec = sum(1 for c in self.cells if c.necrotic)
+            counts[self.rank] = (len(self.cells), n_nec)
+            stats[self.rank, t] = (n_w, s_b, s_d, s_C, meta + self._meta_remote,
+                                   self._consumed, len(self.cells), n_nec,
+                                   self._slab_surface())
+            self.barrier.wait()
+            self._global_n = int(counts[:, 0].sum())
+
+def _worker_main(rank, edges, blocks, barrier, inboxes, params, n_steps, errors):
+    sim = None
+    try:
+        sim = _SubdomainSimulation(rank, edges, blocks, barrier, inboxes, **params)
+        sim.run_worker(n_steps)
+    except BaseException as exc:
+        errors.put((rank, repr(exc)))
+        barrier.abort()              # release the other workers
+        raise
+    finally:
+        if sim is not None:
+            sim.close()
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  DRIVER
+# ─────────────────────────────────────────────────────────────────────────────
+class DistributedTumorSimulation:
+    """
+    One TumorSimulation run spread over n_workers processes (x-slabs).
+
+    After run(), the interface matches the single-process model for
+    everything batch_sweep and the plots read: history, n_cells(),
+    n_necrotic(), total_oxygen_consumed, angiogenic_on and oxygen.
+    """
+    def __init__(self, L=cm.L, alpha=cm.ALPHA, beta=cm.BETA, seed=cm.SEED,
+                 rng_mode=cm.RNG_MODE, n_workers: int = N_WORKERS):
+        if not 1 <= n_workers <= L // 3:
+            raise ValueError(f"n_workers must be between 1 and L//3 = {L // 3}, got {n_workers}")
+        self.L, self.n_workers = L, n_workers
+        self.params = dict(L=L, alpha=alpha, beta=beta, seed=seed, rng_mode=rng_mode)
+        self.edges  = np.linspace(0, L, n_workers + 1).astype(int).tolist()
+        self.history = {k: [] for k in ('population', 'metastatic_cells',
+                                        'avg_b', 'avg_d', 'avg_C', 'R_ratio',
+                                        'surface_area')}
+        self.total_oxygen_consumed = 0.0
+        self.angiogenic_on = False
+        self.oxygen = None
+        self._final = (0, 0)
+
+    def run(self, n_steps: int = cm.MAX_SIM_STEPS, verbose: bool = True):
+        L, P = self.L, self.n_workers
+        ctx  = mp.get_context(MP_CONTEXT)
+        owned = [_shared_array((L, L, L), np.float64, cm.O_MAX),
+                 _shared_array((L, L, L), np.float64, 0.0),
+                 _shared_array((P, 2, L, L), bool, False),
+                 _shared_array((P, 2), np.int64, 0),
+                 _shared_array((P, n_steps, len(STAT_FIELDS)), np.float64, 0.0)]
+        blocks  = dict(zip(("oxygen", "phi", "boundary", "counts", "stats"),
+                           (arr for _, arr in owned)))
+        barrier = ctx.Barrier(P)
+        inboxes = [ctx.Queue() for _ in range(P)]
+        errors  = ctx.Queue()
+        procs = [ctx.Process(target=_worker_main,
+                             args=(r, self.edges, blocks, barrier, inboxes,
+                                   self.params, n_steps, errors))
+                 for r in range(P)]
+        try:
+            for p in procs:
+                p.start()
+            for p in procs:
+                p.join()
+            if any(p.exitcode != 0 for p in procs):
+                msg = errors.get() if not errors.empty() else "worker died"
+                raise RuntimeError(f"distributed run failed: {msg}")
+            self._collect(blocks["oxygen"], blocks["stats"], n_steps, verbose)
+        finally:
+            for shm, _ in owned:
+                shm.close()
+                shm.unlink()
+
+    def _collect(self, oxygen, stats, n_steps, verbose):
+        """Pool the per-worker step sums into the single-process history format."""
+        s = stats.sum(axis=0)                                       # (n_steps, fields)
+        col = {k: s[:, i] for i, k in enumerate(STAT_FIELDS)}
+        n_w = np.maximum(col['n_alive'], 1e-12)
+        for t in range(n_steps):
+            alive = col['n_alive'][t] > 0
+            avg_b = col['sum_b'][t] / n_w[t] if alive else 0.0
+            avg_d = col['sum_d'][t] / n_w[t] if alive else 0.0
+            avg_C = col['sum_C'][t] / n_w[t] if alive else 0.0
+            R     = avg_b / avg_d if avg_d > 1e-9 else float('inf')
+            self.history['population'].append(int(col['population'][t]))
+            self.history['metastatic_cells'].append(int(col['metastatic'][t]))
+            self.history['avg_b'].append(float(avg_b))
+            self.history['avg_d'].append(float(avg_d))
+            self.history['avg_C'].append(float(avg_C))
+            self.history['R_ratio'].append(min(R, 50) if alive else 0)
+            self.history['surface_area'].append(int(col['surface'][t]))
+            self.total_oxygen_consumed += max(0.0, float(col['consumed'][t]))
+            if verbose and (t % 5 == 0 or t == n_steps - 1):
+                print(f"  t={t + 1:3d} | N={int(col['population'][t]):6d} | "
+                      f"meta={int(col['metastatic'][t]):4d} | <b>={avg_b:.3f} | <d>={avg_d:.3f}")
+        pops = self.history['population']
+        # The switch turns on at the first step that starts with N ≥ N_A
+        self.angiogenic_on = any(n >= cm.N_A for n in pops[:-1])
+        self._final = (int(col['population'][-1]), int(col['necrotic'][-1])) if n_steps else (0, 0)
+        self.oxygen = np.array(oxygen)
+
+    def n_cells(self) -> int:
+        return self._final[0]
+
+    def n_necrotic(self) -> int:
+        return self._final[1]
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  VALIDATION
+# ─────────────────────────────────────────────────────────────────────────────
+def validate_distributed(n_seeds: int = 6, n_steps: int = 30, lattice_L: int = 40,
+                         n_workers: int = N_WORKERS) -> dict:
+    """
+    Same seeds through the single-process and the distributed model; prints
+    mean ± sd of final population, NCF, total metastatic events and wall time.
+    Only the distributions are comparable between the models. Every
+    distributed run is repeated, and RuntimeError is raised unless the
+    repeat reproduces its history and final counts exactly.
+    """
+    out = {}
+    for mode in ('single', 'distributed'):
+        pops, ncfs, metas, secs = [], [], [], []
+        for s in range(n_seeds):
+            t0 = time.perf_counter()
+            if mode == 'single':
+                sim = cm.TumorSimulation(L=lattice_L, seed=s)
+            else:
+                sim = DistributedTumorSimulation(L=lattice_L, seed=s, n_workers=n_workers)
+            sim.run(n_steps=n_steps, verbose=False)
+            secs.append(time.perf_counter() - t0)
+            if mode == 'distributed':
+                rep = DistributedTumorSimulation(L=lattice_L, seed=s, n_workers=n_workers)
+                rep.run(n_steps=n_steps, verbose=False)
+                if (rep.history != sim.history or rep.n_necrotic() != sim.n_necrotic()
+                        or rep.total_oxygen_consumed != sim.total_oxygen_consumed):
+                    raise RuntimeError(f"seed {s}: repeated distributed run differs "
+                                       f"({sim.n_cells()} vs {rep.n_cells()} cells)")
+            n = sim.n_cells()
+            pops.append(n)
+            ncfs.append(sim.n_necrotic() / n if n else 0.0)
+            metas.append(sum(sim.history['metastatic_cells']))
+        out[mode] = {k: (float(np.mean(v)), float(np.std(v)))
+                     for k, v in (('population', pops), ('ncf', ncfs),
+                                  ('metastatic', metas), ('seconds', secs))}
+
+    print(f"{'metric':>12} | {'single':>20} | {'distributed':>20}")
+    for k in out['single']:
+        a, d = out['single'][k], out['distributed'][k]
+        print(f"{k:>12} | {a[0]:11.4g} ± {a[1]:<6.3g} | {d[0]:11.4g} ± {d[1]:<6.3g}")
+    print(f"  distributed runs reproduced exactly on repeat ({n_seeds} seeds)")
+    return out
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  MAIN
+# ─────────────────────────────────────────────────────────────────────────────
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--L", type=int, default=cm.L)
+    parser.add_argument("--steps", type=int, default=cm.MAX_SIM_STEPS)
+    parser.add_argument("--workers", type=int, default=N_WORKERS)
+    parser.add_argument("--seed", type=int, default=cm.SEED)
+    parser.add_argument("--validate", type=int, metavar="N_SEEDS",
+                        help="compare against the single-process model on N_SEEDS seeds")
+    args = parser.parse_args()
+
+    if args.validate:
+        validate_distributed(args.validate, args.steps, args.L, args.workers)
+    else:
+        sim = DistributedTumorSimulation(L=args.L, seed=args.seed, n_workers=args.workers)
+        t0 = time.perf_counter()
+        sim.run(n_steps=args.steps, verbose=True)
+        print(f"\nFinal population       : {sim.n_cells()} cells "
+              f"({sim.n_necrotic()} necrotic)")
+        print(f"Total metastatic events: {sum(sim.history['metastatic_cells'])}")
+        print(f"Wall time              : {time.perf_counter() - t0:.1f}s "
+              f"on {args.workers} worker processes")
@@ -0,0 +1,287 @@
+"""
+lineage.py — array-backed lineage tracking for clonal analysis
+==============================================================
+Cells carry no identity: TumorSimulation keeps them in a list that
+_remove_cell reorders with swap-with-last. A LineageRecorder attached to a
+simulation gives every cell a stable int64 id, the row it occupies in a set
+of append-only columns. It records parent, birth and death steps, and flags
+for metastatic daughters and necrosis. Clonal questions (which founder
+lineages hold the rim, where metastatic events come from) then become
+vectorised lookups over those columns.
+
+Columns (one row per birth; id = row)
+-------------------------------------
+    parent      int64   — id of the dividing cell (−1 for founders)
+    birth       int32   — step in which the cell was placed (attach step for founders)
+    death       int32   — step in which it was removed (−1 while it is on the lattice)
+    site        int32   — flat lattice site (detachment site for metastatic daughters)
+    generation  uint16  — divisions since its founder
+    flags       uint8   — CONDENSING | METASTATIC | NECROTIC | CLEARED
+
+That is 23 bytes per birth. The columns grow by GROWTH, so at most about
+35 bytes are allocated per birth. A fixed int64 site → id map adds 8·L³
+bytes (0.5 MB at L=40). A metastatic event adds a row for the detached
+daughter: it never enters the lattice, so its death step equals its birth
+step, and its site is where the walk detached. Its phenotype is never
+drawn, so CONDENSING is unset.
+
+Usage
+-----
+    rec = LineageRecorder().attach(sim)      # cells already placed become founders
+    sim.run(40)
+    lin = rec.lineage()                      # trimmed columns + queries
+    lin.clone_sizes(lin.alive(), generation=3)
+    lin.metastatic_sources(generation=3)
+    lin.save("results/lineage.npz")          # columnar NPZ; Lineage.load() reads it
+
+    python lineage.py record --L 40 --steps 40 --out results/lineage.npz
+    python lineage.py show results/lineage.npz --generation 3
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+
+import numpy as np
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  CONFIGURATION
+# ─────────────────────────────────────────────────────────────────────────────
+LINEAGE_NPZ      = "results/lineage.npz"
+INITIAL_CAPACITY = 1024
+GROWTH           = 1.5       # column growth factor when full
+
+COLUMNS = (("parent", np.int64), ("birth", np.int32), ("death", np.int32),
+           ("site", np.int32), ("generation", np.uint16), ("flags", np.uint8))
+
+CONDENSING, METASTATIC, NECROTIC, CLEARED = 1, 2, 4, 8
+FLAG_NAMES = ("condensing", "metastatic", "necrotic", "cleared")
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  LINEAGE TABLE AND QUERIES
+# ─────────────────────────────────────────────────────────────────────────────
+class Lineage:
+    """
+    Read-only lineage columns (see COLUMNS) with vectorised ancestry queries.
+    Every query takes and returns int64 id arrays. Walking towards founders
+    costs one gather per generation, which is at most one per step.
+    """
+    def __init__(self, columns: dict, L: int):
+        self.L = L
+        for name, _ in COLUMNS:
+            setattr(self, name, columns[name])
+
+    def __len__(self) -> int:
+        return len(self.parent)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(getattr(self, name).nbytes for name, _ in COLUMNS)
+
+    def has(self, flag: int) -> np.ndarray:
+        return (self.flags & flag) != 0
+
+    def alive(self) -> np.ndarray:
+        """Ids of the cells on the lattice at the end of the record (living or necrotic)."""
+        return np.flatnonzero(self.death < 0)
+
+    def ancestors(self, i: int) -> np.ndarray:
+        """Lineage of cell i from i itself back to its founder."""
+        chain = [int(i)]
+        while self.parent[chain[-1]] >= 0:
+            chain.append(int(self.parent[chain[-1]]))
+        return np.array(chain, dtype=np.int64)
+
+    def ancestor_at(self, ids, generation: int) -> np.ndarray:
+        """Ancestor of each id at the given generation (−1 where the id is younger)."""
+        ids = np.asarray(ids, dtype=np.int64)
+        a = ids.copy()
+        step = self.generation[a] > generation
+        while step.any():
+            a[step] = self.parent[a[step]]
+            step[step] = self.generation[a[step]] > generation
+        a[self.generation[ids] < generation] = -1
+        return a
+
+    def founders(self, ids) -> np.ndarray:
+        return self.ancestor_at(ids, 0)
+
+    def descendants(self, i: int) -> np.ndarray:
+        """Every cell descended from i (i excluded), dead or alive."""
+        g = int(self.generation[i])
+        cand = np.flatnonzero((self.generation > g) & (self.birth >= self.birth[i]))
+        return cand[self.ancestor_at(cand, g) == i]
+
+    def is_ancestor(self, a: int, d: int) -> bool:
+        g = int(self.generation[a])
+        return self.generation[d] >= g and int(self.ancestor_at([d], g)[0]) == a
+
+    def clone_sizes(self, ids=None, generation: int = 0) -> tuple[np.ndarray, np.ndarray]:
+        """
+        (clade ids, member counts) of the clades rooted at the given generation
+        that contain ids (default: the cells on the lattice), largest first.
+        """
+        ids = self.alive() if ids is None else np.asarray(ids, dtype=np.int64)
+        roots = self.ancestor_at(ids, generation)
+        roots = roots[roots >= 0]
+        clades, counts = np.unique(roots, return_counts=True)
+        order = np.argsort(-counts, kind="stable")
+        return clades[order], counts[order]
+
+    def metastatic_sources(self, generation: int | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """
+        (ids, event counts) of the cells whose divisions produced metastatic
+        daughters, or of their clades at `generation` when given, most events first.
+        """
+        src = self.parent[self.has(METASTATIC)]
+        if generation is not None:
+            src = self.ancestor_at(src, generation)
+            src = src[src >= 0]
+        ids, counts = np.unique(src, return_counts=True)
+        order = np.argsort(-counts, kind="stable")
+        return ids[order], counts[order]
+
+    def surface_ids(self, sim) -> np.ndarray:
+        """Ids of the cells in sim with an empty 6-neighbour (sim must be the recorded run)."""
+        ids = self.alive()
+        s = self.site[ids].astype(np.int64)
+        L = self.L
+        x, y, z = s // (L * L), (s // L) % L, s % L
+        exposed = sim.n_occ6[x, y, z] < sim._capacity(x, y, z)[0]
+        return ids[exposed]
+
+    # ── Columnar file ────────────────────────────────────────────────────
+
+    def save(self, path: str = LINEAGE_NPZ):
+        """Write the columns (and L) as a compressed NPZ."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.savez_compressed(path, L=self.L, flag_names=np.array(FLAG_NAMES),
+                            **{name: getattr(self, name) for name, _ in COLUMNS})
+        print(f"  Lineage saved → {path}  ({len(self)} cells, {self.nbytes / 1e3:.1f} kB in memory)")
+
+    @classmethod
+    def load(cls, path: str = LINEAGE_NPZ) -> "Lineage":
+        with np.load(path) as z:
+            return cls({name: z[name] for name, _ in COLUMNS}, int(z["L"]))
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  RECORDER
+# ─────────────────────────────────────────────────────────────────────────────
+class LineageRecorder:
+    """
+    Birth / death sink for one simulation. attach(sim) registers the cells
+    already placed as founders and installs the recorder as sim.lineage.
+    TumorSimulation then calls birth() from _place_cell, removal() from
+    _remove_cell, necrosis() from _update_necrosis and metastasis() when a
+    walk detaches a daughter. lineage() returns the columns so far.
+    """
+    def __init__(self, capacity: int = INITIAL_CAPACITY):
+        self.n   = 0
+        self.sim = None
+        self._cols = {name: np.empty(capacity, dtype=dt) for name, dt in COLUMNS}
+
+    def _append(self, parent: int, site: int, flags: int, death: int = -1) -> int:
+        i = self.n
+        if i == len(self._cols["parent"]):
+            cap = int(i * GROWTH) + 1
+            for name, col in self._cols.items():
+                grown = np.empty(cap, dtype=col.dtype)
+                grown[:i] = col
+                self._cols[name] = grown
+        c = self._cols
+        c["parent"][i] = parent
+        c["birth"][i]  = self.sim.t
+        c["death"][i]  = death
+        c["site"][i]   = site
+        c["generation"][i] = c["generation"][parent] + 1 if parent >= 0 else 0
+        c["flags"][i]  = flags
+        self.n += 1
+        return i
+
+    # ── Hooks called by TumorSimulation ──────────────────────────────────
+
+    def birth(self, site: int, parent_site: int, condensing: bool):
+        parent = int(self._site_id[parent_site]) if parent_site >= 0 else -1
+        self._site_id[site] = self._append(parent, site, CONDENSING if condensing else 0)
+
+    def removal(self, site: int, cleared: bool):
+        i = self._site_id[site]
+        self._cols["death"][i] = self.sim.t
+        if cleared:
+            self._cols["flags"][i] |= CLEARED
+        self._site_id[site] = -1
+
+    def necrosis(self, site: int):
+        self._cols["flags"][self._site_id[site]] |= NECROTIC
+
+    def metastasis(self, parent_site: int, site: int):
+        self._append(int(self._site_id[parent_site]), site, METASTATIC, death=self.sim.t)
+
+    # ── Lifecycle ────────────────────────────────────────────────────────
+
+    def attach(self, sim) -> "LineageRecorder":
+        if sim.hybrid:
+            raise ValueError("lineage tracking needs hybrid=False (core voxels are not cells)")
+        self.sim = sim
+        self._site_id = np.full(sim.L ** 3, -1, dtype=np.int64)
+        for c in sim.cells:
+            site = sim._site(c.x, c.y, c.z)
+            flags = (CONDENSING if c.condensing else 0) | (NECROTIC if c.necrotic else 0)
+            self._site_id[site] = self._append(-1, site, flags)
+        sim.lineage = self
+        return self
+
+    def detach(self):
+        if self.sim is not None:
+            self.sim.lineage = None
+
+    def ids_at(self, sites) -> np.ndarray:
+        """Ids of the cells now at the given flat sites (−1 where empty)."""
+        return self._site_id[np.asarray(sites, dtype=np.int64)]
+
+    def lineage(self) -> Lineage:
+        """The columns recorded so far as a Lineage (views, valid until the next birth)."""
+        return Lineage({name: col[:self.n] for name, col in self._cols.items()}, self.sim.L)
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  MAIN
+# ─────────────────────────────────────────────────────────────────────────────
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    rec = sub.add_parser("record", help="run one simulation with lineage tracking")
+    rec.add_argument("--L", type=int, default=None)
+    rec.add_argument("--steps", type=int, default=None)
+    rec.add_argument("--seed", type=int, default=None)
+    rec.add_argument("--out", default=LINEAGE_NPZ)
+    show = sub.add_parser("show", help="clone sizes and metastatic sources of a saved lineage")
+    show.add_argument("path", nargs="?", default=LINEAGE_NPZ)
+    show.add_argument("--generation", type=int, default=3, help="clade root generation")
+    show.add_argument("--top", type=int, default=8)
+    args = parser.parse_args()
+
+    if args.cmd == "record":
+        import Cancer_Metastasis as cm
+        sim = cm.TumorSimulation(L=args.L or cm.L, seed=cm.SEED if args.seed is None else args.seed)
+        recorder = LineageRecorder().attach(sim)
+        sim.run(n_steps=args.steps or cm.MAX_SIM_STEPS, verbose=True)
+        lin = recorder.lineage()
+        print(f"\n{len(lin)} births, {len(lin.alive())} on the lattice, "
+              f"{int(lin.has(METASTATIC).sum())} metastatic daughters, "
+              f"{lin.nbytes / max(len(lin), 1):.0f} B per birth")
+        lin.save(args.out)
+    else:
+        lin = Lineage.load(args.path)
+        g = args.generation
+        alive = lin.alive()
+        print(f"{len(lin)} births, {len(alive)} on the lattice, max generation {int(lin.generation.max())}")
+        clades, counts = lin.clone_sizes(alive, g)
+        print(f"clades rooted at generation {g}: {len(clades)}")
+        for c, n in zip(clades[:args.top], counts[:args.top]):
+            print(f"  clade {c:7d} (born t={lin.birth[c]:3d}) | {n:6d} cells ({100 * n / len(alive):5.1f} %)")
+        src, n_ev = lin.metastatic_sources(g)
+        print(f"metastatic events by clade: {int(n_ev.sum())} from {len(src)} clades")
+        for c, n in zip(src[:args.top], n_ev[:args.top]):
+            print(f"  clade {c:7d} | {n:5d} events")
@@ -0,0 +1,352 @@
+"""
+morphology.py — FFT pair correlation, structure factor and box-counting dimensions
+==================================================================================
+Morphology descriptors of the occupancy and necrotic lattices, used to tell
+tumour shapes apart beyond the four scalar objectives. Each descriptor is a
+whole-lattice FFT or reshape, so the cost is O(L³ log L) however many cells
+there are. Summing over all cell pairs would be O(n²), about 1.5·10⁹ pairs
+for a 54k-cell tumour.
+
+Descriptors
+-----------
+    autocorrelation   — A(v) = #{x : m(x) = m(x+v) = 1} for every lag v, from
+                        one zero-padded rfftn (no periodic wrap-around)
+    pair_correlation  — g(r) = Σ_|v|≈r A(v) / (Σ_|v|≈r W(v) · ρ²), where W is
+                        the lattice window's own autocorrelation, so pairs that
+                        cross the lattice edge are corrected for
+    covariogram       — C(r) = shell mean of A(v) / N (C(0) = 1). The
+                        correlation length ξ is the first r with C(r) < 1/e
+    structure_factor  — S(k) = |FFT(m − ρ)|² / N averaged over shells of |k|.
+                        The Porod slope d log S / d log k over the mid range is
+                        about −4 for a smooth compact surface and flatter for a
+                        rough or fragmented one
+    box_counting      — occupied boxes N(s) for s = 1, 2, 4, … up to 1/8 of
+                        the mask's extent, counted by reshaping the lattice
+                        into s³ blocks. D = −slope of log N(s) against log s.
+                        On tumour-sized objects the boundary biases D (a
+                        solid ball of radius 20 gives 2.8 and its shell 1.8),
+                        so compare D across runs at the same L, not to 3 or 2
+
+morphology_metrics(state) turns one lattice into the scalar METRIC_COLUMNS.
+Its state argument is any dict with boolean (L,L,L) 'occupied' and
+'necrotic' masks, such as batch_sweep.load_final_state(). It is a
+module-level function, so batch_sweep.recompute_objectives can run it over
+every archived run on a process pool.
+
+Usage
+-----
+    # Append morph_* columns to run_summary.csv from the final-state archive:
+    python morphology.py annotate run_summary.csv --archive final_states.bin
+
+    # Metrics per recorded step of a snapshot store or trajectory log:
+    python morphology.py series results/run_store
+    python morphology.py series results/trajectory --every 5
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import functools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  CONFIGURATION
+# ─────────────────────────────────────────────────────────────────────────────
+SUMM_CSV      = "run_summary.csv"
+ARCHIVE_BIN   = "final_states.bin"
+SERIES_CSV    = "morphology_series.csv"
+MIN_CELLS     = 8               # fewer occupied sites → the mask's metrics are NaN
+XI_LEVEL      = np.exp(-1.0)    # correlation length: first r with C(r) < 1/e
+POROD_RANGE   = (2, 0.25)       # S(k) slope fitted for |n| from 2 to L/4 (n = kL/2π)
+BOX_FRACTION  = 1 / 8           # largest box side, as a fraction of the mask's extent
+COLUMN_PREFIX = "morph_"
+METRIC_COLUMNS = [COLUMN_PREFIX + c for c in
+                  ("rg", "xi", "d_box", "d_surface", "porod", "xi_necrotic", "d_necrotic")]
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  FFT DESCRIPTORS
+# ─────────────────────────────────────────────────────────────────────────────
+@functools.lru_cache(maxsize=8)
+def _shells(shape: tuple) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Rounded |v| of every index of an FFT grid (signed integer lags or
+    wavenumbers, numpy fftfreq order) and the number of indices per shell.
+    """
+    axes = [np.fft.fftfreq(n, 1.0 / n) for n in shape]
+    r2 = (axes[0][:, None, None] ** 2 + axes[1][None, :, None] ** 2
+          + axes[2][None, None, :] ** 2)
+    bins = np.rint(np.sqrt(r2)).astype(np.intp).reshape(-1)
+    bins.setflags(write=False)
+    return bins, np.bincount(bins)
+
+@functools.lru_cache(maxsize=8)
+def _window_autocorrelation(shape: tuple) -> np.ndarray:
+    """W(v) = Π (n_i − |v_i|): lattice site pairs at lag v, on the padded lag grid."""
+    w = [np.maximum(n - np.abs(np.fft.fftfreq(2 * n, 1.0 / (2 * n))), 0) for n in shape]
+    W = (w[0][:, None, None] * w[1][None, :, None] * w[2][None, None, :]).reshape(-1)
+    W.setflags(write=False)
+    return W
+
+def autocorrelation(mask: np.ndarray) -> np.ndarray:
+    """
+    A(v) for every lag v with |v_i| < n_i, as a (2n₀, 2n₁, 2n₂) array in
+    fftfreq order (A[0,0,0] = number of occupied sites). Zero padding to twice
+    the lattice removes the periodic wrap-around.
+    """
+    s = tuple(2 * n for n in mask.shape)
+    F = np.fft.rfftn(mask.astype(np.float64), s, axes=(0, 1, 2))
+    return np.rint(np.fft.irfftn(F.real ** 2 + F.imag ** 2, s, axes=(0, 1, 2)))
+
+def pair_correlation(mask: np.ndarray, A: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray]:
+    """(r, g(r)) for r = 1, 2, …: edge-corrected pair correlation of the occupied sites."""
+    A = autocorrelation(mask) if A is None else A
+    N = float(A.flat[0])
+    bins, _ = _shells(A.shape)
+    pairs = np.bincount(bins, weights=A.reshape(-1))
+    pairs[0] -= N                                          # no self-pairs
+    window = np.bincount(bins, weights=_window_autocorrelation(mask.shape))
+    rho = N / mask.size
+    g = np.zeros(len(pairs))
+    np.divide(pairs, window * rho ** 2, out=g, where=(window > 0) & (rho > 0))
+    return np.arange(1, len(g)), g[1:]
+
+def covariogram(mask: np.ndarray, A: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray]:
+    """(r, C(r)) for r = 0, 1, …: probability that the site at lag |v| ≈ r is also occupied."""
+    A = autocorrelation(mask) if A is None else A
+    N = float(A.flat[0])
+    bins, n_lags = _shells(A.shape)
+    C = np.bincount(bins, weights=A.reshape(-1)) / (n_lags * max(N, 1.0))
+    return np.arange(len(C)), C
+
+def correlation_length(mask: np.ndarray, A: np.ndarray | None = None,
+                       level: float = XI_LEVEL) -> float:
+    """First r at which C(r) drops below level, linearly interpolated."""
+    r, C = covariogram(mask, A)
+    below = np.flatnonzero(C < level)
+    if len(below) == 0 or below[0] == 0:
+        return float('nan')
+    i = below[0]
+    return float(r[i - 1] + (C[i - 1] - level) / (C[i - 1] - C[i]))
+
+def structure_factor(mask: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """(k, S(k)) for |n| = 0, 1, …, k = 2π|n|/L: shell-averaged S = |FFT(m − ρ)|² / N."""
+    m = mask.astype(np.float64)
+    N = m.sum()
+    F = np.fft.fftn(m - N / m.size)
+    bins, n_modes = _shells(mask.shape)
+    S = np.bincount(bins, weights=(F.real ** 2 + F.imag ** 2).reshape(-1)) / (n_modes * max(N, 1.0))
+    return 2 * np.pi * np.arange(len(S)) / mask.shape[0], S
+
+def porod_slope(mask: np.ndarray, n_range: tuple = POROD_RANGE) -> float:
+    """Least-squares slope of log S against log k for |n| in [n_lo, n_hi·L]."""
+    k, S = structure_factor(mask)
+    n = np.arange(len(S))
+    sel = (n >= n_range[0]) & (n <= n_range[1] * mask.shape[0]) & (S > 0)
+    if sel.sum() < 3:
+        return float('nan')
+    return float(np.polyfit(np.log(k[sel]), np.log(S[sel]), 1)[0])
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  BOX COUNTING AND SHAPE
+# ─────────────────────────────────────────────────────────────────────────────
+def box_counts(mask: np.ndarray, sizes=None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    (s, N(s)): boxes of side s containing an occupied site. By default
+    s = 1, 2, 4, … up to BOX_FRACTION of the mask's bounding-box side (at
+    least 2). The lattice is zero-padded to a multiple of s and reshaped into
+    (n/s, s, n/s, s, n/s, s) blocks.
+    """
+    if sizes is None:
+        nz = [np.flatnonzero(mask.any(axis=tuple(b for b in range(3) if b != a))) for a in range(3)]
+        extent = max((v[-1] - v[0] + 1 for v in nz if len(v)), default=1)
+        sizes = 2 ** np.arange(int(np.log2(max(extent * BOX_FRACTION, 2))) + 1)
+    counts = []
+    for s in sizes:
+        pad = [(0, -n % s) for n in mask.shape]
+        m = np.pad(mask, pad) if any(p for _, p in pad) else mask
+        a, b, c = (n // s for n in m.shape)
+        counts.append(int(m.reshape(a, s, b, s, c, s).any(axis=(1, 3, 5)).sum()))
+    return np.asarray(sizes), np.asarray(counts)
+
+def box_dimension(mask: np.ndarray, sizes=None) -> float:
+    """Box-counting dimension: −slope of log N(s) against log s."""
+    s, n = box_counts(mask, sizes)
+    if len(s) < 2 or n[0] < MIN_CELLS:
+        return float('nan')
+    return float(-np.polyfit(np.log(s), np.log(n), 1)[0])
+
+def surface(mask: np.ndarray) -> np.ndarray:
+    """Occupied sites with at least one empty (or off-lattice) 6-neighbour."""
+    p = np.pad(mask, 1)
+    inner = (p[2:, 1:-1, 1:-1] & p[:-2, 1:-1, 1:-1] & p[1:-1, 2:, 1:-1]
+             & p[1:-1, :-2, 1:-1] & p[1:-1, 1:-1, 2:] & p[1:-1, 1:-1, :-2])
+    return mask & ~inner
+
+def radius_of_gyration(mask: np.ndarray) -> float:
+    """RMS distance of the occupied sites from their centroid."""
+    p = np.stack(np.nonzero(mask)).astype(np.float64)
+    if p.shape[1] == 0:
+        return float('nan')
+    return float(np.sqrt(p.var(axis=1).sum()))
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  PER-STATE METRICS
+# ─────────────────────────────────────────────────────────────────────────────
+def morphology_metrics(state: dict) -> dict:
+    """
+    METRIC_COLUMNS for one lattice state (boolean 'occupied' and 'necrotic'):
+        morph_rg          — radius of gyration of the occupied sites
+        morph_xi          — correlation length of the occupancy
+        morph_d_box       — box-counting dimension of the occupancy
+        morph_d_surface   — box-counting dimension of its 6-connected surface
+        morph_porod       — S(k) slope of the occupancy (≈ −4 smooth, flatter rough)
+        morph_xi_necrotic — correlation length of the necrotic sites
+        morph_d_necrotic  — box-counting dimension of the necrotic sites
+    A mask with fewer than MIN_CELLS sites gives NaN for its metrics.
+    """
+    occ, nec = np.asarray(state['occupied'], bool), np.asarray(state['necrotic'], bool)
+    nan = float('nan')
+    out = dict.fromkeys(METRIC_COLUMNS, nan)
+    if occ.sum() >= MIN_CELLS:
+        out.update(morph_rg=radius_of_gyration(occ), morph_xi=correlation_length(occ),
+                   morph_d_box=box_dimension(occ), morph_d_surface=box_dimension(surface(occ)),
+                   morph_porod=porod_slope(occ))
+    if nec.sum() >= MIN_CELLS:
+        out.update(morph_xi_necrotic=correlation_length(nec), morph_d_necrotic=box_dimension(nec))
+    return {k: (round(v, 6) if np.isfinite(v) else nan) for k, v in out.items()}
+
+def state_from_snapshot(snap: dict, L: int) -> dict:
+    """
+    Masks from a snapshot_store chunk or load_snapshot() columns (positions
+    are lattice indices). Chunks recorded with max_cells hold a sample of the
+    cells only.
+    """
+    from Cancer_Metastasis import PHENOTYPES
+    x, y, z = (np.asarray(snap[k], np.int64) for k in ('x', 'y', 'z'))
+    occ = np.zeros((L, L, L), dtype=bool)
+    nec = np.zeros((L, L, L), dtype=bool)
+    occ[x, y, z] = True
+    is_nec = np.asarray(snap['phenotype']) == PHENOTYPES.index('necrotic')
+    nec[x[is_nec], y[is_nec], z[is_nec]] = True
+    return dict(occupied=occ, necrotic=nec)
+
+def state_from_codes(codes: np.ndarray) -> dict:
+    """Masks from a trajectory_log state-code lattice (0 empty, 1–2 living, 3–4 necrotic)."""
+    return dict(occupied=codes > 0, necrotic=codes >= 3)
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  BATCHES: ARCHIVED RUNS AND RECORDED SERIES
+# ─────────────────────────────────────────────────────────────────────────────
+def annotate_summary(summ_path: str = SUMM_CSV, archive_path: str = ARCHIVE_BIN,
+                     out_path: str | None = None, max_workers: int | None = None) -> int:
+    """
+    Compute morphology_metrics for every archived run (batch_sweep's process
+    pool) and write summ_path with METRIC_COLUMNS appended (replacing any
+    earlier morph_* columns) to out_path, by default summ_path itself. Runs
+    without an archived state, e.g. timeouts, get empty cells. Returns the
+    number of rows that received metrics.
+    """
+    import batch_sweep as bs
+    metrics = bs.recompute_objectives(morphology_metrics, archive_path, max_workers)
+    key = lambda r: (float(r['alpha']), float(r['beta']), float(r['gamma']),
+                     int(float(r['n_a'])), int(float(r['run_id'])))
+    by_run = {key(r): r for r in metrics}
+
+    with open(summ_path, newline='') as f:
+        reader = csv.DictReader(f)
+        fields = [c for c in reader.fieldnames if not c.startswith(COLUMN_PREFIX)]
+        rows = list(reader)
+    n_hit = 0
+    for row in rows:
+        m = by_run.get(key(row))
+        n_hit += m is not None
+        for c in METRIC_COLUMNS:
+            row[c] = '' if m is None or not np.isfinite(m[c]) else m[c]
+
+    out_path = out_path or summ_path
+    tmp = out_path + ".tmp"
+    with open(tmp, 'w', newline='') as f:
+        w = csv.DictWriter(f, fieldnames=fields + METRIC_COLUMNS, extrasaction='ignore')
+        w.writeheader()
+        w.writerows(rows)
+    os.replace(tmp, out_path)
+    print(f"  {n_hit}/{len(rows)} runs annotated → {out_path}")
+    return n_hit
+
+def _series_chunk(path: str, steps: list[int]) -> list[dict]:
+    if os.path.exists(os.path.join(path, "events.bin")):
+        from trajectory_log import TrajectoryReplay
+        replay = TrajectoryReplay(path)
+        states = ((t, state_from_codes(replay.lattice(t))) for t in steps)
+    else:
+        from snapshot_store import SnapshotStore
+        store = SnapshotStore(path)
+        states = ((t, state_from_snapshot(store.read(t, keys=('x', 'y', 'z', 'phenotype')),
+                                          store.meta['L'])) for t in steps)
+    return [dict(step=t, n_cells=int(s['occupied'].sum()), n_necrotic=int(s['necrotic'].sum()),
+                 **morphology_metrics(s)) for t, s in states]
+
+def series_metrics(path: str, every: int = 1, max_workers: int | None = None,
+                   out_path: str | None = SERIES_CSV) -> list[dict]:
+    """
+    morphology_metrics at the recorded steps of a snapshot store (every
+    chunk) or a trajectory log (every `every`-th step), computed in parallel
+    in interleaved chunks of steps. Rows are written to out_path if given.
+    """
+    if os.path.exists(os.path.join(path, "events.bin")):
+        from trajectory_log import TrajectoryReplay
+        steps = list(TrajectoryReplay(path).steps)[::every]
+    else:
+        from snapshot_store import SnapshotStore
+        store = SnapshotStore(path)
+        if store.meta.get('max_cells') is not None:
+            print(f"  warning: {path} was recorded with max_cells={store.meta['max_cells']}; "
+                  "metrics describe the sampled cells")
+        steps = store.steps
+    n_workers = max(1, min(max_workers or os.cpu_count() or 1, len(steps)))
+    chunks = [steps[i::n_workers] for i in range(n_workers)]
+    rows: list[dict] = []
+    with ProcessPoolExecutor(max_workers=n_workers) as pool:
+        for part in pool.map(_series_chunk, [path] * len(chunks), chunks):
+            rows.extend(part)
+    rows.sort(key=lambda r: r['step'])
+    if out_path and rows:
+        with open(out_path, 'w', newline='') as f:
+            w = csv.DictWriter(f, fieldnames=list(rows[0]))
+            w.writeheader()
+            w.writerows(rows)
+        print(f"  → {out_path}  ({len(rows)} steps)")
+    return rows
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  MAIN
+# ─────────────────────────────────────────────────────────────────────────────
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--workers", type=int, default=None, help="process pool size")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p_ann = sub.add_parser("annotate", help="append morph_* columns to a run summary")
+    p_ann.add_argument("summary", nargs="?", default=SUMM_CSV)
+    p_ann.add_argument("--archive", default=ARCHIVE_BIN)
+    p_ann.add_argument("--out", default=None, help="output CSV (default: overwrite summary)")
+    p_ser = sub.add_parser("series", help="metrics per step of a snapshot store or trajectory log")
+    p_ser.add_argument("path")
+    p_ser.add_argument("--every", type=int, default=1, help="trajectory step stride")
+    p_ser.add_argument("--out", default=SERIES_CSV)
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    if args.cmd == "annotate":
+        annotate_summary(args.summary, args.archive, args.out, args.workers)
+    else:
+        for row in series_metrics(args.path, args.every, args.workers, args.out):
+            print(f"  t={row['step']:4d} | N={row['n_cells']:7d} | ξ={row['morph_xi']:6.2f} | "
+                  f"D_box={row['morph_d_box']:.3f} | D_surf={row['morph_d_surface']:.3f} | "
+                  f"Porod={row['morph_porod']:6.2f}")
+    print(f"  ({time.perf_counter() - t0:.1f}s)")
@@ -0,0 +1,276 @@
+"""
+snapshot_store.py — in-run snapshots streamed to a chunked on-disk store
+========================================================================
+Records the tumour while it grows instead of only at the end. At scheduled
+steps the cell columns (TumorSimulation.cell_snapshot) and the oxygen / phi
+fields are copied and queued, and a background thread encodes and writes
+them. The step loop only pays for the copies.
+
+Store layout
+------------
+A directory with one compressed NPZ chunk per recorded step:
+
+    meta.json            — L, fields, codec, schedule
+    index.jsonl          — one line per chunk: step, file, reasons, n_cells
+    step_000012.npz      — cell columns + encoded fields for t = 12
+                           (fields stored as field_<name>, since the cell
+                           columns already have a per-cell 'oxygen')
+
+The index is appended as each chunk lands, so a store can be read while the
+run is still writing it, and a crashed run keeps every finished chunk.
+
+Field codecs
+------------
+    float32   — plain single precision
+    float16   — half precision (~3 significant digits; O_HYPOXIA needs 2)
+    q16 / q8  — linear quantisation to uint16 / uint8 between the chunk's
+                min and max (stored alongside); q8 resolves 1/255 of the range
+
+Usage
+-----
+    with SnapshotWriter("results/run_store", every=5) as snaps:
+        sim.run(n_steps=40, snapshots=snaps)
+    store = SnapshotStore("results/run_store")
+    store.field(20, "oxygen")          # one chunk, nothing else is loaded
+
+    python snapshot_store.py record --L 60 --steps 40 --every 5 --codec float16
+    python snapshot_store.py show results/run_store --step 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import queue
+import threading
+
+import numpy as np
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  CONFIGURATION
+# ─────────────────────────────────────────────────────────────────────────────
+STORE_DIR    = "results/run_store"
+EVERY        = 5                                   # record every k steps (0 = events only)
+EVENTS       = ("angiogenic_switch", "extinct", "final")
+FIELDS       = ("oxygen", "phi")
+CODEC        = "float16"
+CODECS       = ("float32", "float16", "q16", "q8")
+QUEUE_DEPTH  = 4        # snapshots buffered for the writer before step() blocks
+FIELD_PREFIX = "field_"
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  FIELD CODECS
+# ─────────────────────────────────────────────────────────────────────────────
+def encode_field(a: np.ndarray, codec: str) -> dict:
+    """Arrays to store for field a under codec (keys are suffixes of the field name)."""
+    if codec in ("float32", "float16"):
+        return {"": a.astype(codec)}
+    levels = {"q16": 65535, "q8": 255}[codec]
+    lo, hi = float(a.min()), float(a.max())
+    scale  = (hi - lo) / levels if hi > lo else 1.0
+    q = np.rint((a - lo) / scale).astype(np.uint16 if codec == "q16" else np.uint8)
+    return {"": q, "_lo": np.float64(lo), "_scale": np.float64(scale)}
+
+def decode_field(z, name: str, codec: str) -> np.ndarray:
+    """Inverse of encode_field, as float32."""
+    a = z[name]
+    if codec in ("float32", "float16"):
+        return a.astype(np.float32)
+    return (a * z[name + "_scale"] + z[name + "_lo"]).astype(np.float32)
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  WRITER
+# ─────────────────────────────────────────────────────────────────────────────
+class SnapshotWriter:
+    """
+    Snapshot schedule plus background writer; pass to TumorSimulation.run
+    as snapshots=. A step is recorded when t is a multiple of every, or when
+    one of events fires:
+        angiogenic_switch — the step in which the switch turned on
+        extinct           — the first step that ends with no cells
+        final             — the last step of the run() call
+    max_cells applies cell_snapshot's stratified downsampling (None = all).
+    Call close() (or use it as a context manager) to flush the queue.
+    """
+    def __init__(self, path: str = STORE_DIR, every: int = EVERY, events=EVENTS,
+                 fields=FIELDS, codec: str = CODEC, max_cells: int | None = None):
+        if codec not in CODECS:
+            raise ValueError(f"codec must be one of {CODECS}, got {codec!r}")
+        unknown = set(events) - set(EVENTS)
+        if unknown:
+            raise ValueError(f"unknown snapshot events {sorted(unknown)}; known: {EVENTS}")
+        self.path, self.every, self.events = path, every, tuple(events)
+        self.fields, self.codec, self.max_cells = tuple(fields), codec, max_cells
+        self._angio   = False
+        self._extinct = False
+        self._meta_written = False
+        self._error   = None
+        self._queue   = queue.Queue(maxsize=QUEUE_DEPTH)
+        os.makedirs(path, exist_ok=True)
+        self._thread  = threading.Thread(target=self._drain, daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ── Foreground: schedule and capture ─────────────────────────────────
+
+    def _reasons(self, sim, final: bool) -> list[str]:
+        reasons = []
+        if self.every and sim.t % self.every == 0:
+            reasons.append("every")
+        if "angiogenic_switch" in self.events and sim.angiogenic_on and not self._angio:
+            reasons.append("angiogenic_switch")
+        if "extinct" in self.events and sim.n_cells() == 0 and not self._extinct:
+            reasons.append("extinct")
+            self._extinct = True
+        if "final" in self.events and final:
+            reasons.append("final")
+        self._angio = sim.angiogenic_on
+        return reasons
+
+    def observe(self, sim, final: bool = False):
+        """Called by run() after every step; queues a snapshot when one is due."""
+        if self._error is not None:
+            raise RuntimeError("snapshot writer failed") from self._error
+        if not self._meta_written:
+            self._write_meta(sim)
+        reasons = self._reasons(sim, final)
+        if not reasons:
+            return
+        snap = sim.cell_snapshot(self.max_cells)
+        # Fields change in place every step, so the writer gets copies
+        fields = {name: np.array(getattr(sim, name)) for name in self.fields}
+        self._queue.put((sim.t, reasons, snap, fields))
+
+    def _write_meta(self, sim):
+        meta = dict(L=sim.L, fields=list(self.fields), codec=self.codec, every=self.every,
+                    events=list(self.events), max_cells=self.max_cells)
+        with open(os.path.join(self.path, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=1)
+        self._meta_written = True
+
+    # ── Background: encode and write ─────────────────────────────────────
+
+    def _drain(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            try:
+                self._write_chunk(*item)
+            except BaseException as exc:      # surfaced on the next observe() / close()
+                self._error = exc
+
+    def _write_chunk(self, t, reasons, snap, fields):
+        arrays = dict(snap)
+        for name, a in fields.items():
+            for suffix, v in encode_field(a, self.codec).items():
+                arrays[FIELD_PREFIX + name + suffix] = v
+        fname = f"step_{t:06d}.npz"
+        np.savez_compressed(os.path.join(self.path, fname), **arrays)
+        with open(os.path.join(self.path, "index.jsonl"), "a") as f:
+            f.write(json.dumps(dict(step=t, file=fname, reasons=reasons,
+                                    n_cells=int(snap["n_total"]))) + "\n")
+
+    def close(self):
+        """Flush every queued snapshot and stop the writer thread."""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        if self._error is not None:
+            raise RuntimeError("snapshot writer failed") from self._error
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  READER
+# ─────────────────────────────────────────────────────────────────────────────
+class SnapshotStore:
+    """Random access to a store written by SnapshotWriter; read(t) opens one chunk only."""
+    def __init__(self, path: str = STORE_DIR):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.index = {}
+        index_path = os.path.join(path, "index.jsonl")
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                for line in f:
+                    row = json.loads(line)
+                    self.index[row["step"]] = row
+
+    @property
+    def steps(self) -> list[int]:
+        return sorted(self.index)
+
+    def steps_for(self, reason: str) -> list[int]:
+        """Recorded steps that fired for reason ('every' or one of EVENTS)."""
+        return [t for t in self.steps if reason in self.index[t]["reasons"]]
+
+    def read(self, t: int, keys=None) -> dict:
+        """
+        Chunk for step t as a dict: cell columns, scalars and the decoded
+        fields (float32, as field_<name>). keys restricts what is loaded,
+        e.g. keys=("x", "y", "z", "field_oxygen").
+        """
+        if t not in self.index:
+            raise KeyError(f"step {t} not in store (recorded: {self.steps})")
+        fields = [FIELD_PREFIX + name for name in self.meta["fields"]]
+        out = {}
+        with np.load(os.path.join(self.path, self.index[t]["file"])) as z:
+            names = [k for k in z.files if not k.startswith(FIELD_PREFIX)] + fields
+            for k in names if keys is None else keys:
+                if k in fields:
+                    out[k] = decode_field(z, k, self.meta["codec"])
+                else:
+                    out[k] = z[k].item() if z[k].ndim == 0 else z[k]
+        return out
+
+    def field(self, t: int, name: str = "oxygen") -> np.ndarray:
+        """One decoded field (float32) at step t."""
+        return self.read(t, keys=(FIELD_PREFIX + name,))[FIELD_PREFIX + name]
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  MAIN
+# ─────────────────────────────────────────────────────────────────────────────
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    rec = sub.add_parser("record", help="run one simulation and stream snapshots")
+    rec.add_argument("--L", type=int, default=None)
+    rec.add_argument("--steps", type=int, default=None)
+    rec.add_argument("--seed", type=int, default=None)
+    rec.add_argument("--every", type=int, default=EVERY)
+    rec.add_argument("--codec", choices=CODECS, default=CODEC)
+    rec.add_argument("--out", default=STORE_DIR)
+    show = sub.add_parser("show", help="list a store, or summarise one step")
+    show.add_argument("path", nargs="?", default=STORE_DIR)
+    show.add_argument("--step", type=int)
+    args = parser.parse_args()
+
+    if args.cmd == "record":
+        import time
+        import Cancer_Metastasis as cm
+        sim = cm.TumorSimulation(L=args.L or cm.L, seed=cm.SEED if args.seed is None else args.seed)
+        t0 = time.perf_counter()
+        with SnapshotWriter(args.out, every=args.every, codec=args.codec) as snaps:
+            sim.run(n_steps=args.steps or cm.MAX_SIM_STEPS, verbose=True, snapshots=snaps)
+        print(f"\n{len(SnapshotStore(args.out).steps)} snapshots → {args.out}  "
+              f"({time.perf_counter() - t0:.1f}s)")
+    else:
+        store = SnapshotStore(args.path)
+        if args.step is None:
+            print(f"L={store.meta['L']}  codec={store.meta['codec']}  fields={store.meta['fields']}")
+            for t in store.steps:
+                row = store.index[t]
+                print(f"  t={t:4d} | N={row['n_cells']:7d} | {', '.join(row['reasons'])}")
+        else:
+            snap = store.read(args.step)
+            print(f"t={snap['sim_time']}  cells={snap['n_total']} (stored {len(snap['x'])})")
+            for name in store.meta["fields"]:
+                a = snap[FIELD_PREFIX + name]
+                print(f"  {name:7s} min={a.min():.4g}  mean={a.mean():.4g}  max={a.max():.4g}")
@@ -0,0 +1,363 @@
+"""
+surrogate.py — Gaussian-process emulator of the four Pareto objectives
+=======================================================================
+Trains a surrogate on every stored run_summary.csv and predicts FITNESS, MEI,
+NCF and DISSIPATION for arbitrary (α, β, γ, N_A) without running the
+simulation.
+
+Model
+-----
+Runs are aggregated per (α,β,γ,N_A) combination. For each objective two
+Gaussian processes are fitted on the features (α, β, γ, log N_A):
+
+    mean model    — combo mean of the objective; the per-combo standard
+                    error enters as heteroscedastic observation noise, so the
+                    predictive std is the uncertainty of the *mean*.
+    spread model  — log of the combo's run-to-run standard deviation, i.e.
+                    the stochastic spread a single run would show.
+
+Predictions are batched (one call for any number of points) and cost tens of
+microseconds per point. The fitted surrogate is pickled to MODEL_PATH.
+
+Sweeps written before γ and N_A were swept lack those columns; their runs are
+assigned the Cancer_Metastasis.py defaults they were run with (LEGACY_GAMMA,
+LEGACY_N_A).
+
+Usage
+-----
+    python surrogate.py train                       # fit on results/*/run_summary.csv
+    python surrogate.py predict 0.35 0.65 0.05 750  # objectives ± uncertainty
+    python surrogate.py pareto --n 15               # Pareto front on a dense grid
+    python surrogate.py refine --rel-tol 0.2        # simulate where uncertainty is high
+"""
+
+from __future__ import annotations
+
+import argparse
+import glob
+import os
+import pathlib
+import pickle
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+from sklearn.gaussian_process import GaussianProcessRegressor
+from sklearn.gaussian_process.kernels import ConstantKernel, RBF, WhiteKernel
+from sklearn.preprocessing import StandardScaler
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  CONFIGURATION
+# ─────────────────────────────────────────────────────────────────────────────
+SUMMARY_GLOB = "results/*/run_summary.csv"
+MODEL_PATH   = "results/surrogate.pkl"
+REFINE_DIR   = "results/surrogate_refine"   # refinement runs; matched by SUMMARY_GLOB
+
+LEGACY_GAMMA = 0.1    # GAMMA default used by sweeps without a gamma column
+LEGACY_N_A   = 500    # N_A default used by sweeps without an n_a column
+
+PARAMS     = ["alpha", "beta", "gamma", "n_a"]
+OBJECTIVES = ["fitness", "mei", "ncf", "dissipation"]
+DIRECTIONS = {"fitness": +1, "mei": -1, "ncf": -1, "dissipation": -1}   # +1 = maximise
+
+N_RESTARTS = 2        # optimizer restarts per GP fit
+REL_TOL    = 0.2      # refine where surrogate std / spread exceeds this
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  DATA LOADING
+# ─────────────────────────────────────────────────────────────────────────────
+def load_runs(*patterns: str) -> pd.DataFrame:
+    """Concatenate every run_summary.csv matching the patterns (default SUMMARY_GLOB),
+    dropping runs that did not finish (timed out or memory-capped)."""
+    paths = sorted({os.path.normpath(p) for pat in (patterns or (SUMMARY_GLOB,))
+                    for p in glob.glob(pat)})
+    frames = []
+    for path in paths:
+        df = pd.read_csv(path)
+        if "gamma" not in df.columns:
+            df["gamma"] = LEGACY_GAMMA
+        if "n_a" not in df.columns:
+            df["n_a"] = LEGACY_N_A
+        df["source"] = path
+        frames.append(df)
+    if not frames:
+        raise FileNotFoundError(f"No run summaries match {patterns or SUMMARY_GLOB!r}")
+    runs = pd.concat(frames, ignore_index=True)
+    runs = runs[~runs["status"].isin(("timeout", "memory_capped"))].dropna(subset=OBJECTIVES)
+    print(f"  Loaded {len(runs):,} runs from {len(frames)} summaries")
+    return runs
+
+def aggregate(runs: pd.DataFrame) -> pd.DataFrame:
+    """Per-combo mean, std and count of every objective."""
+    g = runs.groupby(PARAMS)[OBJECTIVES]
+    agg = g.mean().add_prefix("mean_").join(g.std(ddof=1).fillna(0.0).add_prefix("std_"))
+    agg["n_runs"] = g.size()
+    return agg.reset_index()
+
+def _features(X) -> np.ndarray:
+    """(α, β, γ, N_A) → (α, β, γ, log N_A)."""
+    X = np.asarray(X, dtype=float).reshape(-1, len(PARAMS))
+    return np.column_stack([X[:, :3], np.log(X[:, 3])])
+
+def _as_points(X) -> np.ndarray:
+    if isinstance(X, pd.DataFrame):
+        X = X[PARAMS].to_numpy(dtype=float)
+    return np.asarray(X, dtype=float).reshape(-1, len(PARAMS))
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  SURROGATE
+# ─────────────────────────────────────────────────────────────────────────────
+def _gp(n_features: int, alpha=1e-10, normalize_y: bool = False) -> GaussianProcessRegressor:
+    # Length scales are in standardised feature units; the lower bound stops the
+    # GP from interpolating single combos and reverting to the prior in between.
+    kernel = (ConstantKernel(1.0, (1e-3, 1e3)) *
+              RBF(length_scale=np.ones(n_features), length_scale_bounds=(0.1, 1e3)) +
+              WhiteKernel(1e-3, (1e-8, 1.0)))
+    return GaussianProcessRegressor(kernel=kernel, alpha=alpha, normalize_y=normalize_y,
+                                    n_restarts_optimizer=N_RESTARTS, random_state=0)
+
+class ObjectiveSurrogate:
+    """
+    Gaussian-process emulator of the four objectives and their run-to-run spread.
+
+    Attributes
+    ----------
+    combos  : per-combo training table (see aggregate())
+    sources : run_summary files the model was trained on
+    """
+
+    def __init__(self):
+        self.scaler  = StandardScaler()
+        self.mean_models:   dict[str, GaussianProcessRegressor] = {}
+        self.spread_models: dict[str, GaussianProcessRegressor] = {}
+        self.y_scale:  dict[str, tuple[float, float]] = {}
+        self.s_offset: dict[str, float] = {}
+        self.combos:  pd.DataFrame | None = None
+        self.sources: list[str] = []
+
+    # ── Training ──────────────────────────────────────────────────────────────
+    def fit(self, runs: pd.DataFrame) -> "ObjectiveSurrogate":
+        self.combos  = aggregate(runs)
+        self.sources = sorted(runs["source"].unique()) if "source" in runs else []
+        Z = self.scaler.fit_transform(_features(self.combos[PARAMS]))
+        n = self.combos["n_runs"].to_numpy(dtype=float)
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")   # GP optimiser convergence chatter
+            for k in OBJECTIVES:
+                mean = self.combos[f"mean_{k}"].to_numpy()
+                std  = self.combos[f"std_{k}"].to_numpy()
+                mu, sd = float(mean.mean()), float(mean.std()) or 1.0
+                self.y_scale[k] = (mu, sd)
+                sem2 = (std / sd) ** 2 / n + 1e-10      # squared standard error
+                self.mean_models[k] = _gp(Z.shape[1], sem2).fit(Z, (mean - mu) / sd)
+
+                # log-spread; the offset keeps all-zero combos finite
+                self.s_offset[k] = 1e-3 * (float(std.max()) or 1.0)
+                self.spread_models[k] = _gp(Z.shape[1], normalize_y=True).fit(
+                    Z, np.log(std + self.s_offset[k]))
+        print(f"  Fitted surrogate on {len(self.combos)} combos "
+              f"({int(n.sum()):,} runs)")
+        return self
+
+    # ── Prediction ────────────────────────────────────────────────────────────
+    def predict(self, X) -> pd.DataFrame:
+        """
+        Batch prediction for points X of shape (n, 4) = (α, β, γ, N_A).
+
+        Returns one row per point with, for each objective k:
+            k_mean    predicted mean over runs
+            k_std     surrogate uncertainty of that mean
+            k_spread  predicted run-to-run standard deviation
+        """
+        P = _as_points(X)
+        Z = self.scaler.transform(_features(P))
+        out = pd.DataFrame(P, columns=PARAMS)
+        for k in OBJECTIVES:
+            mu, sd = self.y_scale[k]
+            m, s = self.mean_models[k].predict(Z, return_std=True)
+            out[f"{k}_mean"]   = mu + sd * m
+            out[f"{k}_std"]    = sd * s
+            out[f"{k}_spread"] = np.maximum(
+                np.exp(self.spread_models[k].predict(Z)) - self.s_offset[k], 0.0)
+        return out
+
+    def relative_uncertainty(self, pred: pd.DataFrame) -> np.ndarray:
+        """
+        Worst-case ratio of surrogate std to run-to-run spread across objectives.
+        The spread is floored at 10% of the objective's between-combo std so
+        regions where every run dies (zero spread) do not dominate.
+        """
+        ratios = [pred[f"{k}_std"] / (pred[f"{k}_spread"] + 0.1 * self.y_scale[k][1])
+                  for k in OBJECTIVES]
+        return np.max(np.column_stack(ratios), axis=1)
+
+    # ── Persistence ──────────────────────────────────────────────────────────
+    def save(self, path: str = MODEL_PATH):
+        pathlib.Path(path).parent.mkdir(parents=True, exist_ok=True)
+        # Pickle the state dict, not the instance, so files written by
+        # `python surrogate.py` load from an import of this module (and back).
+        with open(path, "wb") as f:
+            pickle.dump(self.__dict__, f)
+        print(f"  Surrogate saved → {path}")
+
+    @staticmethod
+    def load(path: str = MODEL_PATH) -> "ObjectiveSurrogate":
+        sur = ObjectiveSurrogate()
+        with open(path, "rb") as f:
+            sur.__dict__.update(pickle.load(f))
+        return sur
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  PARETO FRONT FROM THE SURROGATE
+# ─────────────────────────────────────────────────────────────────────────────
+def make_grid(combos: pd.DataFrame, n: int = 10) -> pd.DataFrame:
+    """Dense grid spanning the training range: n values per axis (N_A log-spaced)."""
+    axes = []
+    for p in PARAMS:
+        lo, hi = combos[p].min(), combos[p].max()
+        if p == "n_a":
+            axes.append(np.unique(np.round(np.geomspace(lo, hi, n))))
+        else:
+            axes.append(np.unique(np.linspace(lo, hi, n)))
+    mesh = np.meshgrid(*axes, indexing="ij")
+    return pd.DataFrame({p: m.ravel() for p, m in zip(PARAMS, mesh)})
+
+def pareto_mask(pred: pd.DataFrame) -> np.ndarray:
+    """
+    Non-dominated rows of pred, using the *_mean columns.
+
+    Points are visited in descending lexicographic order, so every dominator of
+    a point is visited before it; each point is then checked against the
+    current front only, which is far cheaper than the all-pairs comparison.
+    """
+    F = np.column_stack([DIRECTIONS[k] * pred[f"{k}_mean"].to_numpy() for k in OBJECTIVES])
+    order = np.lexsort(-F.T[::-1])
+    front_pts = np.empty_like(F)
+    n_front = 0
+    mask = np.zeros(len(F), dtype=bool)
+    for i in order:
+        P = front_pts[:n_front]
+        if n_front and ((P >= F[i]).all(axis=1) & (P > F[i]).any(axis=1)).any():
+            continue
+        front_pts[n_front] = F[i]
+        n_front += 1
+        mask[i] = True
+    return mask
+
+def surrogate_pareto(sur: ObjectiveSurrogate, grid: pd.DataFrame | None = None,
+                     n: int = 10) -> pd.DataFrame:
+    """Predict on a grid and flag the estimated Pareto front."""
+    if grid is None:
+        grid = make_grid(sur.combos, n)
+    pred = sur.predict(grid)
+    pred["pareto_front"] = pareto_mask(pred)
+    return pred
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  ACTIVE REFINEMENT
+# ─────────────────────────────────────────────────────────────────────────────
+def refine(sur: ObjectiveSurrogate, X, rel_tol: float = REL_TOL, max_points: int = 8,
+           n_runs: int = 20, out_dir: str = REFINE_DIR) -> ObjectiveSurrogate:
+    """
+    Simulate the points of X where the surrogate is least certain and refit.
+
+    Points whose relative_uncertainty() exceeds rel_tol are ranked and at most
+    max_points of them are simulated with n_runs seeds each through
+    batch_sweep.run_single_node. The new runs are written to
+    out_dir/run_summary.csv (so later trainings pick them up), their
+    history and final states to out_dir, and the surrogate is refitted on
+    old + new runs.
+    """
+    import batch_sweep as bs
+
+    pred = sur.predict(X)
+    rel  = sur.relative_uncertainty(pred)
+    order = np.argsort(-rel)
+    chosen = [i for i in order[:max_points] if rel[i] > rel_tol]
+    if not chosen:
+        print(f"  All {len(pred)} points within rel_tol={rel_tol} — nothing to simulate")
+        return sur
+
+    tasks = [
+        (float(pred.at[i, "alpha"]), float(pred.at[i, "beta"]), float(pred.at[i, "gamma"]),
+         int(round(pred.at[i, "n_a"])), run_id, bs.BASE_SEED + run_id,
+         bs.N_STEPS, bs.L, bs._sim_opts())
+        for i in chosen for run_id in range(n_runs)
+    ]
+    print(f"  Simulating {len(chosen)} uncertain point(s) × {n_runs} runs "
+          f"(max rel. uncertainty {rel[chosen[0]]:.2f})")
+    os.makedirs(out_dir, exist_ok=True)
+    summ_path = os.path.join(out_dir, "run_summary.csv")
+    tmp_path  = os.path.join(out_dir, "run_summary.new.csv")
+    bs.run_single_node(tasks, os.path.join(out_dir, "raw_runs.csv"), tmp_path,
+                       os.path.join(out_dir, "history_summary.csv"),
+                       os.path.join(out_dir, "final_states.bin"))
+
+    new = pd.read_csv(tmp_path)
+    if os.path.exists(summ_path):
+        new = pd.concat([pd.read_csv(summ_path), new], ignore_index=True)
+    new.to_csv(summ_path, index=False)
+    os.remove(tmp_path)
+
+    runs = load_runs(SUMMARY_GLOB, summ_path)
+    return ObjectiveSurrogate().fit(runs)
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  MAIN
+# ─────────────────────────────────────────────────────────────────────────────
+def _load_or_train(path: str) -> ObjectiveSurrogate:
+    if os.path.exists(path):
+        return ObjectiveSurrogate.load(path)
+    sur = ObjectiveSurrogate().fit(load_runs())
+    sur.save(path)
+    return sur
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--model", default=MODEL_PATH, help="pickled surrogate path")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    sub.add_parser("train", help="fit on all stored run summaries")
+    p_pred = sub.add_parser("predict", help="predict objectives at one point")
+    p_pred.add_argument("point", nargs=4, type=float, metavar=("ALPHA", "BETA", "GAMMA", "N_A"))
+    p_par = sub.add_parser("pareto", help="estimate the Pareto front on a dense grid")
+    p_par.add_argument("--n", type=int, default=10, help="grid values per parameter")
+    p_par.add_argument("--out", default="results/surrogate_pareto.csv")
+    p_ref = sub.add_parser("refine", help="simulate high-uncertainty grid points and refit")
+    p_ref.add_argument("--n", type=int, default=6, help="grid values per parameter")
+    p_ref.add_argument("--rel-tol", type=float, default=REL_TOL)
+    p_ref.add_argument("--max-points", type=int, default=8)
+    p_ref.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Cancer Metastasis — Objective Surrogate")
+    print("=" * 60)
+
+    if args.cmd == "train":
+        ObjectiveSurrogate().fit(load_runs()).save(args.model)
+
+    elif args.cmd == "predict":
+        sur  = _load_or_train(args.model)
+        pred = sur.predict([args.point]).iloc[0]
+        for k in OBJECTIVES:
+            print(f"  {k:<12} {pred[f'{k}_mean']:>12.5g} ± {pred[f'{k}_std']:<10.3g}"
+                  f"(run spread {pred[f'{k}_spread']:.3g})")
+
+    elif args.cmd == "pareto":
+        sur  = _load_or_train(args.model)
+        t0   = time.perf_counter()
+        pred = surrogate_pareto(sur, n=args.n)
+        el   = time.perf_counter() - t0
+        front = pred[pred["pareto_front"]]
+        pred.to_csv(args.out, index=False)
+        print(f"  {len(pred):,} grid points in {el:.2f}s "
+              f"({1e6 * el / len(pred):.1f} µs/point) — {len(front)} on the front")
+        print(f"  → {args.out}")
+
+    elif args.cmd == "refine":
+        sur = _load_or_train(args.model)
+        sur = refine(sur, make_grid(sur.combos, args.n), rel_tol=args.rel_tol,
+                     max_points=args.max_points, n_runs=args.runs)
+        sur.save(args.model)
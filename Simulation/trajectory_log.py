@@ -0,0 +1,330 @@
+"""
+trajectory_log.py — event-sourced trajectory log with keyframes and replay
+==========================================================================
+Between two steps the lattice changes only where a cell is born, dies, turns
+necrotic or is cleared. A TrajectoryRecorder attached to a TumorSimulation
+receives exactly those events (from _place_cell, _remove_cell and
+_update_necrosis) and appends them to a binary log. Every keyframe_every
+steps it also writes a keyframe with the full cell state. TrajectoryReplay
+rebuilds the lattice at any step t: it loads the last keyframe at or before
+t and applies the events in between.
+
+Model
+-----
+Each site holds one state code:
+    0 empty | 1 living non-condensing | 2 living condensing
+    3 necrotic non-condensing | 4 necrotic condensing
+Each event writes an absolute code to one site: a birth writes 1/2, a death
+or clearance writes 0, necrosis writes 3/4. Replaying a batch of events is
+therefore a last-write-wins scatter and needs no per-event loop. Hypoxia
+clocks change every step for every cell, so they are stored only in
+keyframes, and fields are not stored at all (snapshot_store.py records
+them). Hybrid runs are not supported, because core voxels hold densities
+rather than cells.
+
+Layout
+------
+    meta.json         — L, keyframe_every, event record layout (+ converged_at after a steady-state stop)
+    events.bin        — packed 5-byte records (site:int32, kind << 3 | code:uint8), in order
+    steps.bin         — int64 per step: events logged before the state at that step
+    keyframes.jsonl   — one line per keyframe: step, file, offset (events before it)
+    key_000010.npz    — sites, codes, hypoxia clocks at t = 10 (state after 10 steps)
+
+Every file is append-only, so a log can be replayed while its run is still
+being written. Seeking uses steps.bin, which means a seek reads only the
+events between the keyframe and t.
+
+Usage
+-----
+    rec = TrajectoryRecorder("results/trajectory", keyframe_every=10).attach(sim)
+    sim.run(40)
+    rec.close()
+    replay = TrajectoryReplay("results/trajectory")
+    lattice = replay.lattice(23)            # (L, L, L) uint8 state codes
+    for t, codes in replay.frames(0, 40):   # sequential playback, one scatter per step
+        ...
+
+    python trajectory_log.py record --L 60 --steps 40 --keyframe 10
+    python trajectory_log.py show results/trajectory --step 23
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import os
+
+import numpy as np
+
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  CONFIGURATION
+# ─────────────────────────────────────────────────────────────────────────────
+LOG_DIR        = "results/trajectory"
+KEYFRAME_EVERY = 10          # steps between full-state keyframes
+
+EVENT_DTYPE = np.dtype([("site", "<i4"), ("event", "u1")])   # event = kind << 3 | code
+EV_BIRTH, EV_DEATH, EV_CLEAR, EV_NECROSIS = range(4)
+EVENT_KINDS = ("birth", "death", "clear", "necrosis")
+
+EMPTY = 0
+STATE_CODES = ("empty", "living non-condensing", "living condensing",
+               "necrotic non-condensing", "necrotic condensing")
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  RECORDER
+# ─────────────────────────────────────────────────────────────────────────────
+class TrajectoryRecorder:
+    """
+    Event sink for one simulation. attach(sim) writes keyframe 0 and installs
+    the recorder as sim.trajectory. TumorSimulation.run calls end_step()
+    after every step. A loop that calls step() directly must do the same,
+    because end_step() closes the step in steps.bin.
+    close() writes a final keyframe and closes the log; run() calls it at
+    the convergence step when a steady-state stop pads the remaining steps,
+    and meta.json then records converged_at.
+    """
+    def __init__(self, path: str = LOG_DIR, keyframe_every: int = KEYFRAME_EVERY):
+        if keyframe_every < 1:
+            raise ValueError(f"keyframe_every must be ≥ 1, got {keyframe_every}")
+        self.path, self.keyframe_every = path, keyframe_every
+        self.sim      = None
+        self.n_events = 0
+        self._buffer: list[tuple] = []
+        self._last_key  = -1
+        self._last_step = -1
+        os.makedirs(path, exist_ok=True)
+
+    # ── Hooks called by TumorSimulation ──────────────────────────────────
+
+    def birth(self, site: int, condensing: bool):
+        self._buffer.append((site, EV_BIRTH << 3 | (1 + condensing)))
+
+    def removal(self, site: int, cleared: bool):
+        self._buffer.append((site, (EV_CLEAR if cleared else EV_DEATH) << 3 | EMPTY))
+
+    def necrosis(self, site: int, condensing: bool):
+        self._buffer.append((site, EV_NECROSIS << 3 | (3 + condensing)))
+
+    # ── Lifecycle ────────────────────────────────────────────────────────
+
+    def attach(self, sim) -> "TrajectoryRecorder":
+        if sim.hybrid:
+            raise ValueError("trajectory logging needs hybrid=False (core voxels are not cells)")
+        self.sim = sim
+        sim.trajectory = self
+        meta = dict(L=sim.L, keyframe_every=self.keyframe_every, start=sim.t,
+                    event_dtype=EVENT_DTYPE.descr, event_kinds=EVENT_KINDS,
+                    state_codes=STATE_CODES)
+        with open(os.path.join(self.path, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=1)
+        self._events = open(os.path.join(self.path, "events.bin"), "wb")
+        self._steps  = open(os.path.join(self.path, "steps.bin"), "wb")
+        open(os.path.join(self.path, "keyframes.jsonl"), "w").close()
+        self._close_step(sim)
+        self._keyframe(sim)
+        return self
+
+    def _close_step(self, sim):
+        np.array([self.n_events], dtype="<i8").tofile(self._steps)
+        self._steps.flush()
+        self._last_step = sim.t
+
+    def end_step(self, sim):
+        """Flush the step's events; write a keyframe if one is due."""
+        if sim.t == self._last_step:
+            return
+        if self._buffer:
+            np.array(self._buffer, dtype=EVENT_DTYPE).tofile(self._events)
+            self.n_events += len(self._buffer)
+            self._buffer.clear()
+            self._events.flush()
+        self._close_step(sim)
+        if sim.t % self.keyframe_every == 0:
+            self._keyframe(sim)
+
+    def _keyframe(self, sim):
+        cells = sim.cells
+        n = len(cells)
+        sites = np.fromiter((sim._site(c.x, c.y, c.z) for c in cells), dtype=np.int32, count=n)
+        codes = np.fromiter((1 + c.condensing + 2 * c.necrotic for c in cells), dtype=np.uint8, count=n)
+        hyp   = np.fromiter((c.hypoxia_time for c in cells), dtype=np.int16, count=n)
+        order = np.argsort(sites)
+        fname = f"key_{sim.t:06d}.npz"
+        np.savez_compressed(os.path.join(self.path, fname), sites=sites[order],
+                            codes=codes[order], hypoxia=hyp[order], t=sim.t,
+                            angiogenic_on=sim.angiogenic_on)
+        with open(os.path.join(self.path, "keyframes.jsonl"), "a") as f:
+            f.write(json.dumps(dict(step=sim.t, file=fname, offset=self.n_events)) + "\n")
+        self._last_key = sim.t
+
+    def close(self):
+        if self.sim is None:
+            return
+        self.end_step(self.sim)
+        if self._last_key != self.sim.t:
+            self._keyframe(self.sim)
+        if self.sim.converged_at is not None:
+            meta_path = os.path.join(self.path, "meta.json")
+            with open(meta_path) as f:
+                meta = json.load(f)
+            meta["converged_at"] = self.sim.converged_at
+            with open(meta_path, "w") as f:
+                json.dump(meta, f, indent=1)
+        self._events.close()
+        self._steps.close()
+        self.sim.trajectory = None
+        self.sim = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  REPLAY
+# ─────────────────────────────────────────────────────────────────────────────
+class TrajectoryReplay:
+    """Seekable reader for a log written by TrajectoryRecorder."""
+    def __init__(self, path: str = LOG_DIR):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            self.meta = json.load(f)
+        self.L = self.meta["L"]
+        with open(os.path.join(path, "keyframes.jsonl")) as f:
+            self.keyframes = [json.loads(line) for line in f]
+        self._key_steps = np.array([k["step"] for k in self.keyframes])
+        self.offsets = np.fromfile(os.path.join(path, "steps.bin"), dtype="<i8")
+        self._events = None
+
+    @property
+    def events(self) -> np.ndarray:
+        """The whole event log as a structured array (memory-mapped)."""
+        if self._events is None:
+            fname = os.path.join(self.path, "events.bin")
+            self._events = (np.memmap(fname, dtype=EVENT_DTYPE, mode="r")
+                            if os.path.getsize(fname) else np.empty(0, dtype=EVENT_DTYPE))
+        return self._events
+
+    @property
+    def steps(self) -> range:
+        """Steps that can be reconstructed (start … last closed step)."""
+        start = self.meta["start"]
+        return range(start, start + len(self.offsets))
+
+    def _check(self, t: int):
+        if t not in self.steps:
+            raise KeyError(f"step {t} outside the log ({self.steps.start}…{self.steps.stop - 1})")
+
+    def _span(self, t0: int, t1: int) -> slice:
+        """Event rows that take the state from step t0 to step t1."""
+        start = self.meta["start"]
+        return slice(int(self.offsets[t0 - start]), int(self.offsets[t1 - start]))
+
+    def keyframe(self, t: int) -> dict:
+        """Full state stored at the last keyframe at or before step t."""
+        self._check(t)
+        k = self.keyframes[int(np.searchsorted(self._key_steps, t, "right")) - 1]
+        with np.load(os.path.join(self.path, k["file"])) as z:
+            return {name: z[name].item() if z[name].ndim == 0 else z[name] for name in z.files}
+
+    @staticmethod
+    def _apply(codes: np.ndarray, ev: np.ndarray):
+        """Scatter a batch of events into the flat state array (last write per site wins)."""
+        if len(ev) == 0:
+            return
+        sites = ev["site"][::-1]
+        _, last = np.unique(sites, return_index=True)
+        codes[sites[last]] = ev["event"][::-1][last] & 7
+
+    def codes(self, t: int) -> np.ndarray:
+        """Flat (L³,) uint8 state codes after t steps."""
+        key = self.keyframe(t)
+        codes = np.zeros(self.L ** 3, dtype=np.uint8)
+        codes[key["sites"]] = key["codes"]
+        self._apply(codes, self.events[self._span(key["t"], t)])
+        return codes
+
+    def lattice(self, t: int) -> np.ndarray:
+        """(L, L, L) uint8 state codes after t steps (see STATE_CODES)."""
+        return self.codes(t).reshape(self.L, self.L, self.L)
+
+    def frames(self, t0: int | None = None, t1: int | None = None):
+        """
+        Yield (t, flat codes) for t0 ≤ t ≤ t1. The first frame is a seek and
+        every later frame applies one step of events in place, so the yielded
+        array is reused; copy it to keep it.
+        """
+        t0 = self.steps.start if t0 is None else t0
+        t1 = self.steps.stop - 1 if t1 is None else t1
+        self._check(t0)
+        self._check(t1)
+        codes = self.codes(t0)
+        yield t0, codes
+        for t in range(t0 + 1, t1 + 1):
+            self._apply(codes, self.events[self._span(t - 1, t)])
+            yield t, codes
+
+    def counts(self) -> dict:
+        """Events per step and kind, as arrays over the steps taken (no state is rebuilt)."""
+        ev = self.events[:int(self.offsets[-1])]
+        step = np.searchsorted(self.offsets, np.arange(len(ev)), "right") - 1
+        kind = ev["event"] >> 3
+        n = len(self.offsets) - 1
+        return {name: np.bincount(step[kind == k], minlength=n)
+                for k, name in enumerate(EVENT_KINDS)}
+
+    def storage(self) -> dict:
+        """Bytes on disk (events + step index, keyframes) and what a keyframe every step would take."""
+        events = sum(os.path.getsize(os.path.join(self.path, f)) for f in ("events.bin", "steps.bin"))
+        keys   = sum(os.path.getsize(os.path.join(self.path, k["file"])) for k in self.keyframes)
+        full = 0
+        for t, codes in self.frames():
+            sites = np.flatnonzero(codes).astype(np.int32)
+            buf = io.BytesIO()
+            np.savez_compressed(buf, sites=sites, codes=codes[sites])
+            full += buf.tell()
+        return dict(events=events, keyframes=keys, full_per_step=full)
+
+# ─────────────────────────────────────────────────────────────────────────────
+#  MAIN
+# ─────────────────────────────────────────────────────────────────────────────
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    rec = sub.add_parser("record", help="run one simulation with an event log")
+    rec.add_argument("--L", type=int, default=None)
+    rec.add_argument("--steps", type=int, default=None)
+    rec.add_argument("--seed", type=int, default=None)
+    rec.add_argument("--keyframe", type=int, default=KEYFRAME_EVERY)
+    rec.add_argument("--out", default=LOG_DIR)
+    show = sub.add_parser("show", help="summarise a log, or one reconstructed step")
+    show.add_argument("path", nargs="?", default=LOG_DIR)
+    show.add_argument("--step", type=int)
+    args = parser.parse_args()
+
+    if args.cmd == "record":
+        import Cancer_Metastasis as cm
+        sim = cm.TumorSimulation(L=args.L or cm.L, seed=cm.SEED if args.seed is None else args.seed)
+        with TrajectoryRecorder(args.out, keyframe_every=args.keyframe).attach(sim) as recorder:
+            sim.run(n_steps=args.steps or cm.MAX_SIM_STEPS, verbose=True)
+            print(f"\n{recorder.n_events} events → {args.out}")
+    else:
+        replay = TrajectoryReplay(args.path)
+        if args.step is None:
+            counts = replay.counts()
+            print(f"L={replay.L}  steps {replay.steps.start}…{replay.steps.stop - 1}  "
+                  f"keyframes at {[k['step'] for k in replay.keyframes]}")
+            for i, t in enumerate(replay.steps[:-1]):
+                print(f"  t={t:4d} | " + " | ".join(f"{k}={counts[k][i]:6d}" for k in EVENT_KINDS))
+            s = replay.storage()
+            print(f"storage: events {s['events'] / 1e3:.1f} kB + keyframes {s['keyframes'] / 1e3:.1f} kB"
+                  f" vs {s['full_per_step'] / 1e3:.1f} kB for a keyframe every step")
+        else:
+            codes = replay.codes(args.step)
+            n = np.bincount(codes, minlength=len(STATE_CODES))
+            print(f"t={args.step}  cells={int(n[1:].sum())}")
+            for code, name in enumerate(STATE_CODES[1:], start=1):
+                print(f"  {name:24s} {n[code]:7d}")